@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+
+"""
+Test assertions that compare whole structures of numbers with isclose()
+
+assert_all_close() walks two nested structures of sequences and mappings
+in step, and compares the numbers in them. The float values are gathered
+into one buffer and compared with a single batched call to the C
+is_close_module (if it is built), rather than calling isclose() and
+formatting a message per pair -- only the failures, up to max_failures
+of them, are formatted. Other numbers (Decimal, Fraction, complex, ints
+too big to be exact as floats) are compared with isclose.isclose(), and
+anything else with ==.
+
+Example::
+
+    assert_all_close(result, {'x': [1.0, 2.0], 'y': (3.0, [4.0])},
+                     rel_tol=1e-12)
+
+fails with something like::
+
+    AssertionError: 1 of 4 values not close (rel_tol=1e-12, abs_tol=0.0)
+      ['y'][1][0]: 4.000001 != 4.0 (abs error 1e-06, rel error 2.5e-07)
+
+For unittest, mix CloseAssertions into a TestCase to get
+self.assertAllClose(). For pytest, load this module as a plugin
+(``pytest -p assert_close``, or ``pytest_plugins = ['assert_close']`` in a
+conftest.py) to get an ``assert_all_close`` fixture -- or just call
+assert_all_close(), which pytest leaves out of the traceback.
+"""
+
+import math
+from array import array
+from bisect import bisect_right
+from collections.abc import Mapping, Sequence
+from numbers import Number
+
+import isclose
+
+try:
+    import is_close_module
+except ImportError:
+    is_close_module = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pytest
+except ImportError:
+    pytest = None
+
+# ints up to this size convert to float exactly
+_MAX_EXACT_INT = 2 ** 53
+
+
+class _Leaves:
+    """
+    the pairs of values found in two structures
+
+    The floats go in two arrays for one batched comparison. Their paths
+    are only worked out for the failures: each run of floats added at
+    once is a segment, starting at an offset into the arrays, with the
+    path of the container they came from.
+
+    Everything else goes in others, with its path and the number of
+    floats before it, to keep the failures in order.
+    """
+    def __init__(self):
+        self.a = array('d')
+        self.b = array('d')
+        self.starts = []
+        self.segments = []   # (path, shape) -- shape None for one value
+        self.others = []     # (position, path, a, b)
+
+    def add_float(self, path, a, b):
+        self.starts.append(len(self.a))
+        self.segments.append((path, None))
+        self.a.append(a)
+        self.b.append(b)
+
+    def add_run(self, path, a, b):
+        self.starts.append(len(self.a))
+        self.segments.append((path, (len(a),)))
+        # array('d', list) is about twice as fast as extending from a list
+        self.a.extend(a if type(a) is array and a.typecode == 'd'
+                      else array('d', a))
+        self.b.extend(b if type(b) is array and b.typecode == 'd'
+                      else array('d', b))
+
+    def add_arrays(self, path, a, b):
+        # numpy arrays of the same shape
+        self.starts.append(len(self.a))
+        self.segments.append((path, a.shape))
+        self.a.frombytes(np.ascontiguousarray(a, np.float64).tobytes())
+        self.b.frombytes(np.ascontiguousarray(b, np.float64).tobytes())
+
+    def add_other(self, path, a, b):
+        self.others.append((len(self.a), path, a, b))
+
+    def path(self, i):
+        """ the path of the i'th float """
+        segment = bisect_right(self.starts, i) - 1
+        path, shape = self.segments[segment]
+        offset = i - self.starts[segment]
+        if shape is None or shape == ():
+            return path
+        if len(shape) == 1:
+            return path + (offset,)
+        return path + tuple(int(k) for k in np.unravel_index(offset, shape))
+
+
+def _exact_float(x):
+    # x as a float, if it is one or converts exactly -- otherwise None
+    if isinstance(x, float):
+        return x
+    if type(x) is int and -_MAX_EXACT_INT <= x <= _MAX_EXACT_INT:
+        return float(x)
+    return None
+
+
+def _is_sequence(x):
+    return (isinstance(x, (list, tuple, array)) or
+            (isinstance(x, Sequence) and not isinstance(x, (str, bytes,
+                                                             bytearray))))
+
+
+class _StructureError(Exception):
+    def __init__(self, path, message):
+        Exception.__init__(self, path, message)
+        self.path = path
+        self.message = message
+
+
+def _walk(leaves, path, a, b):
+    if np is not None and (isinstance(a, np.ndarray) or
+                           isinstance(b, np.ndarray)):
+        a_array, b_array = np.asarray(a), np.asarray(b)
+        if a_array.shape != b_array.shape:
+            raise _StructureError(path, "shapes differ: {} and {}".format(
+                a_array.shape, b_array.shape))
+        if a_array.dtype.kind == 'f' and b_array.dtype.kind == 'f':
+            leaves.add_arrays(path, a_array, b_array)
+            return
+        a, b = a_array.tolist(), b_array.tolist()
+        if not isinstance(a, list):   # 0-d arrays
+            _walk(leaves, path, a, b)
+            return
+
+    if isinstance(a, Mapping) or isinstance(b, Mapping):
+        if not (isinstance(a, Mapping) and isinstance(b, Mapping)):
+            raise _StructureError(path, "{} is compared to {}".format(
+                type(a).__name__, type(b).__name__))
+        if a.keys() != b.keys():
+            missing = [key for key in b if key not in a]
+            extra = [key for key in a if key not in b]
+            raise _StructureError(path, "keys differ: missing {}, "
+                                        "extra {}".format(missing, extra))
+        for key in b:
+            _walk(leaves, path + (key,), a[key], b[key])
+        return
+
+    if _is_sequence(a) or _is_sequence(b):
+        if not (_is_sequence(a) and _is_sequence(b)):
+            raise _StructureError(path, "{} is compared to {}".format(
+                type(a).__name__, type(b).__name__))
+        if len(a) != len(b):
+            raise _StructureError(path, "lengths differ: {} and {}".format(
+                len(a), len(b)))
+        # the common case -- a flat run of floats -- goes in as one
+        # segment without a Python level loop per value
+        if (type(a) is array and type(b) is array and
+                a.typecode in 'fd' and b.typecode in 'fd'):
+            leaves.add_run(path, a, b)
+            return
+        if set(map(type, a)) <= {float} and set(map(type, b)) <= {float}:
+            leaves.add_run(path, a, b)
+            return
+        for i, (x, y) in enumerate(zip(a, b)):
+            _walk(leaves, path + (i,), x, y)
+        return
+
+    x, y = _exact_float(a), _exact_float(b)
+    if x is not None and y is not None:
+        leaves.add_float(path, x, y)
+    else:
+        leaves.add_other(path, a, b)
+
+
+def _compare_floats(leaves, rel_tol, abs_tol, max_failures):
+    # returns (number of failures, indexes of the first max_failures)
+    if is_close_module is not None:
+        report = is_close_module.MismatchReport(rel_tol, abs_tol, top_k=0,
+                                                max_failures=max_failures)
+        report.update(leaves.a, leaves.b)
+        return report.failures, report.first_failures()
+    failures = 0
+    first = []
+    for i, (a, b) in enumerate(zip(leaves.a, leaves.b)):
+        if not isclose.isclose(a, b, rel_tol, abs_tol):
+            if len(first) < max_failures:
+                first.append(i)
+            failures += 1
+    return failures, first
+
+
+def _other_close(a, b, rel_tol, abs_tol):
+    if isinstance(a, Number) and isinstance(b, Number):
+        try:
+            return isclose.isclose(a, b, rel_tol, abs_tol)
+        except TypeError:
+            pass
+    return a == b
+
+
+def _lookup(value, path):
+    # the original value at path -- the floats in the batch may be
+    # converted from ints or float32
+    for key in path:
+        value = value[key]
+    if np is not None and isinstance(value, np.generic):
+        value = value.item()
+    return value
+
+
+def _format_path(path):
+    return ''.join('[{!r}]'.format(key) for key in path) or '(value)'
+
+
+def _format_failure(path, a, b):
+    line = "  {}: {!r} != {!r}".format(_format_path(path), a, b)
+    try:
+        diff = abs(b - a)
+        scale = max(abs(a), abs(b))
+    except TypeError:
+        return line
+    if diff != diff or math.isinf(diff) or math.isinf(scale):
+        return line
+    rel = diff / scale if scale else 0.0
+    return line + " (abs error {:.3g}, rel error {:.3g})".format(diff, rel)
+
+
+def all_close_message(actual, expected, rel_tol=1e-9, abs_tol=0.0,
+                      max_failures=10):
+    """
+    compares two structures as assert_all_close() does
+
+    returns None if everything is close, and the failure message if not
+    """
+    if rel_tol < 0.0 or abs_tol < 0.0:
+        raise ValueError('error tolerances must be non-negative')
+    if max_failures < 0:
+        raise ValueError('max_failures must be non-negative')
+
+    leaves = _Leaves()
+    try:
+        _walk(leaves, (), actual, expected)
+    except _StructureError as err:
+        return "structures differ at {}: {}".format(_format_path(err.path),
+                                                   err.message)
+
+    failures, first = _compare_floats(leaves, rel_tol, abs_tol,
+                                      max_failures)
+    found = []
+    for i in first:
+        path = leaves.path(i)
+        found.append((i, 0, path, _lookup(actual, path),
+                      _lookup(expected, path)))
+    for position, path, a, b in leaves.others:
+        if not _other_close(a, b, rel_tol, abs_tol):
+            failures += 1
+            found.append((position, -1, path, a, b))
+    if not failures:
+        return None
+
+    found.sort(key=lambda failure: failure[:2])
+    total = len(leaves.a) + len(leaves.others)
+    lines = ["{} of {} values not close (rel_tol={!r}, abs_tol={!r})".format(
+        failures, total, rel_tol, abs_tol)]
+    lines.extend(_format_failure(path, a, b)
+                 for _, _, path, a, b in found[:max_failures])
+    if failures > max_failures:
+        lines.append("  ... and {} more".format(failures - max_failures))
+    return '\n'.join(lines)
+
+
+def assert_all_close(actual, expected, rel_tol=1e-9, abs_tol=0.0,
+                     max_failures=10, msg=None):
+    """
+    raises AssertionError unless every number in actual is close to the
+    one in the same place in expected
+
+    :param actual: a number, or nested sequences and mappings of them --
+                   numpy arrays are fine too
+
+    :param expected: the same structure -- the lengths and keys have to
+                     match
+
+    :param rel_tol=1e-9: The relative tolerance, as for isclose()
+
+    :param abs_tol=0.0: The minimum absolute tolerance, as for isclose()
+
+    :param max_failures=10: the most failures listed in the message --
+                            the rest are counted
+
+    :param msg=None: text to put before the message
+    """
+    __tracebackhide__ = True
+    message = all_close_message(actual, expected, rel_tol, abs_tol,
+                                max_failures)
+    if message is not None:
+        raise AssertionError(message if msg is None
+                             else "{} : {}".format(msg, message))
+
+
+class CloseAssertions:
+    """
+    mix in for unittest.TestCase, adding assertAllClose()
+    """
+    def assertAllClose(self, actual, expected, rel_tol=1e-9, abs_tol=0.0,
+                       max_failures=10, msg=None):
+        """ fail unless actual is close to expected -- see assert_all_close """
+        message = all_close_message(actual, expected, rel_tol, abs_tol,
+                                    max_failures)
+        if message is not None:
+            raise self.failureException(self._formatMessage(msg, message))
+
+
+if pytest is not None:
+    @pytest.fixture(name='assert_all_close')
+    def assert_all_close_fixture():
+        """ the assert_all_close() function, as a pytest fixture """
+        return assert_all_close
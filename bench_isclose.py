@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks for the isclose implementations in this repo:
+
+ - isclose.py (the PEP version)
+ - is_close.py (the four methods, and Comparator objects)
+ - old_code/is_close.py (the early symmetric proposal)
+ - is_close_module.c (the C version, if it has been built)
+
+Each implementation is timed on several sets of inputs -- plain floats,
+mixed types, lots of inf and NaN -- and the batched versions on float64
+arrays. Results are reported as nanoseconds per pair of values compared.
+
+Example::
+
+    python bench_isclose.py --output results.json
+    python bench_isclose.py --compare results.json
+
+With --compare, any benchmark that is more than --threshold slower
+than in the saved results is reported, and the exit status is 1.
+
+Everything uses timeit from the standard library, so it can be run
+anywhere, with no network access.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+from array import array
+from decimal import Decimal
+from fractions import Fraction
+
+import isclose
+import is_close
+
+try:
+    import is_close_module
+except ImportError:
+    is_close_module = None
+
+
+def _load_old_code():
+    # old_code isn't a package, and its module name clashes with is_close
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'old_code', 'is_close.py')
+    spec = importlib.util.spec_from_file_location('old_is_close', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_inputs(n=1000, seed=0):
+    """
+    returns a dict of name: list of (a, b) pairs
+    """
+    rand = random.Random(seed)
+    floats = []
+    for _ in range(n):
+        a = rand.uniform(-1e6, 1e6)
+        # about half of them close
+        b = a * (1 + rand.choice((1e-12, 1e-6)) * rand.uniform(-1, 1))
+        floats.append((a, b))
+
+    inf = float('inf')
+    nan = float('nan')
+    specials = [(inf, inf), (inf, -inf), (nan, nan), (nan, 1.0),
+                (1.0, inf), (-inf, 1e308)]
+    non_finite = [specials[i % len(specials)] if i % 2 else floats[i]
+                  for i in range(n)]
+
+    ints = [(int(a), int(b)) for a, b in floats]
+    mixed = {'int': ints,
+             'complex': [(complex(a, b), complex(b, a)) for a, b in floats],
+             'Decimal': [(Decimal(a), Decimal(b)) for a, b in floats],
+             'Fraction': [(Fraction(a), Fraction(b)) for a, b in floats],
+             }
+
+    inputs = {'float': floats,
+              'non-finite': non_finite,
+              }
+    for name, pairs in mixed.items():
+        inputs[name] = pairs
+    return inputs
+
+
+def scalar_implementations():
+    """
+    returns a dict of name: isclose(a, b) function
+    """
+    old = _load_old_code()
+    impls = {'isclose.isclose': isclose.isclose,
+             'old_code.is_close': old.is_close,
+             }
+    for method in ("asymmetric", "strong", "weak", "average"):
+        impls['is_close.isclose[%s]' % method] = (
+            lambda a, b, method=method: is_close.isclose(a, b,
+                                                         method=method))
+        impls['is_close.Comparator[%s]' % method] = (
+            is_close.Comparator(method=method))
+    if is_close_module is not None:
+        impls['is_close_module.isclose'] = is_close_module.isclose
+        impls['is_close_module.Comparator'] = is_close_module.Comparator()
+    return impls
+
+
+def batched_implementations():
+    """
+    returns a dict of name: function(a_array, b_array) for float64 arrays
+    """
+    impls = {'isclose.isclose_many': isclose.isclose_many,
+             'isclose.allclose[count]': (
+                 lambda a, b: isclose.allclose(a, b, count=True)),
+             }
+    if is_close.np is not None:
+        np = is_close.np
+        impls['is_close.isclose_array'] = (
+            lambda a, b: is_close.isclose_array(np.frombuffer(a),
+                                                np.frombuffer(b)))
+    if is_close_module is not None:
+        def many(a, b):
+            is_close_module.isclose_many(a, b, bytearray(len(a) // 8 + 1))
+        impls['is_close_module.isclose_many'] = many
+        impls['is_close_module.allclose[count]'] = (
+            lambda a, b: is_close_module.allclose(a, b, count=True))
+    return impls
+
+
+def time_per_pair(run, n_pairs, repeat):
+    """
+    best time for a call of run(), in ns per pair of values
+    """
+    timer = timeit.Timer(run)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat, number))
+    return best / number / n_pairs * 1e9
+
+
+def run_benchmarks(n=1000, repeat=5, seed=0, verbose=True):
+    """
+    runs all the benchmarks, and returns a list of result dicts
+    """
+    results = []
+
+    def record(name, inputs, run, n_pairs):
+        try:
+            run()
+        except (TypeError, ValueError, ArithmeticError):
+            ns = None  # this implementation doesn't support these inputs
+        else:
+            ns = time_per_pair(run, n_pairs, repeat)
+        results.append({'implementation': name,
+                        'inputs': inputs,
+                        'ns_per_pair': ns})
+        if verbose:
+            print("{:40s} {:20s} {}".format(
+                name, inputs,
+                "unsupported" if ns is None else "%10.1f ns" % ns))
+
+    inputs = make_inputs(n, seed)
+    for name, func in scalar_implementations().items():
+        for input_name, pairs in inputs.items():
+            def run(func=func, pairs=pairs):
+                for a, b in pairs:
+                    func(a, b)
+            record(name, input_name, run, len(pairs))
+
+    for input_name in ('float', 'non-finite'):
+        pairs = inputs[input_name]
+        a = array('d', [x for x, y in pairs])
+        b = array('d', [y for x, y in pairs])
+        for name, func in batched_implementations().items():
+            record(name, input_name + ' (batched)',
+                   lambda func=func: func(a, b), len(a))
+
+    return results
+
+
+def find_regressions(results, baseline, threshold):
+    """
+    returns a list of (implementation, inputs, old, new) for every result
+    that is more than threshold (a fraction) slower than the baseline
+    """
+    old = {(r['implementation'], r['inputs']): r['ns_per_pair']
+           for r in baseline['results']}
+    regressions = []
+    for r in results:
+        before = old.get((r['implementation'], r['inputs']))
+        after = r['ns_per_pair']
+        if before is None or after is None:
+            continue
+        if after > before * (1 + threshold):
+            regressions.append((r['implementation'], r['inputs'],
+                                before, after))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the isclose implementations")
+    parser.add_argument('--pairs', type=int, default=1000,
+                        help="number of pairs of values in each input set")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the results to this file")
+    parser.add_argument('--compare',
+                        help="check for regressions against saved results")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="fractional slowdown reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.pairs, args.repeat, args.seed)
+    report = {'python': sys.version,
+              'implementation': platform.python_implementation(),
+              'machine': platform.machine(),
+              'pairs': args.pairs,
+              'results': results,
+              }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold)
+        for name, inputs, before, after in regressions:
+            print("REGRESSION: {} {}: {:.1f} ns -> {:.1f} ns".format(
+                name, inputs, before, after))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -25,32 +25,172 @@ I couldn't find a value close to 1.0 by only one method:
 1.0 0.9999999989999999 are not close by either
 1.0 0.999999999 are close by both.
 
+Rather than stepping b towards a one value at a time, this finds the
+edges of the range of values close to a by each method with a bisection
+over the float bit patterns (see is_close._ulps_key), so each edge takes
+about 64 calls of isclose(), whatever the tolerance. The values close by
+only one of the two methods are the ones between the two edges.
+
+This assumes that once b is far enough from a to not be close, it
+stays not close as it moves further away -- true of all four methods
+for rel_tol < 1.
+
+Usage::
+
+    python check_delta.py --methods weak strong --rel-tol 1e-7 1e-8 1e-9
+    python check_delta.py --values 1.0 3.0 --decades 100 --rel-tol 1e-9
+"""
+
+import argparse
+import sys
+from collections import namedtuple
+
+from is_close import isclose, _ulps_key, _as_double, _as_int64
+
+METHODS = ("asymmetric", "strong", "weak", "average")
+
+_MAX_KEY = _ulps_key(sys.float_info.max)
+
+Disagreement = namedtuple('Disagreement', ['a', 'rel_tol', 'first', 'last',
+                                           'count', 'method'])
+Disagreement.__doc__ = """
+A run of values b that are close to a by only one of two methods
+
+first, last: the b values at the ends of the run, first nearest to a
+count: the number of floats in the run
+method: the method that finds them close
 """
 
-from is_close import is_close
-
-delta = 1.2e-16  # (a touch smaller than eps)
-tol = 1e-8
-start_value = 0.999999989999999
-high_value = 1.0
-
-
-a = high_value
-b = start_value
-close_weak = False
-close_strong = False
-while b < a:
-    b += delta
-    print("trying:", a, b)
-    if is_close(a, b, rel_tol=tol, method='weak'):
-        close_weak = True
-    if is_close(a, b, rel_tol=tol, method='strong'):
-        close_strong = True
-    if (close_weak or close_strong) and not (close_weak and close_strong):
-        if close_weak:
-            print("they are close by only the weak standard")
-        elif close_strong:
-            print("they are close by only the strong standard")
-    elif close_weak and close_strong:
-        print("they are close by both")
-        break
+
+def _from_key(key):
+    """
+    the inverse of is_close._ulps_key()
+    """
+    if key < 0:
+        key = -key | -0x8000000000000000
+    return _as_double.unpack(_as_int64.pack(key))[0]
+
+
+def close_edge(a, rel_tol, method, direction, abs_tol=0.0):
+    """
+    returns the b furthest from a, on one side, that is still close to a
+
+    :param a: the value to compare to -- a finite float
+
+    :param rel_tol: the relative tolerance
+
+    :param method: the is_close.isclose() method
+
+    :param direction: 1 to look above a, -1 below it
+
+    :param abs_tol=0.0: the absolute tolerance
+
+    An exponential search finds a b that isn't close, then a bisection
+    over the bit patterns in between finds the edge.
+    """
+    start = _ulps_key(a)
+    limit = _MAX_KEY if direction > 0 else -_MAX_KEY
+
+    def close(key):
+        return isclose(a, _from_key(key), rel_tol, abs_tol, method)
+
+    # close is True at inside and False at outside
+    inside = start
+    step = 1
+    while True:
+        outside = start + direction * step
+        if abs(outside) >= _MAX_KEY:
+            if close(limit):
+                return _from_key(limit)
+            outside = limit
+            break
+        if not close(outside):
+            break
+        inside = outside
+        step *= 2
+
+    while abs(outside - inside) > 1:
+        middle = (inside + outside) // 2
+        if close(middle):
+            inside = middle
+        else:
+            outside = middle
+    return _from_key(inside)
+
+
+def disagreements(a, rel_tol, method_1='weak', method_2='strong',
+                  abs_tol=0.0):
+    """
+    returns a list of the runs of values that are close to a by only one
+    of the two methods -- one run (at most) on each side of a.
+    """
+    for method in (method_1, method_2):
+        if method not in METHODS:
+            raise ValueError('method must be one of: "asymmetric",'
+                             ' "strong", "weak", "average"')
+    result = []
+    for direction in (-1, 1):
+        edge_1 = _ulps_key(close_edge(a, rel_tol, method_1, direction,
+                                      abs_tol))
+        edge_2 = _ulps_key(close_edge(a, rel_tol, method_2, direction,
+                                      abs_tol))
+        if edge_1 == edge_2:
+            continue
+        if abs(edge_1 - _ulps_key(a)) > abs(edge_2 - _ulps_key(a)):
+            near, far, method = edge_2, edge_1, method_1
+        else:
+            near, far, method = edge_1, edge_2, method_2
+        result.append(Disagreement(a, rel_tol,
+                                   _from_key(near + direction),
+                                   _from_key(far),
+                                   abs(far - near),
+                                   method))
+    return result
+
+
+def sweep(values, rel_tols, method_1='weak', method_2='strong',
+          abs_tol=0.0):
+    """
+    yields the Disagreements for every combination of a in values and
+    rel_tol in rel_tols
+    """
+    for rel_tol in rel_tols:
+        for a in values:
+            for disagreement in disagreements(a, rel_tol, method_1,
+                                              method_2, abs_tol):
+                yield disagreement
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Find the values where two isclose() methods disagree")
+    parser.add_argument('--methods', nargs=2, default=['weak', 'strong'],
+                        choices=METHODS)
+    parser.add_argument('--rel-tol', nargs='+', type=float,
+                        default=[10.0 ** -i for i in range(1, 16)])
+    parser.add_argument('--abs-tol', type=float, default=0.0)
+    parser.add_argument('--values', nargs='+', type=float, default=[1.0],
+                        help="the values of a to check")
+    parser.add_argument('--decades', type=int, default=0,
+                        help="also check the values scaled by 10**-N "
+                             "to 10**N")
+    args = parser.parse_args(argv)
+
+    values = [value * 10.0 ** power
+              for value in args.values
+              for power in range(-args.decades, args.decades + 1)]
+    found = 0
+    for d in sweep(values, args.rel_tol, args.methods[0], args.methods[1],
+                   args.abs_tol):
+        found += 1
+        print("a={!r} rel_tol={!r}: only {} for b from {!r} to {!r} "
+              "({} value{})".format(d.a, d.rel_tol, d.method, d.first,
+                                    d.last, d.count,
+                                    "" if d.count == 1 else "s"))
+    print("{} disagreements in {} configurations".format(
+        found, len(values) * len(args.rel_tol)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
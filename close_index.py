@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+"""
+An index of float values for finding all the ones close to a given value
+
+Scanning a whole table with isclose() for every probe value is O(n) per
+probe. CloseIndex keeps the values sorted, works out the interval of
+values that could be close to the probe (with the "weak" test used by
+isclose.isclose()), and finds it with a binary search -- O(log n) per
+probe, plus the number of values found.
+
+Example::
+
+    index = CloseIndex(table, rel_tol=1e-6)
+    for i in index.find(x):
+        print(table[i], "is close to", x)
+"""
+
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from heapq import merge
+
+from isclose import isclose
+
+# the interval is padded by this many units in the last place to allow
+# for rounding in computing it -- candidates are checked with isclose()
+# anyway
+_PAD_ULPS = 4
+
+
+def close_interval(x, rel_tol=1e-9, abs_tol=0.0):
+    """
+    returns (low, high): every b for which isclose(x, b, rel_tol, abs_tol)
+    is True is in low <= b <= high
+
+    For x >= 0 and rel_tol < 1, b is close if it is within abs_tol of x,
+    or, by the relative test, x * (1 - rel_tol) <= b <= x / (1 - rel_tol)
+    -- the upper limit is further away because the tolerance is scaled by
+    the larger of the two values. Negative x is the mirror image.
+
+    A NaN x gives an empty interval (low > high).
+    """
+    if rel_tol < 0.0 or abs_tol < 0.0:
+        raise ValueError('error tolerances must be non-negative')
+    if math.isnan(x):
+        return math.inf, -math.inf
+    if math.isinf(x):
+        return x, x
+    if rel_tol >= 1.0:
+        # the relative test can pass for values of either sign
+        return -math.inf, math.inf
+
+    mag = abs(x)
+    low = min(mag * (1.0 - rel_tol), mag - abs_tol)
+    high = max(mag / (1.0 - rel_tol), mag + abs_tol)
+    low -= _PAD_ULPS * math.ulp(low)
+    high += _PAD_ULPS * math.ulp(high)
+    if x < 0:
+        return -high, -low
+    return low, high
+
+
+class CloseIndex:
+    """
+    A sorted index of float values, for finding the ones close to a
+    given value
+
+    :param values=(): the values to index -- any iterable of numbers
+
+    :param rel_tol=1e-9: The relative tolerance, as for isclose()
+
+    :param abs_tol=0.0: The minimum absolute tolerance, as for isclose()
+
+    Lookups return the positions of the values in the order they were
+    added (the first value passed in is 0, and extend() carries on the
+    numbering). NaN values are kept count of, but never found.
+
+    A rel_tol of 1 or more makes the relative test pass for values far
+    away, so lookups fall back to checking everything.
+    """
+    def __init__(self, values=(), rel_tol=1e-9, abs_tol=0.0):
+        if rel_tol < 0.0 or abs_tol < 0.0:
+            raise ValueError('error tolerances must be non-negative')
+        self.rel_tol = rel_tol
+        self.abs_tol = abs_tol
+        self._values = array('d')    # sorted
+        self._positions = array('q')  # where each one was added
+        self._size = 0
+        self.extend(values)
+
+    def __len__(self):
+        return self._size
+
+    def extend(self, values):
+        """
+        add more values to the index
+
+        The new values are sorted and merged in, so adding in bulk is
+        much faster than adding one at a time.
+        """
+        new = array('d', values)
+        start = self._size
+        self._size += len(new)
+        order = sorted((i for i in range(len(new)) if new[i] == new[i]),
+                       key=new.__getitem__)
+        if not order:
+            return
+        if not self._values:
+            self._values = array('d', [new[i] for i in order])
+            self._positions = array('q', [start + i for i in order])
+            return
+
+        merged = list(merge(zip(self._values, self._positions),
+                            [(new[i], start + i) for i in order]))
+        self._values = array('d', [value for value, _ in merged])
+        self._positions = array('q', [pos for _, pos in merged])
+
+    def _candidates(self, x):
+        low, high = close_interval(x, self.rel_tol, self.abs_tol)
+        return (bisect_left(self._values, low),
+                bisect_right(self._values, high))
+
+    def find(self, x):
+        """
+        returns a list of the positions of all the values close to x,
+        in order of value
+        """
+        start, stop = self._candidates(x)
+        values = self._values
+        rel_tol = self.rel_tol
+        abs_tol = self.abs_tol
+        return [self._positions[i] for i in range(start, stop)
+                if isclose(values[i], x, rel_tol, abs_tol)]
+
+    def find_values(self, x):
+        """
+        returns a list of all the values close to x, in order
+        """
+        start, stop = self._candidates(x)
+        return [value for value in self._values[start:stop]
+                if isclose(value, x, self.rel_tol, self.abs_tol)]
+
+    def count(self, x):
+        """
+        returns the number of values close to x
+        """
+        return len(self.find_values(x))
+
+    def find_many(self, xs):
+        """
+        returns a list of the find() results for each value in xs
+
+        The probes are looked up in sorted order, as a merged sweep: the
+        search for each one starts where the last one's interval
+        started, rather than at the beginning of the index.
+        """
+        xs = list(xs)
+        results = [[] for _ in xs]
+        values = self._values
+        positions = self._positions
+        rel_tol = self.rel_tol
+        abs_tol = self.abs_tol
+        # NaN probes find nothing, and would upset the sort
+        order = sorted((i for i in range(len(xs)) if xs[i] == xs[i]),
+                       key=xs.__getitem__)
+        start = 0
+        for i in order:
+            x = xs[i]
+            low, high = close_interval(x, rel_tol, abs_tol)
+            # the padding can put low a little below the last one, but
+            # nothing below the last low can be close to a larger x
+            start = bisect_left(values, low, start)
+            stop = bisect_right(values, high, start)
+            results[i] = [positions[j] for j in range(start, stop)
+                          if isclose(values[j], x, rel_tol, abs_tol)]
+        return results
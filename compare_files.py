@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+"""
+Compare two binary files of floating point values with isclose()
+
+The files are memory mapped and compared a chunk at a time with the C
+version of the weak test in is_close_module, so the data is never
+loaded into Python objects, and memory use doesn't depend on the size
+of the files.
+
+Example::
+
+    python compare_files.py output.bin golden.bin --rel-tol 1e-12
+
+The files must be raw arrays of native-byte-order float64, float32 or
+float16 values (for instance, written with array.tofile() or
+numpy.ndarray.tofile()).
+
+Everything in the result -- including the worst offenders and the
+histogram of relative errors -- comes from a single pass over the data
+with an is_close_module.MismatchReport.
+"""
+
+import argparse
+import mmap
+import os
+import sys
+from collections import namedtuple
+
+import is_close_module
+
+# the struct format characters that can be compared, with aliases
+DTYPES = {'d': 'd',
+          'float64': 'd',
+          'f': 'f',
+          'float32': 'f',
+          'e': 'e',
+          'float16': 'e',
+          }
+ITEMSIZE = {'d': 8,
+            'f': 4,
+            'e': 2,
+            }
+# the MismatchReport dtype for each format
+_REPORT_DTYPE = {'d': 'float64',
+                 'f': 'float32',
+                 'e': 'float16',
+                 }
+
+CompareResult = namedtuple('CompareResult', ['count',
+                                             'failures',
+                                             'worst_rel_error',
+                                             'worst_index',
+                                             'first_failures',
+                                             'worst',
+                                             'histogram',
+                                             'nan_mismatches',
+                                             'inf_mismatches',
+                                             'max_abs_error',
+                                             ])
+CompareResult.__doc__ = """
+Result of compare_files()
+
+count: number of values compared
+failures: number of values that are not close
+worst_rel_error: largest |b - a| / max(|a|, |b|) -- inf for non-finite
+                 mismatches
+worst_index: index of the largest relative error (-1 for empty files)
+first_failures: indexes of the first values that are not close
+worst: (index, a, b, abs_error, rel_error) tuples for the values that are
+       not close with the largest relative errors, worst first
+histogram: (bound, count) pairs -- the number of relative errors up to
+           each bound, by decade (see MismatchReport.histogram())
+nan_mismatches: number of values that are not close because of a NaN
+inf_mismatches: number of values that are not close because of an
+                infinity
+max_abs_error: largest |b - a|
+"""
+
+
+def _map(f, size):
+    # zero-length files can't be memory mapped
+    if size == 0:
+        return b''
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def compare_files(path_a,
+                  path_b,
+                  dtype='d',
+                  rel_tol=1e-9,
+                  abs_tol=0.0,
+                  chunk_size=1 << 20,
+                  max_failures=10,
+                  top_k=10):
+    """
+    compare the values in two binary files
+
+    :param path_a: path to one of the files
+
+    :param path_b: path to the other file -- must be the same size
+
+    :param dtype='d': the type of the values -- 'd' or 'float64', 'f' or
+                  'float32', 'e' or 'float16'
+
+    :param rel_tol=1e-9: The relative tolerance
+
+    :param abs_tol=0.0: The minimum absolute tolerance
+
+    :param chunk_size=2**20: number of values compared at a time
+
+    :param max_failures=10: the number of failing indexes to report
+
+    :param top_k=10: the number of worst offenders to report
+
+    returns a CompareResult
+    """
+    try:
+        fmt = DTYPES[dtype]
+    except KeyError:
+        raise ValueError("dtype must be one of: %s"
+                         % ", ".join(sorted(DTYPES)))
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    itemsize = ITEMSIZE[fmt]
+
+    size = os.path.getsize(path_a)
+    if os.path.getsize(path_b) != size:
+        raise ValueError("files are different sizes: %s and %s bytes"
+                         % (size, os.path.getsize(path_b)))
+    if size % itemsize:
+        raise ValueError("file size %s is not a multiple of the %s byte "
+                         "item size" % (size, itemsize))
+    count = size // itemsize
+
+    report = is_close_module.MismatchReport(rel_tol, abs_tol, top_k,
+                                            max_failures,
+                                            _REPORT_DTYPE[fmt])
+    with open(path_a, 'rb') as file_a, open(path_b, 'rb') as file_b:
+        map_a = _map(file_a, size)
+        map_b = _map(file_b, size)
+        try:
+            with memoryview(map_a) as view_a, memoryview(map_b) as view_b:
+                for start in range(0, count, chunk_size):
+                    stop = min(start + chunk_size, count)
+                    chunk_a = view_a[start * itemsize:stop * itemsize]
+                    chunk_b = view_b[start * itemsize:stop * itemsize]
+                    with chunk_a, chunk_b:
+                        report.update(chunk_a, chunk_b)
+        finally:
+            if size:
+                map_a.close()
+                map_b.close()
+
+    return CompareResult(count, report.failures, report.max_rel_error,
+                         report.max_rel_index, report.first_failures(),
+                         report.worst(), report.histogram(),
+                         report.nan_mismatches, report.inf_mismatches,
+                         report.max_abs_error)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare two binary files of floats with isclose()")
+    parser.add_argument('path_a')
+    parser.add_argument('path_b')
+    parser.add_argument('--dtype', default='d', choices=sorted(DTYPES))
+    parser.add_argument('--rel-tol', type=float, default=1e-9)
+    parser.add_argument('--abs-tol', type=float, default=0.0)
+    parser.add_argument('--chunk-size', type=int, default=1 << 20)
+    parser.add_argument('--max-failures', type=int, default=10)
+    parser.add_argument('--top-k', type=int, default=10,
+                        help="the number of worst offenders to show")
+    parser.add_argument('--histogram', action='store_true',
+                        help="show the relative errors by decade")
+    args = parser.parse_args(argv)
+
+    result = compare_files(args.path_a, args.path_b, args.dtype,
+                           args.rel_tol, args.abs_tol,
+                           args.chunk_size, args.max_failures, args.top_k)
+    itemsize = ITEMSIZE[DTYPES[args.dtype]]
+
+    print("compared: {} values".format(result.count))
+    print("not close: {}".format(result.failures))
+    print("worst relative error: {} at index {}".format(
+        result.worst_rel_error, result.worst_index))
+    print("max absolute error: {}".format(result.max_abs_error))
+    if result.nan_mismatches or result.inf_mismatches:
+        print("NaN mismatches: {}, inf mismatches: {}".format(
+            result.nan_mismatches, result.inf_mismatches))
+    for i in result.first_failures:
+        print("  not close at index {} (byte offset {})".format(
+            i, i * itemsize))
+    if result.worst:
+        print("worst offenders:")
+    for index, a, b, abs_error, rel_error in result.worst:
+        print("  index {}: {!r} vs {!r}, abs error {:.3g}, "
+              "rel error {:.3g}".format(index, a, b, abs_error, rel_error))
+    if args.histogram:
+        print("relative errors:")
+        for bound, count in result.histogram:
+            print("  {:>8}: {}".format("<= {:g}".format(bound), count))
+    return 1 if result.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+
+"""
+Check that the C isclose() agrees with the Python one, for (nearly)
+every float
+
+Every float32 bit pattern -- or every stride'th float64 bit pattern --
+is compared to a set of reference values, with a set of tolerances, by
+isclose.isclose() and by each of the C code paths that can answer the
+same question, and any value where they give different answers is
+reported. The C code paths are:
+
+ - "isclose_many": the batched loop -- the branchless SIMD loop picked
+   on import (see is_close_module.get_simd())
+ - "isclose": is_close_module.isclose() with the tolerances passed in,
+   which goes through its argument parsing to is_close_weak()
+ - "isclose fast path": is_close_module.isclose(a, b), for the default
+   tolerances only -- the METH_FASTCALL shortcut for two floats
+ - "isclose counted": is_close_module.isclose() with the stats turned
+   on, which uses is_close_weak_counted()
+
+isclose_general() in the C module is only reached for calls that raise
+an error, so it isn't covered.
+
+The work is split into chunks of bit patterns that are run in worker
+processes. Within a chunk, the batched C version is run on the whole
+chunk at once, and the Python and scalar C versions are mapped over it,
+so there is no Python level loop per value, and the results are
+compared as byte strings.
+
+Example::
+
+    python conformance.py                       # all 2**32 float32 values
+    python conformance.py --float64 --stride 274877906951
+    python conformance.py --reference 1.0 0.0 --rel-tol 1e-9 1e-6
+
+float32 values are compared as the float64 values they convert to
+exactly -- both implementations only work with doubles.
+
+The Python version costs about 200ns a value and the scalar C ones
+about 40ns each, so a full float32 sweep takes about 20 CPU minutes per
+configuration (reference and tolerances) -- a few minutes on 8 or more
+cores for the default two configurations.
+"""
+
+import argparse
+import os
+import sys
+from array import array
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import isclose
+import is_close_module
+
+REFERENCES = (1.0, 0.0)
+REL_TOLS = (1e-9,)
+ABS_TOLS = (0.0,)
+
+# an odd number a bit bigger than 2**40 -- about 16 million float64
+# values, with the low mantissa bits varying from one to the next
+DEFAULT_STRIDE = 1099511627791
+
+# _UNPACK[byte] is the 8 bits of byte as 8 bytes of 0 or 1, least
+# significant first -- the bit order of isclose_many()
+_UNPACK = [bytes((byte >> i) & 1 for i in range(8)) for byte in range(256)]
+
+Disagreement = namedtuple('Disagreement', ['value', 'reference', 'rel_tol',
+                                           'abs_tol', 'python', 'c',
+                                           'path'])
+Disagreement.__doc__ = """
+A value where the C code path named by path gives the result c, and the
+Python isclose() gives python
+"""
+
+
+def float32_values(start, stop, stride=1):
+    """
+    the float32 values with bit patterns in range(start, stop, stride),
+    as an array('d')
+    """
+    return array('d', array('f', array('I', range(start, stop, stride))
+                            .tobytes()))
+
+
+def float64_values(start, stop, stride=DEFAULT_STRIDE):
+    """
+    the float64 values with bit patterns in range(start, stop, stride),
+    as an array('d')
+    """
+    return array('d', array('Q', range(start, stop, stride)).tobytes())
+
+
+def _c_results(values, refs, rel_tol, abs_tol):
+    # [(path, results)] for each C code path, the results as bytes of 0
+    # or 1 per value. The counters are left as they were: counting is
+    # off except for the counted pass, and that pass's counts are undone.
+    n = len(values)
+    out = bytearray((n + 7) // 8)
+    scalar = is_close_module.isclose
+    was_enabled = is_close_module.set_stats(False)
+    try:
+        is_close_module.isclose_many(values, refs, out, rel_tol, abs_tol)
+        results = [('isclose_many',
+                    b''.join([_UNPACK[byte] for byte in out])[:n])]
+        results.append(('isclose', bytes(map(scalar, values, refs,
+                                             repeat(rel_tol, n),
+                                             repeat(abs_tol, n)))))
+        if rel_tol == 1e-9 and abs_tol == 0.0:
+            results.append(('isclose fast path', bytes(map(scalar, values,
+                                                           refs))))
+        counts = is_close_module.get_stats()
+        is_close_module.set_stats(True)
+        try:
+            results.append(('isclose counted',
+                            bytes(map(scalar, values, refs,
+                                      repeat(rel_tol, n),
+                                      repeat(abs_tol, n)))))
+        finally:
+            is_close_module.reset_stats(counts)
+    finally:
+        is_close_module.set_stats(was_enabled)
+    return results
+
+
+def check_values(values, reference, rel_tol=1e-9, abs_tol=0.0):
+    """
+    compares isclose(value, reference) from the Python version and each
+    of the C code paths for every value in an array('d')
+
+    The call counters of both versions (see set_stats()) are left as they
+    were, so a sweep doesn't show up in an instrumentation.Recording.
+
+    returns a list of Disagreements
+    """
+    n = len(values)
+    refs = array('d', [reference]) * n
+    was_enabled = isclose.set_stats(False)
+    try:
+        py_results = bytes(map(isclose.isclose, values, refs,
+                               repeat(rel_tol, n), repeat(abs_tol, n)))
+    finally:
+        isclose.set_stats(was_enabled)
+    found = []
+    for path, c_results in _c_results(values, refs, rel_tol, abs_tol):
+        if py_results == c_results:
+            continue
+        found.extend(Disagreement(value, reference, rel_tol, abs_tol,
+                                  bool(py), bool(c), path)
+                     for value, py, c in zip(values, py_results, c_results)
+                     if py != c)
+    return found
+
+
+def _check_chunk(float64, start, stop, stride, configs, max_reports):
+    make_values = float64_values if float64 else float32_values
+    values = make_values(start, stop, stride)
+    found = []
+    for reference, rel_tol, abs_tol in configs:
+        found.extend(check_values(values, reference, rel_tol, abs_tol))
+        del found[max_reports:]
+    return len(values), found
+
+
+def sweep(float64=False,
+          references=REFERENCES,
+          rel_tols=REL_TOLS,
+          abs_tols=ABS_TOLS,
+          start=0,
+          stop=None,
+          stride=None,
+          chunk_size=1 << 20,
+          workers=None,
+          max_reports=100):
+    """
+    compare the C and Python isclose() over a range of bit patterns
+
+    :param float64=False: sweep float64 bit patterns rather than float32
+
+    :param references: the values to compare each value to
+
+    :param rel_tols, abs_tols: the tolerances -- every combination of
+                               reference, rel_tol and abs_tol is checked
+
+    :param start=0, stop=None: the range of bit patterns -- stop defaults
+                               to 2**32 or 2**64
+
+    :param stride=None: check every stride'th pattern -- defaults to 1
+                        for float32 and DEFAULT_STRIDE for float64
+
+    :param chunk_size=2**20: the number of values in each unit of work
+
+    :param workers=None: the number of worker processes -- None for one
+                         per CPU, 1 to run in this process
+
+    :param max_reports=100: the most disagreements to return
+
+    returns (number_of_values_checked, list of Disagreements)
+    """
+    if stop is None:
+        stop = 1 << (64 if float64 else 32)
+    if stride is None:
+        stride = DEFAULT_STRIDE if float64 else 1
+    if stride < 1 or chunk_size < 1:
+        raise ValueError("stride and chunk_size must be positive")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError('workers must be at least 1')
+
+    configs = [(reference, rel_tol, abs_tol)
+               for reference in references
+               for rel_tol in rel_tols
+               for abs_tol in abs_tols]
+    step = stride * chunk_size
+    starts = range(start, stop, step)
+    args = (repeat(float64), starts,
+            [min(s + step, stop) for s in starts],
+            repeat(stride), repeat(configs), repeat(max_reports))
+
+    checked = 0
+    found = []
+    if workers == 1:
+        results = map(_check_chunk, *args)
+        for n, chunk_found in results:
+            checked += n
+            found.extend(chunk_found)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for n, chunk_found in executor.map(_check_chunk, *args):
+                checked += n
+                found.extend(chunk_found)
+    return checked, found[:max_reports]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare the C and Python isclose() over all floats")
+    parser.add_argument('--float64', action='store_true',
+                        help="sweep float64 bit patterns (strided)")
+    parser.add_argument('--start', type=lambda s: int(s, 0), default=0)
+    parser.add_argument('--stop', type=lambda s: int(s, 0), default=None)
+    parser.add_argument('--stride', type=int, default=None)
+    parser.add_argument('--reference', nargs='+', type=float,
+                        default=REFERENCES)
+    parser.add_argument('--rel-tol', nargs='+', type=float,
+                        default=REL_TOLS)
+    parser.add_argument('--abs-tol', nargs='+', type=float,
+                        default=ABS_TOLS)
+    parser.add_argument('--chunk-size', type=int, default=1 << 20)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-reports', type=int, default=100)
+    args = parser.parse_args(argv)
+
+    checked, found = sweep(args.float64, args.reference, args.rel_tol,
+                           args.abs_tol, args.start, args.stop, args.stride,
+                           args.chunk_size, args.workers, args.max_reports)
+    configs = len(args.reference) * len(args.rel_tol) * len(args.abs_tol)
+    print("checked {} values against {} configurations".format(checked,
+                                                                configs))
+    for d in found:
+        print("isclose({!r}, {!r}, rel_tol={!r}, abs_tol={!r}): "
+              "Python {}, C {} ({})".format(d.value, d.reference, d.rel_tol,
+                                            d.abs_tol, d.python, d.c,
+                                            d.path))
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
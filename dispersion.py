@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+
+"""
+Faster ways to solve the linear wave dispersion relationship:
+
+  omega**2 = g*k*tanh(k*h)
+
+for the wave number k -- see iteration_example.py for the basic
+iterative solution.
+
+DispersionCache remembers solutions, and treats (omega, h) pairs that
+are isclose() to one it has seen as the same. On a miss, it starts the
+iteration from the cached solution that is nearest in
+omega**2 * h / g, so even a miss takes only a few iterations.
+
+DispersionTable precomputes the solution over a range of the
+nondimensional x = omega**2 * h / g (kh depends only on x) and answers
+by interpolating, optionally followed by one Newton step and an
+isclose() check. Tables can be saved and memory mapped back in.
+"""
+
+import math
+import mmap
+import struct
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+
+from isclose import isclose
+from fixed_point import iterate, _newton
+from iteration_example import disp, disp_prime
+
+G = 9.806
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+def initial_guess(omega, h, g=G):
+    """
+    a lower bound for k -- the larger of the deep water (omega**2 / g)
+    and shallow water (omega / sqrt(g * h)) solutions
+    """
+    return max(omega**2 / g, omega / math.sqrt(g * h))
+
+
+def solve(omega, h, g=G, k_initial=None, tol=1e-12):
+    """
+    solve the dispersion relationship for k with Newton's method
+
+    :param k_initial=None: starting value -- initial_guess() if None
+
+    :param tol=1e-12: relative tolerance for the isclose() stopping test
+    """
+    if omega <= 0 or h <= 0:
+        raise ValueError("omega and h must be positive")
+    if k_initial is None:
+        k_initial = initial_guess(omega, h, g)
+    return iterate(disp, k_initial, omega, h, g, rel_tol=tol,
+                   method='newton', fprime=disp_prime)
+
+
+class DispersionCache:
+    """
+    A bounded LRU cache of dispersion relation solutions
+
+    Pairs of (omega, h) that are within rel_tol of a cached pair (by
+    isclose()) get the cached k. Lookups are done by quantizing log(omega)
+    and log(h) into buckets rel_tol wide, and confirming with isclose().
+    Values close to a bucket boundary may be missed -- that only costs a
+    new solve.
+
+    On a miss, the solve starts from the cached solution with the nearest
+    omega**2 * h / g -- kh depends only on that, so the guess is close.
+
+    :param maxsize=1024: the maximum number of solutions kept
+
+    :param rel_tol=1e-6: pairs this close are treated as the same
+
+    :param tol=1e-12: the tolerance used for solving
+
+    :param g=9.806: the acceleration of gravity
+
+    Example::
+
+        wave_number = DispersionCache()
+        k = wave_number(omega, h)
+    """
+    def __init__(self, maxsize=1024, rel_tol=1e-6, tol=1e-12, g=G):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        if rel_tol <= 0.0:
+            raise ValueError("rel_tol must be positive")
+        self.maxsize = maxsize
+        self.rel_tol = rel_tol
+        self.tol = tol
+        self.g = g
+        self._width = math.log1p(rel_tol)
+        # bucket: (omega, h, k), least recently used first
+        self._entries = OrderedDict()
+        # sorted (omega**2 * h / g, k * h) for the warm starts
+        self._nondim = []
+        self.hits = 0
+        self.misses = 0
+
+    def _bucket(self, omega, h):
+        return (math.floor(math.log(omega) / self._width),
+                math.floor(math.log(h) / self._width))
+
+    def _nearest_kh(self, x):
+        nondim = self._nondim
+        i = bisect_left(nondim, (x,))
+        candidates = nondim[max(i - 1, 0):i + 1]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda item: abs(item[0] - x))[1]
+
+    def _forget(self, omega, h, k):
+        item = (omega**2 * h / self.g, k * h)
+        i = bisect_left(self._nondim, item)
+        if i < len(self._nondim) and self._nondim[i] == item:
+            del self._nondim[i]
+
+    def __call__(self, omega, h):
+        if omega <= 0 or h <= 0:
+            raise ValueError("omega and h must be positive")
+
+        bucket = self._bucket(omega, h)
+        entry = self._entries.get(bucket)
+        if entry is not None:
+            c_omega, c_h, k = entry
+            if (isclose(omega, c_omega, rel_tol=self.rel_tol) and
+                    isclose(h, c_h, rel_tol=self.rel_tol)):
+                self._entries.move_to_end(bucket)
+                self.hits += 1
+                return k
+            # a different pair in the same bucket -- replace it
+            del self._entries[bucket]
+            self._forget(c_omega, c_h, k)
+
+        self.misses += 1
+        x = omega**2 * h / self.g
+        kh = self._nearest_kh(x)
+        k = solve(omega, h, self.g,
+                  k_initial=None if kh is None else kh / h,
+                  tol=self.tol)
+
+        self._entries[bucket] = (omega, h, k)
+        item = (x, k * h)
+        self._nondim.insert(bisect_left(self._nondim, item), item)
+        if len(self._entries) > self.maxsize:
+            _, old = self._entries.popitem(last=False)
+            self._forget(*old)
+        return k
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize,
+                         len(self._entries))
+
+    def clear(self):
+        self._entries.clear()
+        del self._nondim[:]
+        self.hits = 0
+        self.misses = 0
+
+
+def _solve_nondim(x):
+    """
+    solve x = y * tanh(y) for y (= kh, with x = omega**2 * h / g)
+    """
+    return iterate(lambda y: x / math.tanh(y), max(x, math.sqrt(x)),
+                   rel_tol=1e-14, method='newton',
+                   fprime=lambda y: -x * (1 / math.tanh(y)**2 - 1))
+
+
+class DispersionTable:
+    """
+    Table-driven solution of the dispersion relationship
+
+    kh is tabulated against log(omega**2 * h / g) at evenly spaced points,
+    and looked up by linear interpolation of log(kh). Outside the table,
+    the shallow (kh = sqrt(x)) or deep (kh = x) water limit is used.
+
+    With refine=True (the default) the interpolated value gets one
+    Newton step, which takes it to close to full precision, and with
+    verify=True the result is checked with isclose() against the
+    dispersion relationship, and solved fully if it fails.
+
+    :param size=4096: the number of table points
+
+    :param x_min=1e-6, x_max=1e3: the range of omega**2 * h / g covered
+
+    :param g=9.806: the acceleration of gravity
+
+    :param verify_tol=1e-9: rel_tol for the check of the result
+
+    Tables can be stored with save() and read with DispersionTable.load(),
+    which memory maps the file rather than reading it.
+    """
+    _header = struct.Struct('=8sqdd')
+    _magic = b'DISPTAB1'
+
+    def __init__(self, size=4096, x_min=1e-6, x_max=1e3, g=G,
+                 verify_tol=1e-9, _data=None):
+        if size < 2:
+            raise ValueError("size must be at least 2")
+        if not 0.0 < x_min < x_max:
+            raise ValueError("need 0 < x_min < x_max")
+        self.size = size
+        self.x_min = x_min
+        self.x_max = x_max
+        self.g = g
+        self.verify_tol = verify_tol
+        self._u_min = math.log(x_min)
+        self._du = (math.log(x_max) - self._u_min) / (size - 1)
+        self._mmap = None
+        if _data is None:
+            _data = array('d', (math.log(_solve_nondim(
+                                    math.exp(self._u_min + i * self._du)))
+                                for i in range(size)))
+        # log(kh) at each table point
+        self._log_kh = _data
+
+    def kh(self, x):
+        """
+        interpolated kh for x = omega**2 * h / g -- without refinement
+        """
+        if x <= self.x_min:
+            return math.sqrt(x)
+        if x >= self.x_max:
+            return x
+        pos = (math.log(x) - self._u_min) / self._du
+        i = min(int(pos), self.size - 2)
+        frac = pos - i
+        table = self._log_kh
+        return math.exp(table[i] + frac * (table[i + 1] - table[i]))
+
+    def __call__(self, omega, h, refine=True, verify=True):
+        """
+        returns the wave number k for frequency omega and depth h
+        """
+        if omega <= 0 or h <= 0:
+            raise ValueError("omega and h must be positive")
+        g = self.g
+        k = self.kh(omega**2 * h / g) / h
+        if refine:
+            k = _newton(k, disp(k, omega, h, g), disp_prime(k, omega, h, g))
+        if verify and not isclose(g * k * math.tanh(k * h), omega**2,
+                                  rel_tol=self.verify_tol):
+            k = solve(omega, h, g, k_initial=k)
+        return k
+
+    def save(self, path):
+        """
+        write the table to a file that load() can memory map
+        """
+        with open(path, 'wb') as f:
+            f.write(self._header.pack(self._magic, self.size,
+                                      self.x_min, self.x_max))
+            f.write(memoryview(self._log_kh).cast('B'))
+
+    @classmethod
+    def load(cls, path, g=G, verify_tol=1e-9):
+        """
+        memory map a table written by save()
+
+        The file stays mapped (read only) until close() is called.
+        """
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, size, x_min, x_max = cls._header.unpack_from(mapped)
+            if magic != cls._magic:
+                raise ValueError("%s is not a dispersion table" % path)
+            expected = cls._header.size + size * 8
+            if len(mapped) != expected:
+                raise ValueError("%s should be %i bytes, not %i"
+                                 % (path, expected, len(mapped)))
+            data = memoryview(mapped)[cls._header.size:].cast('d')
+        except Exception:
+            mapped.close()
+            raise
+        table = cls(size, x_min, x_max, g, verify_tol, _data=data)
+        table._mmap = mapped
+        return table
+
+    def close(self):
+        """
+        release the memory mapped file, if there is one
+        """
+        if self._mmap is not None:
+            self._log_kh.release()
+            self._mmap.close()
+            self._mmap = None
+            self._log_kh = None
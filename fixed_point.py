@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+
+"""
+Fixed point iteration, using isclose() to decide when to stop.
+
+This is the iterate() function from iteration_example.py, made into
+something reusable:
+
+iterate() solves x = func(x, *args) for a single value.
+
+iterate_many() solves it for a whole array of values at once: func is
+called with an array of all the values that have not converged yet,
+convergence is checked for the whole array with the C isclose_many(),
+and the values that have converged are dropped, so each sweep does
+less work than the one before.
+
+Both can use Steffensen's method (Aitken extrapolation) or Newton's
+method instead of plain successive substitution, which usually takes
+far fewer iterations.
+
+iterate_async() is a coroutine version of iterate(), for solving inside
+an asyncio program: it gives control back to the event loop every so
+many iterations, so it can be cancelled or timed out, and it can report
+its progress to the subscribers of a Monitor.
+
+See iteration_example.py for the ocean wave dispersion relationship
+solved this way.
+"""
+
+import asyncio
+from array import array
+from collections import namedtuple
+from itertools import chain
+
+from isclose import isclose
+import is_close_module
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# _BITS[byte] is the 8 bits of byte, least significant first -- the bit
+# order of the output of isclose_many()
+_BITS = [tuple(bool(byte & (1 << i)) for i in range(8))
+         for byte in range(256)]
+
+
+METHODS = ('plain', 'steffensen', 'newton')
+
+# callables that are passed a list of the number of iterations each solve
+# took (-1 for ones that didn't converge) -- see instrumentation.py
+_observers = []
+
+
+def _notify(iterations):
+    for observer in _observers:
+        observer(iterations)
+
+
+def _aitken(x0, x1, x2):
+    """
+    Aitken's delta-squared extrapolation of three successive iterates
+    """
+    denom = x2 - 2 * x1 + x0
+    if denom == 0:
+        # the iterates are (numerically) on a straight line, or have
+        # converged -- nothing to extrapolate
+        return x2
+    return x0 - (x1 - x0) ** 2 / denom
+
+
+def _newton(x, fx, dfx):
+    """
+    a Newton step on func(x) - x = 0, given func(x) and func'(x)
+    """
+    denom = dfx - 1
+    if denom == 0:
+        return fx
+    return x - (fx - x) / denom
+
+
+def _aitken_array(x0, x1, x2):
+    # _aitken() for numpy arrays
+    denom = x2 - 2 * x1 + x0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        extrapolated = x0 - (x1 - x0) ** 2 / denom
+    return np.where(denom == 0, x2, extrapolated)
+
+
+def _newton_array(x, fx, dfx):
+    # _newton() for numpy arrays
+    denom = dfx - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stepped = x - (fx - x) / denom
+    return np.where(denom == 0, fx, stepped)
+
+
+def _check_method(method, fprime):
+    if method not in METHODS:
+        raise ValueError('method must be one of: %s'
+                         % ', '.join('"%s"' % m for m in METHODS))
+    if method == 'newton' and fprime is None:
+        raise ValueError('the "newton" method needs fprime')
+
+
+def _step(func, x, args, method, fprime):
+    # the next value from x, by the given method
+    if method == 'plain':
+        return func(x, *args)
+    elif method == 'steffensen':
+        y = func(x, *args)
+        return _aitken(x, y, func(y, *args))
+    else:
+        return _newton(x, func(x, *args), fprime(x, *args))
+
+
+def iterate(func, x_initial, *args, rel_tol=1e-9, abs_tol=0.0,
+            max_iter=1000, method='plain', fprime=None):
+    """
+    iterate to find a solution to the function passed in
+
+    func should be a function that takes x as a first argument,
+    and computes an approximation to x as a result.
+
+    x_initial is an initial guess for the unknown value
+
+    any other positional arguments are passed on to func
+
+    :param rel_tol=1e-9: stop when successive values are this close
+
+    :param abs_tol=0.0: the absolute tolerance for the stopping test
+
+    :param max_iter=1000: raise a RuntimeError if it hasn't converged
+                          after this many iterations.
+
+    :param method='plain': how to get the next value:
+                  "plain" : successive substitution -- x = func(x)
+                  "steffensen" : Aitken's delta-squared extrapolation
+                                 of two substitution steps (two calls to
+                                 func per iteration)
+                  "newton" : Newton's method on func(x) - x = 0 --
+                             requires fprime
+
+    :param fprime=None: the derivative of func with respect to x, called
+                        as fprime(x, *args)
+    """
+    _check_method(method, fprime)
+
+    x_1 = x_initial
+    for iteration in range(1, max_iter + 1):
+        x_2 = _step(func, x_1, args, method, fprime)
+        if isclose(x_2, x_1, rel_tol=rel_tol, abs_tol=abs_tol):
+            if _observers:
+                _notify([iteration])
+            return x_2
+        x_1 = x_2
+    if _observers:
+        _notify([-1])
+    raise RuntimeError("iteration did not converge in %i iterations"
+                       % max_iter)
+
+
+Telemetry = namedtuple('Telemetry', ['iteration', 'x', 'change',
+                                     'converged'])
+Telemetry.__doc__ = """
+Progress of an iterate_async() solve
+
+iteration: the number of iterations done so far
+x: the current value
+change: the relative change in the last iteration -- |x_2 - x_1| scaled by
+        the larger of |x_1| and |x_2|, the quantity isclose() compares
+        to rel_tol
+converged: True for the last report of a solve that converged
+"""
+
+
+def _relative_change(x_1, x_2):
+    diff = abs(x_2 - x_1)
+    scale = max(abs(x_1), abs(x_2))
+    if diff == 0:
+        return 0.0
+    return diff / scale if scale else float('inf')
+
+
+class Monitor:
+    """
+    Passes the Telemetry from an iterate_async() solve on to subscribers
+
+    Each subscriber gets its own queue, and can iterate over it with
+    ``async for``; the iteration ends when the solve is finished, however
+    it finishes. Publishing never blocks the solve: if a subscriber's
+    queue is full, its oldest report is dropped.
+
+    Example::
+
+        monitor = Monitor()
+        reports = monitor.subscribe()
+        task = asyncio.ensure_future(iterate_async(func, x, monitor=monitor))
+        async for telemetry in reports:
+            print(telemetry.iteration, telemetry.change)
+        x = await task
+    """
+    _done = object()
+
+    def __init__(self):
+        self._queues = []
+        self.closed = False
+        self.last = None
+
+    def subscribe(self, maxsize=0):
+        """
+        returns an async iterator of the Telemetry published from now on
+
+        :param maxsize=0: the most reports kept for this subscriber --
+                          0 for no limit
+        """
+        queue = asyncio.Queue(maxsize)
+        if self.closed:
+            queue.put_nowait(self._done)
+        else:
+            self._queues.append(queue)
+        return self._iterate(queue)
+
+    async def _iterate(self, queue):
+        while True:
+            item = await queue.get()
+            if item is self._done:
+                return
+            yield item
+
+    def _put(self, queue, item):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(item)
+
+    def publish(self, telemetry):
+        self.last = telemetry
+        for queue in self._queues:
+            self._put(queue, telemetry)
+
+    def close(self):
+        """
+        ends the iteration of all the subscribers
+        """
+        if not self.closed:
+            self.closed = True
+            for queue in self._queues:
+                if queue.maxsize and queue.full():
+                    # make room for the end marker -- never lose it
+                    queue.get_nowait()
+                queue.put_nowait(self._done)
+            self._queues = []
+
+
+async def iterate_async(func, x_initial, *args, rel_tol=1e-9, abs_tol=0.0,
+                        max_iter=1000, method='plain', fprime=None,
+                        yield_every=100, timeout=None, monitor=None):
+    """
+    a coroutine version of iterate()
+
+    The parameters are the same as iterate(), plus:
+
+    :param yield_every=100: give control back to the event loop every
+                            this many iterations -- which is also when
+                            the solve can be cancelled.
+
+    :param timeout=None: raise asyncio.TimeoutError if it hasn't converged
+                         after this many seconds. Checked every
+                         yield_every iterations.
+
+    :param monitor=None: a Monitor to publish Telemetry to, every
+                         yield_every iterations and at the end. It is
+                         closed when the solve finishes, however it
+                         finishes.
+
+    The solve can also be cancelled, or timed out with asyncio.wait_for(),
+    like any other coroutine.
+    """
+    _check_method(method, fprime)
+    if yield_every < 1:
+        raise ValueError("yield_every must be at least 1")
+
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    x_1 = x_initial
+    try:
+        for iteration in range(1, max_iter + 1):
+            x_2 = _step(func, x_1, args, method, fprime)
+            if isclose(x_2, x_1, rel_tol=rel_tol, abs_tol=abs_tol):
+                if _observers:
+                    _notify([iteration])
+                if monitor is not None:
+                    monitor.publish(Telemetry(iteration, x_2,
+                                              _relative_change(x_1, x_2),
+                                              True))
+                return x_2
+            if iteration % yield_every == 0:
+                if monitor is not None:
+                    monitor.publish(Telemetry(iteration, x_2,
+                                              _relative_change(x_1, x_2),
+                                              False))
+                if deadline is not None and loop.time() >= deadline:
+                    raise asyncio.TimeoutError(
+                        "iteration did not converge in %s seconds" % timeout)
+                await asyncio.sleep(0)
+            x_1 = x_2
+        if _observers:
+            _notify([-1])
+        raise RuntimeError("iteration did not converge in %i iterations"
+                           % max_iter)
+    finally:
+        if monitor is not None:
+            monitor.close()
+
+
+def _per_element(args, n):
+    # which of args are sequences of per-element values
+    per_element = []
+    for arg in args:
+        try:
+            per_element.append(len(arg) == n and not isinstance(arg, str))
+        except TypeError:
+            per_element.append(False)
+    return per_element
+
+
+def _iterate_many_numpy(func, x_initial, args, rel_tol, abs_tol, max_iter,
+                        method, fprime):
+    # iterate_many() with the active set kept in numpy arrays, so that
+    # retiring the converged elements is a few bulk operations per sweep
+    x = np.array(x_initial, dtype=np.float64)
+    n = len(x)
+    iterations = np.full(n, -1, dtype=np.int64)
+    per_element = _per_element(args, n)
+    args = [np.asarray(arg, dtype=np.float64) if is_seq else arg
+            for arg, is_seq in zip(args, per_element)]
+
+    active = np.arange(n)
+    x_old = x.copy()
+    x_new = x_old
+    active_args = list(args)
+    out = np.empty((n + 7) // 8, dtype=np.uint8)
+    for sweep in range(1, max_iter + 1):
+        if method == 'plain':
+            x_new = func(x_old, *active_args)
+        elif method == 'steffensen':
+            y = np.asarray(func(x_old, *active_args), dtype=np.float64)
+            x_new = _aitken_array(x_old, y, np.asarray(func(y, *active_args),
+                                                       dtype=np.float64))
+        else:
+            x_new = _newton_array(x_old,
+                                  np.asarray(func(x_old, *active_args),
+                                             dtype=np.float64),
+                                  np.asarray(fprime(x_old, *active_args),
+                                             dtype=np.float64))
+        x_new = np.ascontiguousarray(x_new, dtype=np.float64)
+        m = len(x_old)
+        if len(x_new) != m:
+            raise ValueError("func returned %i values for %i inputs"
+                             % (len(x_new), m))
+        if (not is_close_module.isclose_many(x_new, x_old, out, rel_tol,
+                                             abs_tol) and m):
+            x_old = x_new
+            continue
+
+        closed = np.unpackbits(out[:(m + 7) // 8], count=m,
+                               bitorder='little').view(bool)
+        done = active[closed]
+        x[done] = x_new[closed]
+        iterations[done] = sweep
+        if len(done) == m:
+            break
+
+        # retire the converged elements
+        keep = ~closed
+        x_old = x_new[keep]
+        active = active[keep]
+        active_args = [arg[active] if is_seq else arg
+                       for arg, is_seq in zip(args, per_element)]
+    else:
+        x[active] = x_new
+
+    return array('d', x.tobytes()), array('l', iterations.astype('l')
+                                                   .tobytes())
+
+
+def iterate_many(func, x_initial, *args, rel_tol=1e-9, abs_tol=0.0,
+                 max_iter=1000, method='plain', fprime=None):
+    """
+    iterate to find solutions for a whole array of values at once
+
+    func(x, *args) is called with x the current values of the elements
+    that have not converged yet, and should return a sequence of the same
+    length with the new values. x is a numpy float64 array if numpy is
+    installed, and an array.array('d') if not -- so a func written with
+    numpy ufuncs does the whole sweep in bulk.
+
+    :param x_initial: a sequence of initial guesses
+
+    :param args: extra arguments for func. Sequences the same length as
+                 x_initial are treated as per-element values, and func
+                 gets only the active elements of them (as the same kind
+                 of array as x). Anything else is passed on as is.
+
+    :param rel_tol=1e-9: stop when successive values are this close
+
+    :param abs_tol=0.0: the absolute tolerance for the stopping test
+
+    :param max_iter=1000: the maximum number of sweeps
+
+    :param method='plain': "plain", "steffensen" or "newton" -- see
+                           iterate()
+
+    :param fprime=None: the derivative of func with respect to x, for
+                        the "newton" method. Called like func, with
+                        arrays.
+
+    returns (x, iterations): an array.array('d') of the solutions, and an
+    array.array('l') of the number of iterations each one took -- -1 for
+    the ones that didn't converge in max_iter sweeps (their x is the
+    last value computed).
+    """
+    _check_method(method, fprime)
+
+    if np is not None:
+        x, iterations = _iterate_many_numpy(func, x_initial, args, rel_tol,
+                                            abs_tol, max_iter, method,
+                                            fprime)
+        if _observers:
+            _notify(iterations.tolist())
+        return x, iterations
+
+    n = len(x_initial)
+    x = array('d', x_initial)
+    iterations = array('l', [-1]) * n
+    per_element = _per_element(args, n)
+    args = [array('d', arg) if is_seq else arg
+            for arg, is_seq in zip(args, per_element)]
+
+    active = list(range(n))
+    x_old = array('d', x)
+    x_new = x_old
+    active_args = list(args)
+    out = bytearray((n + 7) // 8)
+    for sweep in range(1, max_iter + 1):
+        if method == 'plain':
+            x_new = array('d', func(x_old, *active_args))
+        elif method == 'steffensen':
+            y = array('d', func(x_old, *active_args))
+            x_new = array('d', map(_aitken, x_old, y,
+                                   func(y, *active_args)))
+        else:
+            x_new = array('d', map(_newton, x_old,
+                                   func(x_old, *active_args),
+                                   fprime(x_old, *active_args)))
+        m = len(x_old)
+        if len(x_new) != m:
+            raise ValueError("func returned %i values for %i inputs"
+                             % (len(x_new), m))
+        # nothing to retire on most sweeps -- the per-element work below
+        # is only done when something has converged
+        if (not is_close_module.isclose_many(x_new, x_old, out, rel_tol,
+                                             abs_tol) and m):
+            x_old = x_new
+            continue
+
+        closed = chain.from_iterable(_BITS[byte]
+                                     for byte in out[:(m + 7) // 8])
+        keep = []
+        for j, (i, converged) in enumerate(zip(active, closed)):
+            if converged:
+                x[i] = x_new[j]
+                iterations[i] = sweep
+            else:
+                keep.append(j)
+        if not keep:
+            break
+
+        # retire the converged elements
+        x_old = array('d', [x_new[j] for j in keep])
+        active = [active[j] for j in keep]
+        active_args = [array('d', [arg[i] for i in active]) if is_seq
+                       else arg
+                       for arg, is_seq in zip(args, per_element)]
+    else:
+        for i, value in zip(active, x_new):
+            x[i] = value
+
+    if _observers:
+        _notify(list(iterations))
+    return x, iterations
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+"""
+Collapse near-duplicate values in a stream of floats
+
+group_close() sorts the values and sweeps through them in order: each
+group starts with its smallest value (the representative), and takes
+in all the following values that are isclose() to it (with the weak
+test of isclose.isclose()). Since isclose() isn't transitive, this is
+not the only way to group values -- but with it, every value is close
+to the representative of its group.
+
+Memory use is bounded: the stream is read in chunks that are sorted and
+written to temporary files, which are then merged with heapq.merge().
+A stream that fits in one chunk never touches the disk.
+
+Example::
+
+    for value, count in group_close(measurements(), rel_tol=1e-6):
+        print(value, count)
+"""
+
+import math
+import os
+import tempfile
+from array import array
+from heapq import merge
+from itertools import islice
+
+from isclose import isclose
+from close_index import close_interval
+
+# number of values read back from each sorted run at a time
+_READ_BLOCK = 1 << 16
+
+
+def _read_run(path):
+    # the values from a sorted run file, a block at a time
+    with open(path, 'rb') as f:
+        while True:
+            block = array('d')
+            try:
+                block.fromfile(f, _READ_BLOCK)
+            except EOFError:  # a short last block -- block holds the rest
+                pass
+            if not block:
+                return
+            yield from block
+
+
+def _close_limit(value, rel_tol, abs_tol):
+    """
+    the largest float that is close to value -- everything from value up
+    to it is close (for rel_tol < 1)
+    """
+    limit = close_interval(value, rel_tol, abs_tol)[1]
+    while not isclose(value, limit, rel_tol, abs_tol):
+        limit = math.nextafter(limit, -math.inf)
+    return limit
+
+
+def _sweep(values, rel_tol, abs_tol):
+    # group sorted values
+    representative = None
+    count = 0
+    limit = None
+    for value in values:
+        if count:
+            if limit is None:
+                if isclose(representative, value, rel_tol, abs_tol):
+                    count += 1
+                    continue
+            elif value <= limit:
+                count += 1
+                continue
+            yield representative, count
+        representative = value
+        count = 1
+        if rel_tol < 1.0:
+            limit = _close_limit(value, rel_tol, abs_tol)
+    if count:
+        yield representative, count
+
+
+def group_close(iterable, rel_tol=1e-9, abs_tol=0.0, chunk_size=1 << 22,
+                tmpdir=None):
+    """
+    groups values that are close, yielding (representative, count) pairs
+    in ascending order of the representatives
+
+    :param iterable: the values -- anything that can go in an array('d')
+
+    :param rel_tol=1e-9: The relative tolerance, as for isclose()
+
+    :param abs_tol=0.0: The minimum absolute tolerance, as for isclose()
+
+    :param chunk_size=2**22: the most values held in memory at once --
+                             longer streams are sorted in runs of this
+                             size in temporary files (8 bytes per value)
+
+    :param tmpdir=None: where to put the temporary files
+
+    NaN is not close to anything, even itself, so each NaN is a group of
+    its own -- they come last.
+    """
+    if rel_tol < 0.0 or abs_tol < 0.0:
+        raise ValueError('error tolerances must be non-negative')
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be positive')
+
+    iterator = iter(iterable)
+    nans = 0
+
+    def next_chunk():
+        nonlocal nans
+        chunk = array('d', islice(iterator, chunk_size))
+        values = sorted(value for value in chunk if value == value)
+        nans += len(chunk) - len(values)
+        return chunk, values
+
+    chunk, values = next_chunk()
+    if len(chunk) < chunk_size:
+        # all in memory
+        yield from _sweep(values, rel_tol, abs_tol)
+    else:
+        with tempfile.TemporaryDirectory(dir=tmpdir) as workdir:
+            paths = []
+            while chunk:
+                path = os.path.join(workdir, 'run%i' % len(paths))
+                with open(path, 'wb') as f:
+                    array('d', values).tofile(f)
+                paths.append(path)
+                chunk, values = next_chunk()
+            del chunk, values
+            yield from _sweep(merge(*[_read_run(path) for path in paths]),
+                              rel_tol, abs_tol)
+
+    for _ in range(nans):
+        yield math.nan, 1
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+"""
+Opt-in instrumentation of isclose() and the iterative solvers
+
+Everything is off unless a Recording is active:
+
+ - isclose.py and is_close_module (the C version) both count calls of
+   isclose(), and which test decided each result: the exact-equality
+   short circuit, the infinity check, the relative tolerance, abs_tol,
+   or none of them. The solvers in fixed_point.py use the Python one.
+
+ - is_close_module also counts calls of Comparator objects, and calls
+   of the batched functions and the number of values they were passed.
+
+ - the solvers in fixed_point.py report how many iterations each solve
+   took, which is collected into a histogram.
+
+Lots of scalar calls and few batched ones points at call sites that
+could be batched with isclose_many() or iterate_many().
+
+Example::
+
+    with Recording() as recording:
+        run_the_job()
+    print(recording.report())
+
+Recordings can be nested -- each one sees everything that happened
+while it was active.
+"""
+
+from collections import Counter
+
+import fixed_point
+import isclose
+import is_close_module
+
+# the counters kept by both versions of isclose()
+_SCALAR_COUNTERS = ('calls', 'equal', 'nonfinite', 'rel_tol', 'abs_tol',
+                    'not_close')
+
+
+def _difference(end, start):
+    return {name: end[name] - start[name] for name in end}
+
+
+class Recording:
+    """
+    Context manager that records isclose() and solver statistics
+
+    After the block:
+
+    isclose: a dict of the is_close_module counters for the block --
+             see is_close_module.get_stats() for what they are.
+
+    python_isclose: a dict of the isclose.py counters for the block --
+                    the same as the first six of those.
+
+    iterations: a Counter of the number of iterations each solve took:
+                {iterations: number_of_solves}. Solves that didn't
+                converge are counted under -1.
+    """
+    def __init__(self):
+        self.isclose = {}
+        self.python_isclose = {}
+        self.iterations = Counter()
+        self._start = None
+        self._python_start = None
+        self._was_enabled = False
+        self._python_was_enabled = False
+
+    def _observe(self, iterations):
+        self.iterations.update(iterations)
+
+    def __enter__(self):
+        self._was_enabled = is_close_module.set_stats(True)
+        self._start = is_close_module.get_stats()
+        self._python_was_enabled = isclose.set_stats(True)
+        self._python_start = isclose.get_stats()
+        fixed_point._observers.append(self._observe)
+        return self
+
+    def __exit__(self, *exc_info):
+        fixed_point._observers.remove(self._observe)
+        self.python_isclose = _difference(isclose.get_stats(),
+                                          self._python_start)
+        isclose.set_stats(self._python_was_enabled)
+        self.isclose = _difference(is_close_module.get_stats(), self._start)
+        is_close_module.set_stats(self._was_enabled)
+        return False
+
+    @property
+    def solves(self):
+        """ the number of solves recorded """
+        return sum(self.iterations.values())
+
+    def report(self):
+        """
+        returns a summary of the recording as a string
+        """
+        lines = []
+        if self.isclose:
+            scalar = {name: (self.isclose[name] +
+                             self.python_isclose.get(name, 0))
+                      for name in _SCALAR_COUNTERS}
+            calls = scalar['calls']
+            lines.append("isclose() calls: {} (C: {}, Python: {})".format(
+                calls, self.isclose['calls'],
+                self.python_isclose.get('calls', 0)))
+            for name in _SCALAR_COUNTERS[1:]:
+                count = scalar[name]
+                lines.append("  {:10s} {:10d} ({:.1%})".format(
+                    name, count, count / calls if calls else 0.0))
+            lines.append("Comparator calls: {}".format(
+                self.isclose['comparator_calls']))
+            lines.append("batched calls: {} ({} values)".format(
+                self.isclose['batched_calls'],
+                self.isclose['batched_values']))
+        lines.append("solves: {}".format(self.solves))
+        for iterations, count in sorted(self.iterations.items()):
+            label = ("not converged" if iterations < 0
+                     else "{} iterations".format(iterations))
+            lines.append("  {:>16s}: {}".format(label, count))
+        return "\n".join(lines)
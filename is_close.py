@@ -23,6 +23,13 @@ License: Apache License 2.0 http://opensource.org/licenses/apache2.0.php
 
 """
 import cmath
+import math
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 def isclose(a,
@@ -101,3 +108,239 @@ def isclose(a,
     else:
         raise ValueError('method must be one of:'
                          ' "asymmetric", "strong", "weak", "average"')
+
+
+def isclose_array(a,
+                  b,
+                  rel_tol=1e-9,
+                  abs_tol=0.0,
+                  method='weak'):
+    """
+    vectorized version of isclose() -- requires numpy
+
+    returns a boolean array of the element-wise results of isclose(a, b)
+    for the given method. a and b can be any array-like objects that can
+    be broadcast together, including complex arrays.
+
+    The results match isclose() exactly, including the handling of inf
+    and NaN.
+
+    See isclose() for the parameters.
+    """
+    if np is None:
+        raise ImportError("isclose_array requires numpy")
+
+    if method not in ("asymmetric", "strong", "weak", "average"):
+        raise ValueError('method must be one of: "asymmetric",'
+                         ' "strong", "weak", "average"')
+
+    if rel_tol < 0.0 or abs_tol < 0.0:
+        raise ValueError('error tolerances must be non-negative')
+
+    a = np.asarray(a)
+    b = np.asarray(b)
+
+    # the inf - inf and inf * 0.0 results are all masked out below
+    with np.errstate(invalid='ignore', over='ignore'):
+        diff = np.abs(b - a)
+        if method == "asymmetric":
+            result = diff <= np.abs(rel_tol * b)
+        elif method == "strong":
+            result = ((diff <= np.abs(rel_tol * b)) &
+                      (diff <= np.abs(rel_tol * a)))
+        elif method == "weak":
+            result = ((diff <= np.abs(rel_tol * b)) |
+                      (diff <= np.abs(rel_tol * a)))
+        else:  # "average"
+            result = diff <= np.abs(rel_tol * (a + b) / 2)
+        result |= diff <= abs_tol
+
+    # np.isinf() is True for complex values with either part infinite,
+    # matching cmath.isinf()
+    result &= ~(np.isinf(a) | np.isinf(b))
+    result |= a == b
+    return result
+
+
+def _make_kernel(method, rel_tol, abs_tol):
+    """
+    returns an isclose(a, b) function for the given method, with the
+    tolerances bound in -- no validation is done.
+    """
+    # the equality and inf checks are the same as isclose(), inlined in
+    # each kernel to save a function call.
+    if method == "asymmetric":
+        def kernel(a, b):
+            if a == b:
+                return True
+            if cmath.isinf(a) or cmath.isinf(b):
+                return False
+            diff = abs(b - a)
+            return (diff <= abs(rel_tol * b)) or (diff <= abs_tol)
+    elif method == "strong":
+        def kernel(a, b):
+            if a == b:
+                return True
+            if cmath.isinf(a) or cmath.isinf(b):
+                return False
+            diff = abs(b - a)
+            return (((diff <= abs(rel_tol * b)) and
+                     (diff <= abs(rel_tol * a))) or
+                    (diff <= abs_tol))
+    elif method == "weak":
+        def kernel(a, b):
+            if a == b:
+                return True
+            if cmath.isinf(a) or cmath.isinf(b):
+                return False
+            diff = abs(b - a)
+            return (((diff <= abs(rel_tol * b)) or
+                     (diff <= abs(rel_tol * a))) or
+                    (diff <= abs_tol))
+    else:  # "average"
+        def kernel(a, b):
+            if a == b:
+                return True
+            if cmath.isinf(a) or cmath.isinf(b):
+                return False
+            diff = abs(b - a)
+            return ((diff <= abs(rel_tol * (a + b) / 2) or
+                    (diff <= abs_tol)))
+    return kernel
+
+
+class Comparator:
+    """
+    A pre-validated isclose() test
+
+    The tolerances and method are checked once, when the Comparator is
+    created, so calling it only does the arithmetic::
+
+        close = Comparator(rel_tol=1e-6, method='strong')
+        while not close(x_new, x_old):
+            ...
+
+    :param rel_tol=1e-9: The relative tolerance
+
+    :param abs_tol=0.0: The minimum absolute tolerance
+
+    :param method='weak': "asymmetric", "strong", "weak" or "average"
+
+    See isclose() for the details.
+    """
+    def __init__(self, rel_tol=1e-9, abs_tol=0.0, method='weak'):
+        if method not in ("asymmetric", "strong", "weak", "average"):
+            raise ValueError('method must be one of: "asymmetric",'
+                             ' "strong", "weak", "average"')
+
+        if rel_tol < 0.0 or abs_tol < 0.0:
+            raise ValueError('error tolerances must be non-negative')
+
+        self.rel_tol = rel_tol
+        self.abs_tol = abs_tol
+        self.method = method
+        self._kernel = _make_kernel(method, rel_tol, abs_tol)
+
+    def __repr__(self):
+        return "Comparator(rel_tol=%r, abs_tol=%r, method=%r)" % (
+            self.rel_tol, self.abs_tol, self.method)
+
+    def __call__(self, a, b):
+        return self._kernel(a, b)
+
+    def many(self, a_seq, b_seq):
+        """
+        returns a list of the element-wise results for two sequences
+        """
+        if len(a_seq) != len(b_seq):
+            raise ValueError('sequences must be the same length')
+        kernel = self._kernel
+        return [kernel(a, b) for a, b in zip(a_seq, b_seq)]
+
+    def allclose(self, a_seq, b_seq, count=False):
+        """
+        returns the index of the first pair that is not close, or -1 if
+        all the pairs are close.
+
+        if count is True, returns (first_index, number_of_failures)
+        """
+        if len(a_seq) != len(b_seq):
+            raise ValueError('sequences must be the same length')
+        kernel = self._kernel
+        first = -1
+        failures = 0
+        for i, (a, b) in enumerate(zip(a_seq, b_seq)):
+            if not kernel(a, b):
+                if not count:
+                    return i
+                if first < 0:
+                    first = i
+                failures += 1
+        if count:
+            return first, failures
+        return first
+
+    def array(self, a, b):
+        """
+        element-wise results for array-like a and b -- requires numpy
+
+        see isclose_array()
+        """
+        return isclose_array(a, b, self.rel_tol, self.abs_tol, self.method)
+
+
+_as_int64 = struct.Struct('<q')
+_as_double = struct.Struct('<d')
+
+
+def _ulps_key(x):
+    """
+    maps a float onto an integer so that adjacent floats differ by one.
+
+    The bit pattern of a double is a sign-magnitude integer -- this
+    converts it to the equivalent two's complement value, so 0.0 and
+    -0.0 both map to zero.
+    """
+    i, = _as_int64.unpack(_as_double.pack(x))
+    if i < 0:
+        i = -(i & 0x7fffffffffffffff)
+    return i
+
+
+def ulps_distance(a, b):
+    """
+    returns the number of units in the last place between two floats
+
+    i.e. how many representable floats you have to step through to get
+    from a to b.
+    """
+    if math.isnan(a) or math.isnan(b):
+        raise ValueError("ULP distance is not defined for NaN")
+    return abs(_ulps_key(a) - _ulps_key(b))
+
+
+def isclose_ulps(a, b, max_ulps=4):
+    """
+    returns True if a and b are no more than max_ulps units in the last
+    place apart. False otherwise
+
+    This is the "ulps-based" alternative discussed in PEP 485 -- it only
+    makes sense for floats, and the tolerance is fixed by the float
+    format rather than chosen by the user.
+
+    NOTES:
+
+    0.0 and -0.0 are the same value. NaN is not close to anything, and
+    inf and -inf are only close to themselves (even though inf is only
+    one ULP from the largest float).
+
+    The C version is is_close_module.isclose_ulps
+    """
+    if max_ulps < 0:
+        raise ValueError('max_ulps must be non-negative')
+
+    if a == b:  # short-circuit exact equality
+        return True
+    if math.isinf(a) or math.isinf(b) or math.isnan(a) or math.isnan(b):
+        return False
+    return abs(_ulps_key(a) - _ulps_key(b)) <= max_ulps
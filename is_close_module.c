@@ -1,15 +1,312 @@
 /* is_close implimentation in C  */
 
 #include "Python.h"
+#include "structmember.h"
+#include <stdint.h>
+#ifdef HAVE_PTHREAD_H
+#include <pthread.h>
+#endif
 
 
+static int
+is_close_weak(double a, double b, double rel_tol, double abs_tol)
+{
+    double diff;
+
+    if ( a == b ){
+        /* short circuit exact equality -- needed to catch two
+           infinities of the same sign. And perhaps speeds things
+           up a bit sometimes.
+        */
+        return 1;
+    }
+
+    /* This catches the case of two infinities of opposite sign, or
+       one infinity and one finite number. Two infinities of opposite
+       sign would otherwise have an infinite relative tolerance.
+
+       Two infinities of the same sign are caught by the equality check
+       above.
+    */
+
+    if (Py_IS_INFINITY(a) || Py_IS_INFINITY(b)){
+        return 0;
+    }
+
+    /* now do the regular computation
+       this is essentially the "weak" test from the Boost library
+    */
+
+    diff = fabs(b - a);
+
+    return (((diff <= fabs(rel_tol * b)) ||
+             (diff <= fabs(rel_tol * a))) ||
+             (diff <= abs_tol));
+}
+
+
+
+/* The other methods from the experimental is_close.py -- these are
+   only used by Comparator objects. See is_close.py for a description.
+*/
+
+static int
+is_close_asymmetric(double a, double b, double rel_tol, double abs_tol)
+{
+    double diff;
+
+    if ( a == b )
+        return 1;
+    if (Py_IS_INFINITY(a) || Py_IS_INFINITY(b))
+        return 0;
+
+    diff = fabs(b - a);
+    return (diff <= fabs(rel_tol * b)) || (diff <= abs_tol);
+}
+
+static int
+is_close_strong(double a, double b, double rel_tol, double abs_tol)
+{
+    double diff;
+
+    if ( a == b )
+        return 1;
+    if (Py_IS_INFINITY(a) || Py_IS_INFINITY(b))
+        return 0;
+
+    diff = fabs(b - a);
+    return (((diff <= fabs(rel_tol * b)) &&
+             (diff <= fabs(rel_tol * a))) ||
+             (diff <= abs_tol));
+}
+
+static int
+is_close_average(double a, double b, double rel_tol, double abs_tol)
+{
+    double diff;
+
+    if ( a == b )
+        return 1;
+    if (Py_IS_INFINITY(a) || Py_IS_INFINITY(b))
+        return 0;
+
+    diff = fabs(b - a);
+    return (diff <= fabs(rel_tol * (a + b) / 2)) || (diff <= abs_tol);
+}
+
+typedef int (*isclose_kernel)(double a, double b,
+                              double rel_tol, double abs_tol);
+
+static struct {
+    const char *name;
+    isclose_kernel kernel;
+} isclose_methods[] = {
+    {"asymmetric", is_close_asymmetric},
+    {"strong", is_close_strong},
+    {"weak", is_close_weak},
+    {"average", is_close_average},
+    {NULL, NULL}
+};
+
+/* look up a method kernel by name -- sets ValueError if there isn't one */
+static isclose_kernel
+get_kernel(const char *method)
+{
+    int i;
+
+    for (i = 0; isclose_methods[i].name != NULL; i++) {
+        if (strcmp(method, isclose_methods[i].name) == 0)
+            return isclose_methods[i].kernel;
+    }
+    PyErr_SetString(PyExc_ValueError,
+                    "method must be one of: \"asymmetric\", "
+                    "\"strong\", \"weak\", \"average\"");
+    return NULL;
+}
+
+/* convert an argument to a double, with a fast path for exact floats */
+static inline int
+as_double(PyObject *obj, double *result)
+{
+    if (PyFloat_CheckExact(obj)) {
+        *result = PyFloat_AS_DOUBLE(obj);
+        return 0;
+    }
+    *result = PyFloat_AsDouble(obj);
+    if (*result == -1.0 && PyErr_Occurred())
+        return -1;
+    return 0;
+}
+
+/* Opt-in instrumentation -- see set_stats(). The counters are only
+   touched with the GIL held, and when they are turned off cost one
+   (well predicted) branch per call. The batched functions count calls
+   and values, not the outcome of each comparison.
+*/
+static int stats_enabled = 0;
+
+static struct {
+    unsigned long long calls;
+    unsigned long long equal;       /* exact equality short circuit */
+    unsigned long long nonfinite;   /* rejected by the infinity check */
+    unsigned long long rel_tol;     /* accepted by the relative tolerance */
+    unsigned long long abs_tol;     /* accepted by abs_tol alone */
+    unsigned long long not_close;   /* outside both tolerances, or NaN */
+    unsigned long long comparator_calls;
+    unsigned long long batched_calls;
+    unsigned long long batched_values;
+} stats;
+
+/* is_close_weak(), recording which branch decided the result */
+static int
+is_close_weak_counted(double a, double b, double rel_tol, double abs_tol)
+{
+    double diff;
+
+    stats.calls++;
+    if ( a == b ){
+        stats.equal++;
+        return 1;
+    }
+    if (Py_IS_INFINITY(a) || Py_IS_INFINITY(b)){
+        stats.nonfinite++;
+        return 0;
+    }
+    diff = fabs(b - a);
+    if ((diff <= fabs(rel_tol * b)) || (diff <= fabs(rel_tol * a))){
+        stats.rel_tol++;
+        return 1;
+    }
+    if (diff <= abs_tol){
+        stats.abs_tol++;
+        return 1;
+    }
+    stats.not_close++;
+    return 0;
+}
+
+static inline void
+count_batch(Py_ssize_t n)
+{
+    if (stats_enabled) {
+        stats.batched_calls++;
+        stats.batched_values += (unsigned long long) n;
+    }
+}
+
+static PyObject *
+set_stats_c(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+    int enabled;
+    int previous = stats_enabled;
+
+    static char *keywords[] = {"enabled", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "p:set_stats",
+                                     keywords, &enabled))
+        return NULL;
+    stats_enabled = enabled;
+    return PyBool_FromLong(previous);
+}
+
+PyDoc_STRVAR(set_stats_doc,
+"set_stats(enabled)\n\n"
+"Turn the counting of calls on or off. Returns the previous setting.\n\n"
+"Counting is off to start with. Turning it off doesn't reset the\n"
+"counters -- see reset_stats().\n");
+
+static PyObject *
+get_stats_c(PyObject *self, PyObject *unused)
+{
+    return Py_BuildValue("{sKsKsKsKsKsKsKsKsK}",
+                         "calls", stats.calls,
+                         "equal", stats.equal,
+                         "nonfinite", stats.nonfinite,
+                         "rel_tol", stats.rel_tol,
+                         "abs_tol", stats.abs_tol,
+                         "not_close", stats.not_close,
+                         "comparator_calls", stats.comparator_calls,
+                         "batched_calls", stats.batched_calls,
+                         "batched_values", stats.batched_values);
+}
+
+PyDoc_STRVAR(get_stats_doc,
+"get_stats()\n\n"
+"Returns a dict of the counters:\n\n"
+"  calls: calls of isclose()\n"
+"  equal: ... that returned True because a == b\n"
+"  nonfinite: ... that returned False because of an infinity\n"
+"  rel_tol: ... that returned True by the relative tolerance\n"
+"  abs_tol: ... that returned True by abs_tol alone\n"
+"  not_close: ... that returned False otherwise (including NaN)\n"
+"  comparator_calls: calls of Comparator objects\n"
+"  batched_calls: calls of the functions that compare buffers\n"
+"  batched_values: the number of pairs passed to them\n");
+
+static PyObject *
+reset_stats_c(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *counts = Py_None;
+    unsigned long long saved[9];
+    Py_ssize_t found = 0;
+    int i;
+
+    /* in the order of the struct -- all the fields are counters */
+    static const char *names[] = {"calls", "equal", "nonfinite", "rel_tol",
+                                  "abs_tol", "not_close", "comparator_calls",
+                                  "batched_calls", "batched_values"};
+    static char *keywords[] = {"counts", NULL};
+
+    Py_BUILD_ASSERT(sizeof(saved) == sizeof(stats));
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|O:reset_stats",
+                                     keywords, &counts))
+        return NULL;
+    if (counts == Py_None) {
+        memset(&stats, 0, sizeof(stats));
+        Py_RETURN_NONE;
+    }
+    if (!PyDict_Check(counts)) {
+        PyErr_SetString(PyExc_TypeError,
+                        "counts must be a dict, as from get_stats()");
+        return NULL;
+    }
+    for (i = 0; i < 9; i++) {
+        PyObject *value = PyDict_GetItemString(counts, names[i]);
+
+        saved[i] = 0;
+        if (value == NULL)
+            continue;
+        found++;
+        saved[i] = PyLong_AsUnsignedLongLong(value);
+        if (saved[i] == (unsigned long long) -1 && PyErr_Occurred())
+            return NULL;
+    }
+    if (found != PyDict_GET_SIZE(counts)) {
+        PyErr_SetString(PyExc_ValueError,
+                        "counts has keys that are not counters");
+        return NULL;
+    }
+    memcpy(&stats, saved, sizeof(stats));
+    Py_RETURN_NONE;
+}
+
+PyDoc_STRVAR(reset_stats_doc,
+"reset_stats(counts=None)\n\n"
+"Set all the counters back to zero -- or to the values in counts, a\n"
+"dict as returned by get_stats(), to put back counters saved earlier.\n"
+"Counters missing from counts are set to zero.\n");
+
+/* The general argument handling for isclose() -- only used when the
+   fast path in isclose_c() can't handle the arguments, so that
+   the error messages are the standard ones.
+*/
 static PyObject *
-isclose_c(PyObject *self, PyObject *args, PyObject *kwargs)
+isclose_general(PyObject *args, PyObject *kwargs)
 {
     double a, b;
     double rel_tol = 1e-9;
     double abs_tol = 0.0;
-    double diff = 0.0;
     long result = 0;
 
     static char *keywords[] = {"a", "b", "rel_tol", "abs_tol", NULL};
@@ -28,37 +325,105 @@ isclose_c(PyObject *self, PyObject *args, PyObject *kwargs)
         return NULL;
     }
 
-    if ( a == b ){
-        /* short circuit exact equality -- needed to catch two
-           infinities of the same sign. And perhaps speeds things
-           up a bit sometimes.
-        */
-        Py_RETURN_TRUE;
+    if (stats_enabled)
+        result = is_close_weak_counted(a, b, rel_tol, abs_tol);
+    else
+        result = is_close_weak(a, b, rel_tol, abs_tol);
+
+    return PyBool_FromLong(result);
+}
+
+/* build a tuple and dict from the vectorcall arguments, and go the
+   slow way
+*/
+static PyObject *
+isclose_slow(PyObject *const *args, Py_ssize_t nargs, PyObject *kwnames)
+{
+    PyObject *tuple, *dict = NULL, *result = NULL;
+    Py_ssize_t i;
+
+    tuple = PyTuple_New(nargs);
+    if (tuple == NULL)
+        return NULL;
+    for (i = 0; i < nargs; i++) {
+        Py_INCREF(args[i]);
+        PyTuple_SET_ITEM(tuple, i, args[i]);
+    }
+    if (kwnames != NULL) {
+        dict = PyDict_New();
+        if (dict == NULL)
+            goto done;
+        for (i = 0; i < PyTuple_GET_SIZE(kwnames); i++) {
+            if (PyDict_SetItem(dict, PyTuple_GET_ITEM(kwnames, i),
+                               args[nargs + i]) < 0)
+                goto done;
+        }
     }
+    result = isclose_general(tuple, dict);
 
-    /* This catches the case of two infinities of opposite sign, or
-       one infinity and one finite number. Two infinities of opposite
-       sign would otherwise have an infinite relative tolerance.
+  done:
+    Py_DECREF(tuple);
+    Py_XDECREF(dict);
+    return result;
+}
 
-       Two infinities of the same sign are caught by the equality check
-       above.
-    */
+static PyObject *
+isclose_c(PyObject *self, PyObject *const *args, Py_ssize_t nargs,
+          PyObject *kwnames)
+{
+    /* a, b, rel_tol, abs_tol */
+    double values[4] = {0.0, 0.0, 1e-9, 0.0};
+    int seen[4] = {0, 0, 0, 0};
+    Py_ssize_t i, nkw;
 
-    if (Py_IS_INFINITY(a) || Py_IS_INFINITY(b)){
-        Py_RETURN_FALSE;
+    static const char *keywords[] = {"a", "b", "rel_tol", "abs_tol"};
+
+    /* by far the most common call: isclose(x, y) with two floats */
+    if (nargs == 2 && kwnames == NULL && !stats_enabled &&
+        PyFloat_CheckExact(args[0]) && PyFloat_CheckExact(args[1]))
+        return PyBool_FromLong(is_close_weak(PyFloat_AS_DOUBLE(args[0]),
+                                             PyFloat_AS_DOUBLE(args[1]),
+                                             1e-9, 0.0));
+
+    if (nargs > 4)
+        return isclose_slow(args, nargs, kwnames);
+    for (i = 0; i < nargs; i++) {
+        if (as_double(args[i], &values[i]) < 0)
+            return NULL;
+        seen[i] = 1;
     }
 
-    /* now do the regular computation
-       this is essentially the "weak" test from the Boost library
-    */
+    nkw = (kwnames == NULL) ? 0 : PyTuple_GET_SIZE(kwnames);
+    for (i = 0; i < nkw; i++) {
+        PyObject *name = PyTuple_GET_ITEM(kwnames, i);
+        int k;
 
-    diff = fabs(b - a);
+        for (k = 0; k < 4; k++) {
+            if (PyUnicode_CompareWithASCIIString(name, keywords[k]) == 0)
+                break;
+        }
+        if (k == 4 || seen[k])
+            /* unknown or duplicate keyword -- let the slow path
+               raise the error */
+            return isclose_slow(args, nargs, kwnames);
+        if (as_double(args[nargs + i], &values[k]) < 0)
+            return NULL;
+        seen[k] = 1;
+    }
+    if (!seen[0] || !seen[1])
+        return isclose_slow(args, nargs, kwnames);
 
-    result = (((diff <= fabs(rel_tol * b)) ||
-                   (diff <= fabs(rel_tol * a))) ||
-                   (diff <= abs_tol)) ;
+    if (values[2] < 0.0 || values[3] < 0.0 ){
+        PyErr_SetString(PyExc_ValueError,
+                            "error tolerances must be non-negative");
+        return NULL;
+    }
 
-    return PyBool_FromLong(result);
+    if (stats_enabled)
+        return PyBool_FromLong(is_close_weak_counted(values[0], values[1],
+                                                     values[2], values[3]));
+    return PyBool_FromLong(is_close_weak(values[0], values[1],
+                                         values[2], values[3]));
 }
 
 PyDoc_STRVAR(isclose_doc,
@@ -78,23 +443,2066 @@ PyDoc_STRVAR(isclose_doc,
 "only close to themselves.\n\n"
 "See PEP-0485 for a detailed description\n");
 
-static PyMethodDef IsCloseMethods[] = {
-    {"isclose", (PyCFunction) isclose_c, METH_VARARGS | METH_KEYWORDS,
-     "determine if two floating point numbers are close"},
-    {NULL, NULL, 0, NULL}        /* Sentinel */
+/* The types of values the batched functions work on. float32 and
+   float16 values are converted to double as they are read, so the
+   comparison is exactly the same as for the values as float64 -- but
+   without making a float64 copy.
+*/
+typedef enum {
+    FLOAT64,
+    FLOAT32,
+    FLOAT16
+} value_type;
+
+static const struct {
+    const char *format;   /* struct module format character */
+    Py_ssize_t itemsize;
+    const char *name;
+} value_types[] = {
+    {"d", 8, "float64"},
+    {"f", 4, "float32"},
+    {"e", 2, "float16"},
 };
 
-static struct PyModuleDef is_close_module = {
-   PyModuleDef_HEAD_INIT,
-   "is_close_module",   /* name of module */
-   "docstring for is_close_module module", /* module documentation, may be NULL */
-   -1,           /* size of per-interpreter state of the module,
-                    or -1 if the module keeps state in global variables. */
-   IsCloseMethods
+/* 2**(1023 - 15): the difference in the exponent biases of double and
+   half precision
+*/
+#define HALF_EXPONENT_SCALE 2.7430620343968443e303
+
+/* IEEE 754 half precision bits to double -- exact
+
+   The exponent and mantissa bits are put in the same places in a
+   double, which gives the right value scaled by 2**-(1023 - 15) -- for
+   subnormal halves too, as they land as subnormal doubles -- so one
+   multiply fixes it. Only inf and NaN need a branch.
+*/
+static inline double
+half_to_double(uint16_t h)
+{
+    uint64_t sign = (uint64_t) (h & 0x8000) << 48;
+    uint64_t bits = sign | ((uint64_t) (h & 0x7fff) << 42);
+    double value;
+
+    if ((h & 0x7c00) == 0x7c00) {
+        /* inf or NaN -- all ones exponent */
+        bits = sign | ((uint64_t) 0x7ff << 52) |
+               ((uint64_t) (h & 0x3ff) << 42);
+        memcpy(&value, &bits, sizeof(value));
+        return value;
+    }
+    memcpy(&value, &bits, sizeof(value));
+    return value * HALF_EXPONENT_SCALE;
+}
+
+/* The format of a buffer, without a native / standard byte order
+   marker, and whether it is a raw byte format.
+*/
+static const char *
+buffer_format(const Py_buffer *view, int *raw)
+{
+    const char *fmt = view->format ? view->format : "B";
+
+    if (fmt[0] == '@' || fmt[0] == '=' ||
+#if PY_LITTLE_ENDIAN
+        fmt[0] == '<'
+#else
+        fmt[0] == '>'
+#endif
+        )
+        fmt++;
+    *raw = (strcmp(fmt, "B") == 0 || strcmp(fmt, "b") == 0 ||
+            strcmp(fmt, "c") == 0);
+    return fmt;
+}
+
+/* Get a read-only view of obj as a contiguous run of values of the
+   given type.
+
+   Accepts anything that supports the buffer protocol with the matching
+   format -- "d", "f" or "e" (array.array('d'), memoryview.cast('d'),
+   numpy float64 / float32 / float16 arrays), or a raw byte buffer
+   (bytes, bytearray, mmap) whose length is a multiple of the item size,
+   which is read as native data of the type.
+
+   On success fills in view and *n (the number of values) and returns 0.
+   The caller is responsible for PyBuffer_Release(view).
+*/
+static int
+get_typed_buffer(PyObject *obj, Py_buffer *view, Py_ssize_t *n,
+                 int writable, const char *name, value_type type)
+{
+    int flags = PyBUF_C_CONTIGUOUS | PyBUF_FORMAT;
+    Py_ssize_t itemsize = value_types[type].itemsize;
+    const char *fmt;
+    int raw;
+
+    if (writable)
+        flags |= PyBUF_WRITABLE;
+
+    if (PyObject_GetBuffer(obj, view, flags) < 0)
+        return -1;
+
+    fmt = buffer_format(view, &raw);
+    if (strcmp(fmt, value_types[type].format) == 0 &&
+        view->itemsize == itemsize) {
+        *n = view->len / itemsize;
+        return 0;
+    }
+    if (raw && view->len % itemsize == 0) {
+        *n = view->len / itemsize;
+        return 0;
+    }
+
+    PyErr_Format(PyExc_TypeError,
+                 "%s must be a contiguous buffer of %s values, "
+                 "not format '%s' with %zd bytes",
+                 name, value_types[type].name,
+                 view->format ? view->format : "B", view->len);
+    PyBuffer_Release(view);
+    return -1;
+}
+
+static int
+get_double_buffer(PyObject *obj, Py_buffer *view, Py_ssize_t *n,
+                  int writable, const char *name)
+{
+    return get_typed_buffer(obj, view, n, writable, name, FLOAT64);
+}
+
+/* Get the views for a batched operation: two float64 buffers of the same
+   length, and (if out_obj is not NULL) a writable output buffer big
+   enough to hold one result bit per element.
+
+   Returns 0 on success; release the views with release_operands().
+*/
+static int
+get_typed_operands(PyObject *a_obj, PyObject *b_obj, PyObject *out_obj,
+                   Py_buffer *a_view, Py_buffer *b_view, Py_buffer *out_view,
+                   Py_ssize_t *n, value_type type)
+{
+    Py_ssize_t n_b;
+
+    if (get_typed_buffer(a_obj, a_view, n, 0, "a", type) < 0)
+        return -1;
+    if (get_typed_buffer(b_obj, b_view, &n_b, 0, "b", type) < 0) {
+        PyBuffer_Release(a_view);
+        return -1;
+    }
+    if (*n != n_b) {
+        PyErr_Format(PyExc_ValueError,
+                     "a and b must be the same length (%zd != %zd)",
+                     *n, n_b);
+        goto fail;
+    }
+    if (out_obj == NULL)
+        return 0;
+
+    if (PyObject_GetBuffer(out_obj, out_view,
+                           PyBUF_C_CONTIGUOUS | PyBUF_WRITABLE) < 0)
+        goto fail;
+    if (out_view->len < (*n + 7) / 8) {
+        PyErr_Format(PyExc_ValueError,
+                     "out must hold at least %zd bytes for %zd values",
+                     (*n + 7) / 8, *n);
+        PyBuffer_Release(out_view);
+        goto fail;
+    }
+    return 0;
+
+  fail:
+    PyBuffer_Release(b_view);
+    PyBuffer_Release(a_view);
+    return -1;
+}
+
+static int
+get_operands(PyObject *a_obj, PyObject *b_obj, PyObject *out_obj,
+             Py_buffer *a_view, Py_buffer *b_view, Py_buffer *out_view,
+             Py_ssize_t *n)
+{
+    return get_typed_operands(a_obj, b_obj, out_obj,
+                              a_view, b_view, out_view, n, FLOAT64);
+}
+
+static void
+release_operands(Py_buffer *a_view, Py_buffer *b_view, Py_buffer *out_view)
+{
+    if (out_view != NULL)
+        PyBuffer_Release(out_view);
+    PyBuffer_Release(b_view);
+    PyBuffer_Release(a_view);
+}
+
+/* A slice of a batched comparison. start must be a multiple of 8 so
+   that each task writes whole bytes of the output, and tasks can run
+   in parallel.
+*/
+typedef struct {
+    const void *a;
+    const void *b;
+    value_type type;
+    unsigned char *out;
+    Py_ssize_t start;
+    Py_ssize_t stop;
+    isclose_kernel kernel;
+    double rel_tol;
+    double abs_tol;
+    Py_ssize_t count;   /* result: number of close pairs */
+} many_task;
+
+/* don't bother starting a thread for less work than this */
+#define MIN_ELEMENTS_PER_THREAD 65536
+
+#define LOAD_FLOAT64(p, i) (((const double *) (p))[i])
+#define LOAD_FLOAT32(p, i) ((double) ((const float *) (p))[i])
+#define LOAD_FLOAT16(p, i) half_to_double(((const uint16_t *) (p))[i])
+
+/* result bit i lives in bit (i % 8) of byte (i / 8) -- the same
+   layout as numpy.packbits(..., bitorder='little')
+*/
+#define MANY_LOOP(LOAD)                                               \
+    for (i = task->start; i < task->stop; i++) {                      \
+        if (kernel(LOAD(a, i), LOAD(b, i),                            \
+                   task->rel_tol, task->abs_tol)) {                   \
+            byte |= (unsigned char) (1 << (i & 7));                   \
+            count++;                                                  \
+        }                                                             \
+        if ((i & 7) == 7) {                                           \
+            out[i >> 3] = byte;                                       \
+            byte = 0;                                                 \
+        }                                                             \
+    }
+
+/* Branchless weak test, for the batched float64 and float32 loops.
+
+   is_close_weak() returns early for equal values and infinities, which
+   keeps the compiler from vectorizing a loop over it. This computes the
+   same answer with every comparison evaluated, combined with bitwise
+   & and | rather than && and ||:
+
+   - a == b is the short circuit for equal values (and two infinities
+     of the same sign)
+   - an infinity that isn't equal to the other value is never close --
+     without the check inf would be within inf * rel_tol of anything
+   - a NaN fails every comparison, so is never close
+
+   The loops compute a block of results into bytes first (which
+   vectorizes), then pack them into bits.
+*/
+#define WEAK_BLOCK 64
+
+#if defined(__GNUC__)
+#define ALWAYS_INLINE inline __attribute__((always_inline))
+#else
+#define ALWAYS_INLINE inline
+#endif
+
+static ALWAYS_INLINE unsigned char
+is_close_weak_branchless(double a, double b, double rel_tol, double abs_tol)
+{
+    double diff = fabs(b - a);
+
+    return (unsigned char) ((a == b) |
+                            ((fabs(a) != Py_HUGE_VAL) &
+                             (fabs(b) != Py_HUGE_VAL) &
+                             ((diff <= rel_tol * fabs(b)) |
+                              (diff <= rel_tol * fabs(a)) |
+                              (diff <= abs_tol))));
+}
+
+/* pack 8 bytes of 0 or 1 into the bits of one byte, first one lowest */
+static ALWAYS_INLINE unsigned char
+pack_byte(const unsigned char *r)
+{
+#if PY_LITTLE_ENDIAN
+    uint64_t x;
+
+    memcpy(&x, r, 8);
+    return (unsigned char) ((x * 0x0102040810204080ULL) >> 56);
+#else
+    return (unsigned char) (r[0] | r[1] << 1 | r[2] << 2 | r[3] << 3 |
+                            r[4] << 4 | r[5] << 5 | r[6] << 6 | r[7] << 7);
+#endif
+}
+
+#define WEAK_LOOP_BODY(TYPE)                                          \
+    const TYPE *a = (const TYPE *) a_;                                \
+    const TYPE *b = (const TYPE *) b_;                                \
+    unsigned char r[WEAK_BLOCK];                                      \
+    Py_ssize_t count = 0;                                             \
+    Py_ssize_t i, j, n;                                               \
+                                                                      \
+    for (i = start; i < stop; i += WEAK_BLOCK) {                      \
+        n = stop - i < WEAK_BLOCK ? stop - i : WEAK_BLOCK;            \
+        for (j = 0; j < n; j++)                                       \
+            r[j] = is_close_weak_branchless(a[i + j], b[i + j],       \
+                                            rel_tol, abs_tol);        \
+        for (; j & 7; j++)                                            \
+            r[j] = 0;                                                 \
+        for (j = 0; j < n; j += 8) {                                  \
+            out[(i + j) >> 3] = pack_byte(r + j);                     \
+        }                                                             \
+        for (j = 0; j < n; j++)                                       \
+            count += r[j];                                            \
+    }                                                                 \
+    return count;
+
+typedef Py_ssize_t (*weak_loop)(const void *a_, const void *b_,
+                                unsigned char *out,
+                                Py_ssize_t start, Py_ssize_t stop,
+                                double rel_tol, double abs_tol);
+
+/* A variant of the loops compiled for each instruction set -- the one
+   used is picked when the module is imported (see select_simd()).
+   start must be a multiple of 8.
+*/
+#define DEFINE_WEAK_LOOPS(SUFFIX, ATTRIBUTE)                          \
+    static ATTRIBUTE Py_ssize_t                                       \
+    weak_loop_float64_##SUFFIX(const void *a_, const void *b_,        \
+                               unsigned char *out,                    \
+                               Py_ssize_t start, Py_ssize_t stop,     \
+                               double rel_tol, double abs_tol)        \
+    {                                                                 \
+        WEAK_LOOP_BODY(double)                                        \
+    }                                                                 \
+    static ATTRIBUTE Py_ssize_t                                       \
+    weak_loop_float32_##SUFFIX(const void *a_, const void *b_,        \
+                               unsigned char *out,                    \
+                               Py_ssize_t start, Py_ssize_t stop,     \
+                               double rel_tol, double abs_tol)        \
+    {                                                                 \
+        WEAK_LOOP_BODY(float)                                         \
+    }
+
+/* the baseline -- SSE2 on x86-64 */
+DEFINE_WEAK_LOOPS(generic, )
+
+#if defined(__GNUC__) && defined(__x86_64__)
+#define HAVE_CPU_DISPATCH
+DEFINE_WEAK_LOOPS(avx2, __attribute__((target("avx2"))))
+DEFINE_WEAK_LOOPS(avx512, __attribute__((target("avx512f,avx512bw,avx512vl"))))
+#endif
+
+static const struct {
+    const char *name;
+    weak_loop float64;
+    weak_loop float32;
+} simd_variants[] = {
+#if defined(__x86_64__) || defined(_M_X64)
+    {"sse2", weak_loop_float64_generic, weak_loop_float32_generic},
+#else
+    {"generic", weak_loop_float64_generic, weak_loop_float32_generic},
+#endif
+#ifdef HAVE_CPU_DISPATCH
+    {"avx2", weak_loop_float64_avx2, weak_loop_float32_avx2},
+    {"avx512", weak_loop_float64_avx512, weak_loop_float32_avx512},
+#endif
+    {NULL, NULL, NULL}
 };
 
-PyMODINIT_FUNC
-PyInit_is_close_module(void)
+/* the variant in use -- an index into simd_variants */
+static int simd_variant = 0;
+
+/* can this CPU run simd_variants[i]? */
+static int
+simd_supported(int i)
+{
+#ifdef HAVE_CPU_DISPATCH
+    const char *name = simd_variants[i].name;
+
+    __builtin_cpu_init();
+    if (strcmp(name, "avx2") == 0)
+        return __builtin_cpu_supports("avx2");
+    if (strcmp(name, "avx512") == 0)
+        return (__builtin_cpu_supports("avx512f") &&
+                __builtin_cpu_supports("avx512bw") &&
+                __builtin_cpu_supports("avx512vl"));
+#endif
+    return 1;
+}
+
+/* pick the last (widest) variant this CPU can run */
+static void
+select_simd(void)
+{
+    int i;
+
+    for (i = 0; simd_variants[i].name != NULL; i++) {
+        if (simd_supported(i))
+            simd_variant = i;
+    }
+}
+
+static void
+run_many_task(many_task *task)
+{
+    const void *a = task->a;
+    const void *b = task->b;
+    unsigned char *out = task->out;
+    isclose_kernel kernel = task->kernel;
+    unsigned char byte = 0;
+    Py_ssize_t count = 0;
+    Py_ssize_t i;
+
+    if (kernel == is_close_weak && task->type != FLOAT16) {
+        weak_loop loop = (task->type == FLOAT64 ?
+                          simd_variants[simd_variant].float64 :
+                          simd_variants[simd_variant].float32);
+        task->count = loop(a, b, out, task->start, task->stop,
+                           task->rel_tol, task->abs_tol);
+        return;
+    }
+
+    switch (task->type) {
+    case FLOAT64:
+        MANY_LOOP(LOAD_FLOAT64)
+        break;
+    case FLOAT32:
+        MANY_LOOP(LOAD_FLOAT32)
+        break;
+    case FLOAT16:
+        MANY_LOOP(LOAD_FLOAT16)
+        break;
+    }
+    if (task->stop & 7)
+        out[task->stop >> 3] = byte;
+
+    task->count = count;
+}
+
+#ifdef HAVE_PTHREAD_H
+static void *
+many_task_thread(void *task)
 {
-    return PyModule_Create(&is_close_module);
+    run_many_task((many_task *) task);
+    return NULL;
+}
+#endif
+
+/* Split the work into (at most) nthreads tasks and run them. Must be
+   called without the GIL held -- nothing in here touches Python objects.
+   Returns the total count, or -1 if the task array couldn't be
+   allocated.
+*/
+static Py_ssize_t
+run_many_tasks(many_task *proto, Py_ssize_t n, int nthreads)
+{
+    many_task *tasks;
+    Py_ssize_t per_task, count = 0;
+    int i, ntasks;
+#ifdef HAVE_PTHREAD_H
+    pthread_t *threads;
+    char *started;
+#endif
+
+    if (n / MIN_ELEMENTS_PER_THREAD < nthreads)
+        nthreads = (int) (n / MIN_ELEMENTS_PER_THREAD);
+#ifndef HAVE_PTHREAD_H
+    nthreads = 1;
+#endif
+    if (nthreads <= 1) {
+        proto->start = 0;
+        proto->stop = n;
+        run_many_task(proto);
+        return proto->count;
+    }
+
+    /* round the slices up to a whole number of output bytes */
+    per_task = ((n / nthreads + 7) / 8) * 8;
+    ntasks = (int) ((n + per_task - 1) / per_task);
+
+    tasks = (many_task *) malloc(ntasks * sizeof(many_task));
+    if (tasks == NULL)
+        return -1;
+    for (i = 0; i < ntasks; i++) {
+        tasks[i] = *proto;
+        tasks[i].start = i * per_task;
+        tasks[i].stop = (i == ntasks - 1) ? n : (i + 1) * per_task;
+    }
+
+#ifdef HAVE_PTHREAD_H
+    threads = (pthread_t *) malloc(ntasks * sizeof(pthread_t));
+    started = (char *) calloc(ntasks, 1);
+    if (threads == NULL || started == NULL) {
+        free(threads);
+        free(started);
+        free(tasks);
+        return -1;
+    }
+    /* the last slice runs in this thread. If a thread can't be started,
+       its slice is run here too.
+    */
+    for (i = 0; i < ntasks - 1; i++)
+        started[i] = (pthread_create(&threads[i], NULL,
+                                     many_task_thread, &tasks[i]) == 0);
+    run_many_task(&tasks[ntasks - 1]);
+    for (i = 0; i < ntasks - 1; i++) {
+        if (started[i])
+            pthread_join(threads[i], NULL);
+        else
+            run_many_task(&tasks[i]);
+    }
+    free(started);
+    free(threads);
+#endif
+
+    for (i = 0; i < ntasks; i++)
+        count += tasks[i].count;
+    free(tasks);
+    return count;
+}
+
+static PyObject *
+isclose_many_impl(PyObject *a_obj, PyObject *b_obj, PyObject *out_obj,
+                  value_type type, isclose_kernel kernel,
+                  double rel_tol, double abs_tol, int nthreads)
+{
+    Py_buffer a_view, b_view, out_view;
+    Py_ssize_t n;
+    Py_ssize_t count;
+    many_task task;
+
+    if (nthreads < 1) {
+        PyErr_SetString(PyExc_ValueError, "nthreads must be at least 1");
+        return NULL;
+    }
+
+    if (get_typed_operands(a_obj, b_obj, out_obj,
+                           &a_view, &b_view, &out_view, &n, type) < 0)
+        return NULL;
+
+    count_batch(n);
+    task.a = a_view.buf;
+    task.b = b_view.buf;
+    task.type = type;
+    task.out = (unsigned char *) out_view.buf;
+    task.kernel = kernel;
+    task.rel_tol = rel_tol;
+    task.abs_tol = abs_tol;
+
+    Py_BEGIN_ALLOW_THREADS
+    count = run_many_tasks(&task, n, nthreads);
+    Py_END_ALLOW_THREADS
+
+    release_operands(&a_view, &b_view, &out_view);
+    if (count < 0)
+        return PyErr_NoMemory();
+    return PyLong_FromSsize_t(count);
+}
+
+static PyObject *
+isclose_many_c(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *a_obj, *b_obj, *out_obj;
+    double rel_tol = 1e-9;
+    double abs_tol = 0.0;
+    int nthreads = 1;
+
+    static char *keywords[] = {"a", "b", "out", "rel_tol", "abs_tol",
+                               "nthreads", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OOO|ddi:isclose_many",
+                                     keywords,
+                                     &a_obj, &b_obj, &out_obj,
+                                     &rel_tol, &abs_tol, &nthreads
+                                     ))
+        return NULL;
+
+    if (rel_tol < 0.0 || abs_tol < 0.0 ){
+        PyErr_SetString(PyExc_ValueError,
+                            "error tolerances must be non-negative");
+        return NULL;
+    }
+
+    return isclose_many_impl(a_obj, b_obj, out_obj, FLOAT64,
+                             is_close_weak, rel_tol, abs_tol, nthreads);
+}
+
+PyDoc_STRVAR(isclose_many_doc,
+"isclose_many(a, b, out, rel_tol=1e-9, abs_tol=0.0, nthreads=1)\n\n"
+"Element-wise isclose() of two float64 buffers, with no per-element\n"
+"Python objects.\n\n"
+":param a: contiguous buffer of float64 values (array.array('d'),\n"
+"          memoryview, bytes, numpy array ...)\n\n"
+":param b: buffer of the same length as a\n\n"
+":param out: writable buffer of at least ceil(len(a) / 8) bytes. The\n"
+"            result for element i is written to bit (i % 8) of byte\n"
+"            (i // 8). Unused high bits of the last byte are cleared.\n\n"
+":param rel_tol=1e-9: The relative tolerance\n\n"
+":param abs_tol=0.0: The minimum absolute tolerance\n\n"
+":param nthreads=1: the number of threads to split the work across.\n"
+"                   The GIL is released while comparing.\n\n"
+"Returns the number of elements that are close.\n");
+
+static PyObject *
+set_simd_c(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+    const char *name;
+    int i;
+
+    static char *keywords[] = {"name", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "s:set_simd",
+                                     keywords, &name))
+        return NULL;
+    for (i = 0; simd_variants[i].name != NULL; i++) {
+        if (strcmp(name, simd_variants[i].name) == 0)
+            break;
+    }
+    if (simd_variants[i].name == NULL || !simd_supported(i)) {
+        PyErr_Format(PyExc_ValueError,
+                     "SIMD variant %s is not available on this CPU", name);
+        return NULL;
+    }
+    name = simd_variants[simd_variant].name;
+    simd_variant = i;
+    return PyUnicode_FromString(name);
+}
+
+PyDoc_STRVAR(set_simd_doc,
+"set_simd(name)\n\n"
+"Use another variant of the batched float64 and float32 loops -- one of\n"
+"SIMD_VARIANTS. Returns the name of the previous one.\n\n"
+"The widest variant the CPU supports is picked on import, so this is\n"
+"only needed for testing and benchmarking the others.\n");
+
+static PyObject *
+get_simd_c(PyObject *self, PyObject *unused)
+{
+    return PyUnicode_FromString(simd_variants[simd_variant].name);
+}
+
+PyDoc_STRVAR(get_simd_doc,
+"get_simd()\n\n"
+"Returns the name of the variant of the batched loops in use.\n");
+
+/* Default relative tolerances for the narrower types -- like the 1e-9
+   for float64, a bit over half the digits the type holds (float32 has
+   about 7, float16 about 3)
+*/
+#define FLOAT32_REL_TOL 1e-4
+#define FLOAT16_REL_TOL 1e-2
+
+static PyObject *
+isclose_many_typed(PyObject *args, PyObject *kwargs, value_type type,
+                   double rel_tol, const char *format)
+{
+    PyObject *a_obj, *b_obj, *out_obj;
+    double abs_tol = 0.0;
+    int nthreads = 1;
+
+    static char *keywords[] = {"a", "b", "out", "rel_tol", "abs_tol",
+                               "nthreads", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, format, keywords,
+                                     &a_obj, &b_obj, &out_obj,
+                                     &rel_tol, &abs_tol, &nthreads
+                                     ))
+        return NULL;
+
+    if (rel_tol < 0.0 || abs_tol < 0.0 ){
+        PyErr_SetString(PyExc_ValueError,
+                            "error tolerances must be non-negative");
+        return NULL;
+    }
+
+    return isclose_many_impl(a_obj, b_obj, out_obj, type,
+                             is_close_weak, rel_tol, abs_tol, nthreads);
+}
+
+static PyObject *
+isclose_many_float32_c(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+    return isclose_many_typed(args, kwargs, FLOAT32, FLOAT32_REL_TOL,
+                              "OOO|ddi:isclose_many_float32");
+}
+
+PyDoc_STRVAR(isclose_many_float32_doc,
+"isclose_many_float32(a, b, out, rel_tol=1e-4, abs_tol=0.0, nthreads=1)\n\n"
+"isclose_many() for float32 buffers (array.array('f'), numpy float32\n"
+"arrays, or raw bytes). The values are compared as the doubles they\n"
+"convert to, without making a float64 copy. The default rel_tol suits\n"
+"the precision of float32.\n");
+
+static PyObject *
+isclose_many_float16_c(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+    return isclose_many_typed(args, kwargs, FLOAT16, FLOAT16_REL_TOL,
+                              "OOO|ddi:isclose_many_float16");
+}
+
+PyDoc_STRVAR(isclose_many_float16_doc,
+"isclose_many_float16(a, b, out, rel_tol=1e-2, abs_tol=0.0, nthreads=1)\n\n"
+"isclose_many() for IEEE 754 half precision buffers (numpy float16\n"
+"arrays, or raw bytes). The values are compared as the doubles they\n"
+"convert to, without making a float64 copy. The default rel_tol suits\n"
+"the precision of float16.\n");
+
+/* result of an allclose() scan -- first index is -1 if there were
+   no failures
+*/
+static PyObject *
+allclose_result(Py_ssize_t first, Py_ssize_t failures, int count)
+{
+    if (count)
+        return Py_BuildValue("(nn)", first, failures);
+    return PyLong_FromSsize_t(first);
+}
+
+/* Whether obj is a buffer that allclose() should read as float64
+   values: a contiguous buffer of "d" values, or a raw byte buffer.
+   Anything else -- array('l'), numpy int arrays, strided views -- is
+   read as a sequence of numbers.
+*/
+static int
+is_float64_buffer(PyObject *obj)
+{
+    Py_buffer view;
+    const char *fmt;
+    int raw, result;
+
+    if (!PyObject_CheckBuffer(obj))
+        return 0;
+    if (PyObject_GetBuffer(obj, &view,
+                           PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) < 0) {
+        PyErr_Clear();
+        return 0;
+    }
+    fmt = buffer_format(&view, &raw);
+    result = raw || (strcmp(fmt, value_types[FLOAT64].format) == 0 &&
+                     view.itemsize == value_types[FLOAT64].itemsize);
+    PyBuffer_Release(&view);
+    return result;
+}
+
+static PyObject *
+allclose_impl(PyObject *a_obj, PyObject *b_obj, isclose_kernel kernel,
+              double rel_tol, double abs_tol, int count)
+{
+    PyObject *a_seq = NULL, *b_seq = NULL;
+    Py_buffer a_view, b_view;
+    Py_ssize_t n, n_b, i;
+    Py_ssize_t first = -1, failures = 0;
+
+    if (is_float64_buffer(a_obj) && is_float64_buffer(b_obj)) {
+        const double *a, *b;
+
+        if (get_operands(a_obj, b_obj, NULL,
+                         &a_view, &b_view, NULL, &n) < 0)
+            return NULL;
+        count_batch(n);
+        a = (const double *) a_view.buf;
+        b = (const double *) b_view.buf;
+        Py_BEGIN_ALLOW_THREADS
+        for (i = 0; i < n; i++) {
+            if (!kernel(a[i], b[i], rel_tol, abs_tol)) {
+                if (first < 0)
+                    first = i;
+                failures++;
+                if (!count)
+                    break;
+            }
+        }
+        Py_END_ALLOW_THREADS
+        release_operands(&a_view, &b_view, NULL);
+        return allclose_result(first, failures, count);
+    }
+
+    /* general sequences -- convert one item at a time, so that an
+       early failure doesn't pay for converting the whole thing
+    */
+    a_seq = PySequence_Fast(a_obj, "a must be a sequence or a buffer");
+    if (a_seq == NULL)
+        return NULL;
+    b_seq = PySequence_Fast(b_obj, "b must be a sequence or a buffer");
+    if (b_seq == NULL)
+        goto fail;
+
+    n = PySequence_Fast_GET_SIZE(a_seq);
+    n_b = PySequence_Fast_GET_SIZE(b_seq);
+    if (n != n_b) {
+        PyErr_Format(PyExc_ValueError,
+                     "a and b must be the same length (%zd != %zd)", n, n_b);
+        goto fail;
+    }
+    count_batch(n);
+
+    for (i = 0; i < n; i++) {
+        double a = PyFloat_AsDouble(PySequence_Fast_GET_ITEM(a_seq, i));
+        double b;
+
+        if (a == -1.0 && PyErr_Occurred())
+            goto fail;
+        b = PyFloat_AsDouble(PySequence_Fast_GET_ITEM(b_seq, i));
+        if (b == -1.0 && PyErr_Occurred())
+            goto fail;
+        if (!kernel(a, b, rel_tol, abs_tol)) {
+            if (first < 0)
+                first = i;
+            failures++;
+            if (!count)
+                break;
+        }
+    }
+    Py_DECREF(b_seq);
+    Py_DECREF(a_seq);
+    return allclose_result(first, failures, count);
+
+  fail:
+    Py_XDECREF(b_seq);
+    Py_DECREF(a_seq);
+    return NULL;
+}
+
+static PyObject *
+allclose_c(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *a_obj, *b_obj;
+    double rel_tol = 1e-9;
+    double abs_tol = 0.0;
+    int count = 0;
+
+    static char *keywords[] = {"a", "b", "rel_tol", "abs_tol", "count", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO|ddp:allclose",
+                                     keywords,
+                                     &a_obj, &b_obj,
+                                     &rel_tol, &abs_tol, &count
+                                     ))
+        return NULL;
+
+    if (rel_tol < 0.0 || abs_tol < 0.0 ){
+        PyErr_SetString(PyExc_ValueError,
+                            "error tolerances must be non-negative");
+        return NULL;
+    }
+
+    return allclose_impl(a_obj, b_obj, is_close_weak,
+                         rel_tol, abs_tol, count);
+}
+
+PyDoc_STRVAR(allclose_doc,
+"allclose(a, b, rel_tol=1e-9, abs_tol=0.0, count=False)\n\n"
+"Check if every pair of values in a and b is close.\n\n"
+"Returns the index of the first pair that is not close, or -1 if all\n"
+"the pairs are close. The scan stops at the first failure.\n\n"
+":param a: float64 buffer (see isclose_many) or sequence of numbers --\n"
+"          other buffers, like array('l'), are read as sequences\n\n"
+":param b: the other buffer or sequence -- must be the same length\n\n"
+":param rel_tol=1e-9: The relative tolerance\n\n"
+":param abs_tol=0.0: The minimum absolute tolerance\n\n"
+":param count=False: if True, scan everything and return a\n"
+"                    (first_index, number_of_failures) tuple.\n");
+
+/* relative error of b with respect to a, scaled by the larger magnitude
+   -- the same scaling as the weak test. Non-finite mismatches are
+   reported as an infinite error.
+*/
+static inline double
+relative_error(double a, double b)
+{
+    double diff, scale;
+
+    if ( a == b )
+        return 0.0;
+    diff = fabs(b - a);
+    scale = fmax(fabs(a), fabs(b));
+    if (Py_IS_NAN(diff) || Py_IS_INFINITY(diff) || Py_IS_INFINITY(scale))
+        return Py_HUGE_VAL;
+    return diff / scale;
+}
+
+/* ULP based comparison
+
+   The bit pattern of an IEEE 754 double, read as a sign-magnitude
+   integer, is monotonic in the value. Mapping it onto a two's complement
+   integer gives a "lexicographic" ordering where adjacent floats differ
+   by one, and -0.0 and 0.0 map to the same value -- so the distance
+   between two floats in units in the last place is just an integer
+   subtraction.
+*/
+
+static inline int64_t
+ulps_key(double x)
+{
+    int64_t i;
+
+    memcpy(&i, &x, sizeof(i));
+    if (i < 0)
+        i = -(i & INT64_MAX);
+    return i;
+}
+
+static inline int
+is_close_ulps(double a, double b, uint64_t max_ulps)
+{
+    int64_t ka, kb;
+    uint64_t distance;
+
+    if ( a == b )
+        /* includes two infinities of the same sign, and 0.0 == -0.0 */
+        return 1;
+
+    /* NaN is not close to anything, and infinity is only close to
+       itself, even though it is one ULP from the largest double
+    */
+    if (Py_IS_NAN(a) || Py_IS_NAN(b) ||
+        Py_IS_INFINITY(a) || Py_IS_INFINITY(b))
+        return 0;
+
+    ka = ulps_key(a);
+    kb = ulps_key(b);
+    distance = (ka > kb) ? (uint64_t) ka - (uint64_t) kb
+                         : (uint64_t) kb - (uint64_t) ka;
+    return distance <= max_ulps;
+}
+
+static PyObject *
+isclose_ulps_c(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+    double a, b;
+    long long max_ulps = 4;
+
+    static char *keywords[] = {"a", "b", "max_ulps", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "dd|L:isclose_ulps",
+                                     keywords,
+                                     &a, &b, &max_ulps
+                                     ))
+        return NULL;
+
+    if (max_ulps < 0) {
+        PyErr_SetString(PyExc_ValueError, "max_ulps must be non-negative");
+        return NULL;
+    }
+
+    return PyBool_FromLong(is_close_ulps(a, b, (uint64_t) max_ulps));
+}
+
+PyDoc_STRVAR(isclose_ulps_doc,
+"isclose_ulps(a, b, max_ulps=4)\n\n"
+"Returns True if a and b are no more than max_ulps units in the last\n"
+"place apart.\n\n"
+"0.0 and -0.0 are the same value. NaN is not close to anything, and\n"
+"inf and -inf are only close to themselves.\n");
+
+static PyObject *
+isclose_ulps_many_c(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *a_obj, *b_obj, *out_obj;
+    Py_buffer a_view, b_view, out_view;
+    Py_ssize_t n, i;
+    const double *a, *b;
+    unsigned char *out;
+    unsigned char byte = 0;
+    Py_ssize_t count = 0;
+    long long max_ulps = 4;
+
+    static char *keywords[] = {"a", "b", "out", "max_ulps", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OOO|L:isclose_ulps_many",
+                                     keywords,
+                                     &a_obj, &b_obj, &out_obj, &max_ulps
+                                     ))
+        return NULL;
+
+    if (max_ulps < 0) {
+        PyErr_SetString(PyExc_ValueError, "max_ulps must be non-negative");
+        return NULL;
+    }
+
+    if (get_operands(a_obj, b_obj, out_obj,
+                     &a_view, &b_view, &out_view, &n) < 0)
+        return NULL;
+    count_batch(n);
+
+    a = (const double *) a_view.buf;
+    b = (const double *) b_view.buf;
+    out = (unsigned char *) out_view.buf;
+
+    Py_BEGIN_ALLOW_THREADS
+    for (i = 0; i < n; i++) {
+        if (is_close_ulps(a[i], b[i], (uint64_t) max_ulps)) {
+            byte |= (unsigned char) (1 << (i & 7));
+            count++;
+        }
+        if ((i & 7) == 7) {
+            out[i >> 3] = byte;
+            byte = 0;
+        }
+    }
+    if (n & 7)
+        out[n >> 3] = byte;
+    Py_END_ALLOW_THREADS
+
+    release_operands(&a_view, &b_view, &out_view);
+    return PyLong_FromSsize_t(count);
+}
+
+PyDoc_STRVAR(isclose_ulps_many_doc,
+"isclose_ulps_many(a, b, out, max_ulps=4)\n\n"
+"Element-wise isclose_ulps() of two float64 buffers. The buffers and\n"
+"the packed result in out are as for isclose_many().\n\n"
+"Returns the number of elements that are close.\n");
+
+/* Complex values
+
+   The weak test for complex values, |b - a| <= rel_tol * max(|a|, |b|)
+   or |b - a| <= abs_tol, done with squared magnitudes so that there are
+   no square roots (abs() of a complex is a hypot() call). To keep the
+   squares from overflowing or underflowing, values outside a safe range
+   are first scaled by a power of two, which is exact.
+*/
+
+/* squares of values up to SAFE_BIG (and differences up to twice that)
+   can't overflow, and squares of values above SAFE_SMALL are well clear
+   of the subnormal range
+*/
+#define SAFE_BIG 1e135
+#define SAFE_SMALL 1e-135
+
+static inline int
+is_close_complex(double ar, double ai, double br, double bi,
+                 double rel_tol, double abs_tol)
+{
+    double dr, di, diff2, a2, b2, tol2, big;
+
+    if (ar == br && ai == bi)
+        return 1;
+    /* either part infinite is an infinite complex value -- only close
+       to itself, which the equality check caught
+    */
+    if (Py_IS_INFINITY(ar) || Py_IS_INFINITY(ai) ||
+        Py_IS_INFINITY(br) || Py_IS_INFINITY(bi))
+        return 0;
+
+    big = fabs(ar);
+    big = (fabs(ai) > big) ? fabs(ai) : big;
+    big = (fabs(br) > big) ? fabs(br) : big;
+    big = (fabs(bi) > big) ? fabs(bi) : big;
+    /* (a NaN part is skipped here, and makes diff2 NaN below) */
+    if (big > SAFE_BIG || big < SAFE_SMALL) {
+        int exp;
+
+        /* (2**-exp itself can overflow for subnormal values, so scale
+           each one) */
+        frexp(big, &exp);
+        ar = ldexp(ar, -exp);
+        ai = ldexp(ai, -exp);
+        br = ldexp(br, -exp);
+        bi = ldexp(bi, -exp);
+        abs_tol = ldexp(abs_tol, -exp);
+    }
+
+    dr = br - ar;
+    di = bi - ai;
+    diff2 = dr * dr + di * di;
+    a2 = ar * ar + ai * ai;
+    b2 = br * br + bi * bi;
+    tol2 = fmax(rel_tol * rel_tol * fmax(a2, b2), abs_tol * abs_tol);
+
+    if (diff2 == 0.0)
+        /* not equal, so the difference underflowed -- it is still
+           bigger than a zero tolerance */
+        return tol2 > 0.0;
+    return diff2 <= tol2;
+}
+
+/* the old_code idea: the real and imaginary parts each have to be
+   close on their own
+*/
+static inline int
+is_close_componentwise(double ar, double ai, double br, double bi,
+                       double rel_tol, double abs_tol)
+{
+    return (is_close_weak(ar, br, rel_tol, abs_tol) &&
+            is_close_weak(ai, bi, rel_tol, abs_tol));
+}
+
+typedef int (*complex_kernel)(double ar, double ai, double br, double bi,
+                              double rel_tol, double abs_tol);
+
+static PyObject *
+isclose_complex_c(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+    Py_complex a, b;
+    double rel_tol = 1e-9;
+    double abs_tol = 0.0;
+    int componentwise = 0;
+    complex_kernel kernel;
+
+    static char *keywords[] = {"a", "b", "rel_tol", "abs_tol",
+                               "componentwise", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "DD|ddp:isclose_complex",
+                                     keywords,
+                                     &a, &b, &rel_tol, &abs_tol,
+                                     &componentwise
+                                     ))
+        return NULL;
+
+    if (rel_tol < 0.0 || abs_tol < 0.0 ){
+        PyErr_SetString(PyExc_ValueError,
+                            "error tolerances must be non-negative");
+        return NULL;
+    }
+
+    kernel = componentwise ? is_close_componentwise : is_close_complex;
+    return PyBool_FromLong(kernel(a.real, a.imag, b.real, b.imag,
+                                  rel_tol, abs_tol));
+}
+
+PyDoc_STRVAR(isclose_complex_doc,
+"isclose_complex(a, b, rel_tol=1e-9, abs_tol=0.0, componentwise=False)\n\n"
+"isclose() for complex values: True if |b - a| is within rel_tol of\n"
+"the larger of |a| and |b|, or within abs_tol. Computed with squared\n"
+"magnitudes, so no square roots are needed.\n\n"
+"A complex value with either part infinite is only close to itself,\n"
+"and one with either part NaN is not close to anything.\n\n"
+":param componentwise=False: if True, the real parts and the imaginary\n"
+"                            parts each have to be close (by the float\n"
+"                            isclose()) instead.\n");
+
+/* a contiguous buffer of complex128 values -- numpy complex128 arrays
+   (format "Zd"), or anything get_double_buffer() takes that holds an even
+   number of doubles, read as interleaved (real, imag) pairs. *n is the
+   number of complex values.
+*/
+static int
+get_complex_buffer(PyObject *obj, Py_buffer *view, Py_ssize_t *n,
+                   const char *name)
+{
+    const char *fmt;
+    int raw;
+
+    if (PyObject_GetBuffer(obj, view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) < 0)
+        return -1;
+    fmt = buffer_format(view, &raw);
+    if (strcmp(fmt, "Zd") == 0 && view->itemsize == 2 * sizeof(double)) {
+        *n = view->len / (2 * sizeof(double));
+        return 0;
+    }
+    PyBuffer_Release(view);
+
+    /* float64 and raw byte buffers, as pairs */
+    if (get_double_buffer(obj, view, n, 0, name) < 0)
+        return -1;
+    if (*n % 2) {
+        PyErr_Format(PyExc_ValueError,
+                     "%s must hold an even number of float64 values "
+                     "(real, imag pairs), not %zd", name, *n);
+        PyBuffer_Release(view);
+        return -1;
+    }
+    *n /= 2;
+    return 0;
+}
+
+static PyObject *
+isclose_complex_many_c(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *a_obj, *b_obj, *out_obj;
+    Py_buffer a_view, b_view, out_view;
+    Py_ssize_t n, n_b, i;
+    const double *a, *b;
+    unsigned char *out;
+    unsigned char byte = 0;
+    Py_ssize_t count = 0;
+    double rel_tol = 1e-9;
+    double abs_tol = 0.0;
+    int componentwise = 0;
+
+    static char *keywords[] = {"a", "b", "out", "rel_tol", "abs_tol",
+                               "componentwise", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs,
+                                     "OOO|ddp:isclose_complex_many",
+                                     keywords,
+                                     &a_obj, &b_obj, &out_obj,
+                                     &rel_tol, &abs_tol, &componentwise
+                                     ))
+        return NULL;
+
+    if (rel_tol < 0.0 || abs_tol < 0.0 ){
+        PyErr_SetString(PyExc_ValueError,
+                            "error tolerances must be non-negative");
+        return NULL;
+    }
+
+    if (get_complex_buffer(a_obj, &a_view, &n, "a") < 0)
+        return NULL;
+    if (get_complex_buffer(b_obj, &b_view, &n_b, "b") < 0) {
+        PyBuffer_Release(&a_view);
+        return NULL;
+    }
+    if (n != n_b) {
+        PyErr_Format(PyExc_ValueError,
+                     "a and b must be the same length (%zd != %zd)",
+                     n, n_b);
+        release_operands(&a_view, &b_view, NULL);
+        return NULL;
+    }
+    if (PyObject_GetBuffer(out_obj, &out_view,
+                           PyBUF_C_CONTIGUOUS | PyBUF_WRITABLE) < 0) {
+        release_operands(&a_view, &b_view, NULL);
+        return NULL;
+    }
+    if (out_view.len < (n + 7) / 8) {
+        PyErr_Format(PyExc_ValueError,
+                     "out must hold at least %zd bytes for %zd values",
+                     (n + 7) / 8, n);
+        release_operands(&a_view, &b_view, &out_view);
+        return NULL;
+    }
+    count_batch(n);
+
+    a = (const double *) a_view.buf;
+    b = (const double *) b_view.buf;
+    out = (unsigned char *) out_view.buf;
+
+/* one loop for each kernel, so that it can be inlined */
+#define COMPLEX_LOOP(KERNEL)                                          \
+    for (i = 0; i < n; i++) {                                         \
+        if (KERNEL(a[2 * i], a[2 * i + 1], b[2 * i], b[2 * i + 1],    \
+                   rel_tol, abs_tol)) {                               \
+            byte |= (unsigned char) (1 << (i & 7));                   \
+            count++;                                                  \
+        }                                                             \
+        if ((i & 7) == 7) {                                           \
+            out[i >> 3] = byte;                                       \
+            byte = 0;                                                 \
+        }                                                             \
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    if (componentwise) {
+        COMPLEX_LOOP(is_close_componentwise)
+    }
+    else {
+        COMPLEX_LOOP(is_close_complex)
+    }
+    if (n & 7)
+        out[n >> 3] = byte;
+    Py_END_ALLOW_THREADS
+#undef COMPLEX_LOOP
+
+    release_operands(&a_view, &b_view, &out_view);
+    return PyLong_FromSsize_t(count);
+}
+
+PyDoc_STRVAR(isclose_complex_many_doc,
+"isclose_complex_many(a, b, out, rel_tol=1e-9, abs_tol=0.0,\n"
+"                     componentwise=False)\n\n"
+"Element-wise isclose_complex() of two complex128 buffers -- numpy\n"
+"complex128 arrays, or float64 buffers (see isclose_many) of\n"
+"interleaved real and imaginary parts. The packed result in out is as\n"
+"for isclose_many(), one bit per complex value.\n\n"
+"Returns the number of elements that are close.\n");
+
+/* Comparator objects
+
+   A Comparator holds a validated set of tolerances and a pre-selected
+   method kernel, so that calling it does no argument validation or
+   method lookup -- useful in tight loops where the same tolerances
+   are used over and over.
+*/
+
+typedef struct {
+    PyObject_HEAD
+    double rel_tol;
+    double abs_tol;
+    isclose_kernel kernel;
+    PyObject *method;
+    vectorcallfunc vectorcall;
+} ComparatorObject;
+
+static PyObject *
+Comparator_vectorcall(PyObject *op, PyObject *const *args,
+                      size_t nargsf, PyObject *kwnames)
+{
+    ComparatorObject *self = (ComparatorObject *) op;
+    Py_ssize_t nargs = PyVectorcall_NARGS(nargsf);
+    double a, b;
+
+    if (nargs != 2 || (kwnames != NULL && PyTuple_GET_SIZE(kwnames))) {
+        PyErr_SetString(PyExc_TypeError,
+                        "Comparator takes exactly 2 positional arguments");
+        return NULL;
+    }
+    if (as_double(args[0], &a) < 0 || as_double(args[1], &b) < 0)
+        return NULL;
+    if (stats_enabled)
+        stats.comparator_calls++;
+
+    return PyBool_FromLong(self->kernel(a, b, self->rel_tol, self->abs_tol));
+}
+
+static PyObject *
+Comparator_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
+{
+    ComparatorObject *self;
+    double rel_tol = 1e-9;
+    double abs_tol = 0.0;
+    const char *method = "weak";
+    isclose_kernel kernel;
+
+    static char *keywords[] = {"rel_tol", "abs_tol", "method", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|dds:Comparator",
+                                     keywords,
+                                     &rel_tol, &abs_tol, &method
+                                     ))
+        return NULL;
+
+    if (rel_tol < 0.0 || abs_tol < 0.0 ){
+        PyErr_SetString(PyExc_ValueError,
+                            "error tolerances must be non-negative");
+        return NULL;
+    }
+    kernel = get_kernel(method);
+    if (kernel == NULL)
+        return NULL;
+
+    self = (ComparatorObject *) type->tp_alloc(type, 0);
+    if (self == NULL)
+        return NULL;
+    self->method = PyUnicode_FromString(method);
+    if (self->method == NULL) {
+        Py_DECREF(self);
+        return NULL;
+    }
+    self->rel_tol = rel_tol;
+    self->abs_tol = abs_tol;
+    self->kernel = kernel;
+    self->vectorcall = Comparator_vectorcall;
+    return (PyObject *) self;
+}
+
+static void
+Comparator_dealloc(ComparatorObject *self)
+{
+    Py_XDECREF(self->method);
+    Py_TYPE(self)->tp_free((PyObject *) self);
+}
+
+static PyObject *
+Comparator_repr(ComparatorObject *self)
+{
+    PyObject *rel_tol, *abs_tol, *result = NULL;
+
+    rel_tol = PyFloat_FromDouble(self->rel_tol);
+    abs_tol = PyFloat_FromDouble(self->abs_tol);
+    if (rel_tol != NULL && abs_tol != NULL)
+        result = PyUnicode_FromFormat("Comparator(rel_tol=%R, abs_tol=%R, "
+                                      "method=%R)",
+                                      rel_tol, abs_tol, self->method);
+    Py_XDECREF(rel_tol);
+    Py_XDECREF(abs_tol);
+    return result;
+}
+
+static PyObject *
+Comparator_many(ComparatorObject *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *a_obj, *b_obj, *out_obj;
+    int nthreads = 1;
+
+    static char *keywords[] = {"a", "b", "out", "nthreads", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OOO|i:many", keywords,
+                                     &a_obj, &b_obj, &out_obj, &nthreads))
+        return NULL;
+
+    return isclose_many_impl(a_obj, b_obj, out_obj, FLOAT64, self->kernel,
+                             self->rel_tol, self->abs_tol, nthreads);
+}
+
+static PyObject *
+Comparator_allclose(ComparatorObject *self, PyObject *args,
+                    PyObject *kwargs)
+{
+    PyObject *a_obj, *b_obj;
+    int count = 0;
+
+    static char *keywords[] = {"a", "b", "count", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO|p:allclose", keywords,
+                                     &a_obj, &b_obj, &count))
+        return NULL;
+
+    return allclose_impl(a_obj, b_obj, self->kernel,
+                         self->rel_tol, self->abs_tol, count);
+}
+
+static PyMethodDef Comparator_methods[] = {
+    {"many", (PyCFunction) Comparator_many, METH_VARARGS | METH_KEYWORDS,
+     "many(a, b, out, nthreads=1) -- element-wise comparison, "
+     "as isclose_many()"},
+    {"allclose", (PyCFunction) Comparator_allclose,
+     METH_VARARGS | METH_KEYWORDS,
+     "allclose(a, b, count=False) -- reduction, as allclose()"},
+    {NULL, NULL, 0, NULL}        /* Sentinel */
+};
+
+static PyMemberDef Comparator_members[] = {
+    {"rel_tol", T_DOUBLE, offsetof(ComparatorObject, rel_tol), READONLY,
+     "The relative tolerance"},
+    {"abs_tol", T_DOUBLE, offsetof(ComparatorObject, abs_tol), READONLY,
+     "The minimum absolute tolerance"},
+    {"method", T_OBJECT, offsetof(ComparatorObject, method), READONLY,
+     "The method used to scale the relative tolerance"},
+    {NULL}        /* Sentinel */
+};
+
+PyDoc_STRVAR(Comparator_doc,
+"Comparator(rel_tol=1e-9, abs_tol=0.0, method='weak')\n\n"
+"A pre-validated isclose() test: comparator(a, b) returns True if a\n"
+"is close in value to b.\n\n"
+":param rel_tol=1e-9: The relative tolerance\n\n"
+":param abs_tol=0.0: The minimum absolute tolerance\n\n"
+":param method='weak': one of \"asymmetric\", \"strong\", \"weak\" or\n"
+"                      \"average\" -- see is_close.py\n");
+
+static PyTypeObject ComparatorType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "is_close_module.Comparator",
+    .tp_basicsize = sizeof(ComparatorObject),
+    .tp_dealloc = (destructor) Comparator_dealloc,
+    .tp_vectorcall_offset = offsetof(ComparatorObject, vectorcall),
+    .tp_repr = (reprfunc) Comparator_repr,
+    .tp_call = PyVectorcall_Call,
+    .tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_VECTORCALL,
+    .tp_doc = Comparator_doc,
+    .tp_methods = Comparator_methods,
+    .tp_members = Comparator_members,
+    .tp_new = Comparator_new,
+};
+
+/* MismatchReport objects
+
+   A one-pass report on a comparison that may be too big to go through
+   twice: the errors of every pair are worked out as the pairs are
+   compared, keeping a histogram of the relative errors by decade, the
+   largest errors, and the top_k pairs that are not close with the
+   largest relative errors (in a min-heap, so the least bad of them is
+   the one to replace). Buffers can be added a chunk at a time with
+   update() -- the indexes carry on from one chunk to the next.
+*/
+
+/* histogram bins: exactly equal, then errors up to 1e-16, 1e-15 ... 1,
+   then everything bigger (including the non-finite mismatches)
+*/
+#define HIST_BINS 19
+
+static const double hist_bounds[HIST_BINS - 1] = {
+    0.0, 1e-16, 1e-15, 1e-14, 1e-13, 1e-12, 1e-11, 1e-10, 1e-9,
+    1e-8, 1e-7, 1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0
+};
+
+/* the bin for a relative error: the first one with err <= its bound */
+static inline int
+error_bin(double err)
+{
+    uint64_t bits;
+    int exponent, i;
+
+    if (err == 0.0)
+        return 0;
+    if (!(err <= 1.0))
+        return HIST_BINS - 1;
+    /* a guess from the binary exponent (1233 / 4096 ~= log10(2)), which
+       may be one bin out either way
+    */
+    memcpy(&bits, &err, sizeof(bits));
+    exponent = (int) (bits >> 52) - 1023;
+    i = ((exponent + 1100) * 1233 >> 12) - 331 + 17;
+    if (i < 1)
+        i = 1;
+    if (i > HIST_BINS - 2)
+        i = HIST_BINS - 2;
+    while (i < HIST_BINS - 2 && err > hist_bounds[i])
+        i++;
+    while (i > 1 && err <= hist_bounds[i - 1])
+        i--;
+    return i;
+}
+
+typedef struct {
+    Py_ssize_t index;
+    double a;
+    double b;
+    double abs_err;
+    double rel_err;
+} offender;
+
+/* is x a worse offender than y? Ties go to the earlier one */
+static inline int
+worse(const offender *x, const offender *y)
+{
+    return (x->rel_err > y->rel_err ||
+            (x->rel_err == y->rel_err && x->index < y->index));
+}
+
+/* restore the heap property below i */
+static void
+sift_down(offender *heap, Py_ssize_t size, Py_ssize_t i)
+{
+    offender item = heap[i];
+
+    for (;;) {
+        Py_ssize_t child = 2 * i + 1;
+
+        if (child >= size)
+            break;
+        if (child + 1 < size && worse(&heap[child], &heap[child + 1]))
+            child++;
+        if (!worse(&item, &heap[child]))
+            break;
+        heap[i] = heap[child];
+        i = child;
+    }
+    heap[i] = item;
+}
+
+static void
+sift_up(offender *heap, Py_ssize_t i)
+{
+    offender item = heap[i];
+
+    while (i > 0) {
+        Py_ssize_t parent = (i - 1) / 2;
+
+        if (!worse(&heap[parent], &item))
+            break;
+        heap[i] = heap[parent];
+        i = parent;
+    }
+    heap[i] = item;
+}
+
+static int
+compare_offenders(const void *x, const void *y)
+{
+    return worse((const offender *) y, (const offender *) x) -
+           worse((const offender *) x, (const offender *) y);
+}
+
+typedef struct {
+    PyObject_HEAD
+    double rel_tol;
+    double abs_tol;
+    value_type type;
+    Py_ssize_t top_k;
+    Py_ssize_t count;            /* pairs compared so far */
+    Py_ssize_t failures;         /* ... that are not close */
+    Py_ssize_t nan_mismatches;   /* ... with a NaN */
+    Py_ssize_t inf_mismatches;   /* ... with an infinity (and no NaN) */
+    double max_abs_error;
+    double max_rel_error;
+    Py_ssize_t max_rel_index;
+    Py_ssize_t histogram[HIST_BINS];
+    offender *heap;
+    Py_ssize_t heap_size;
+    Py_ssize_t max_failures;
+    Py_ssize_t *first;           /* the first max_failures failures */
+    int busy;                    /* in update(), without the GIL */
+} MismatchReportObject;
+
+static PyObject *
+MismatchReport_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
+{
+    MismatchReportObject *self;
+    double rel_tol = 1e-9;
+    double abs_tol = 0.0;
+    Py_ssize_t top_k = 10;
+    Py_ssize_t max_failures = 10;
+    const char *dtype = "float64";
+    int i;
+
+    static char *keywords[] = {"rel_tol", "abs_tol", "top_k",
+                               "max_failures", "dtype", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|ddnns:MismatchReport",
+                                     keywords,
+                                     &rel_tol, &abs_tol, &top_k,
+                                     &max_failures, &dtype
+                                     ))
+        return NULL;
+
+    if (rel_tol < 0.0 || abs_tol < 0.0 ){
+        PyErr_SetString(PyExc_ValueError,
+                            "error tolerances must be non-negative");
+        return NULL;
+    }
+    if (top_k < 0 || max_failures < 0) {
+        PyErr_SetString(PyExc_ValueError,
+                        "top_k and max_failures must be non-negative");
+        return NULL;
+    }
+    for (i = FLOAT64; i <= FLOAT16; i++) {
+        if (strcmp(dtype, value_types[i].name) == 0)
+            break;
+    }
+    if (i > FLOAT16) {
+        PyErr_SetString(PyExc_ValueError,
+                        "dtype must be one of: \"float64\", \"float32\", "
+                        "\"float16\"");
+        return NULL;
+    }
+
+    self = (MismatchReportObject *) type->tp_alloc(type, 0);
+    if (self == NULL)
+        return NULL;
+    if (top_k > 0) {
+        self->heap = PyMem_New(offender, top_k);
+        if (self->heap == NULL) {
+            Py_DECREF(self);
+            return PyErr_NoMemory();
+        }
+    }
+    if (max_failures > 0) {
+        self->first = PyMem_New(Py_ssize_t, max_failures);
+        if (self->first == NULL) {
+            Py_DECREF(self);
+            return PyErr_NoMemory();
+        }
+    }
+    self->rel_tol = rel_tol;
+    self->abs_tol = abs_tol;
+    self->type = (value_type) i;
+    self->top_k = top_k;
+    self->max_failures = max_failures;
+    self->max_rel_index = -1;
+    return (PyObject *) self;
+}
+
+static void
+MismatchReport_dealloc(MismatchReportObject *self)
+{
+    PyMem_Free(self->heap);
+    PyMem_Free(self->first);
+    Py_TYPE(self)->tp_free((PyObject *) self);
+}
+
+#define REPORT_LOOP(LOAD)                                             \
+    for (i = 0; i < n; i++) {                                         \
+        double x = LOAD(a, i);                                        \
+        double y = LOAD(b, i);                                        \
+        double abs_err = fabs(y - x);                                 \
+        double rel_err = relative_error(x, y);                        \
+                                                                      \
+        self->histogram[error_bin(rel_err)]++;                        \
+        if (abs_err > self->max_abs_error)                            \
+            self->max_abs_error = abs_err;                            \
+        if (rel_err > self->max_rel_error ||                          \
+            self->max_rel_index < 0) {                                \
+            self->max_rel_error = rel_err;                            \
+            self->max_rel_index = start + i;                          \
+        }                                                             \
+        if (is_close_weak(x, y, rel_tol, abs_tol))                    \
+            continue;                                                 \
+                                                                      \
+        if (self->failures + failures < self->max_failures)           \
+            self->first[self->failures + failures] = start + i;       \
+        failures++;                                                   \
+        if (Py_IS_NAN(x) || Py_IS_NAN(y))                             \
+            self->nan_mismatches++;                                   \
+        else if (Py_IS_INFINITY(x) || Py_IS_INFINITY(y))              \
+            self->inf_mismatches++;                                   \
+        if (self->heap_size < self->top_k) {                          \
+            offender *slot = &self->heap[self->heap_size];            \
+            slot->index = start + i;                                  \
+            slot->a = x;                                              \
+            slot->b = y;                                              \
+            slot->abs_err = abs_err;                                  \
+            slot->rel_err = rel_err;                                  \
+            sift_up(self->heap, self->heap_size++);                   \
+        }                                                             \
+        else if (self->top_k > 0 && rel_err > self->heap[0].rel_err) {\
+            self->heap[0].index = start + i;                          \
+            self->heap[0].a = x;                                      \
+            self->heap[0].b = y;                                      \
+            self->heap[0].abs_err = abs_err;                          \
+            self->heap[0].rel_err = rel_err;                          \
+            sift_down(self->heap, self->heap_size, 0);                \
+        }                                                             \
+    }
+
+/* update() changes the report with the GIL released, so another thread
+   could call update() again, or read the heap or the histogram half
+   changed
+*/
+static int
+report_busy(MismatchReportObject *self)
+{
+    if (self->busy) {
+        PyErr_SetString(PyExc_RuntimeError,
+                        "update() is already running in another thread");
+        return 1;
+    }
+    return 0;
+}
+
+static PyObject *
+MismatchReport_update(MismatchReportObject *self, PyObject *args,
+                      PyObject *kwargs)
+{
+    PyObject *a_obj, *b_obj;
+    Py_buffer a_view, b_view;
+    const void *a, *b;
+    Py_ssize_t n, i;
+    Py_ssize_t start = self->count;
+    Py_ssize_t failures = 0;
+    double rel_tol = self->rel_tol;
+    double abs_tol = self->abs_tol;
+
+    static char *keywords[] = {"a", "b", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO:update", keywords,
+                                     &a_obj, &b_obj))
+        return NULL;
+
+    if (report_busy(self))
+        return NULL;
+    if (get_typed_operands(a_obj, b_obj, NULL, &a_view, &b_view, NULL, &n,
+                           self->type) < 0)
+        return NULL;
+    count_batch(n);
+    a = a_view.buf;
+    b = b_view.buf;
+
+    self->busy = 1;
+    Py_BEGIN_ALLOW_THREADS
+    switch (self->type) {
+    case FLOAT64:
+        REPORT_LOOP(LOAD_FLOAT64)
+        break;
+    case FLOAT32:
+        REPORT_LOOP(LOAD_FLOAT32)
+        break;
+    case FLOAT16:
+        REPORT_LOOP(LOAD_FLOAT16)
+        break;
+    }
+    Py_END_ALLOW_THREADS
+#undef REPORT_LOOP
+    self->busy = 0;
+
+    release_operands(&a_view, &b_view, NULL);
+    self->count += n;
+    self->failures += failures;
+    return PyLong_FromSsize_t(failures);
+}
+
+static PyObject *
+MismatchReport_worst(MismatchReportObject *self, PyObject *unused)
+{
+    offender *sorted;
+    PyObject *result;
+    Py_ssize_t i;
+
+    if (report_busy(self))
+        return NULL;
+    sorted = PyMem_New(offender, self->heap_size ? self->heap_size : 1);
+    if (sorted == NULL)
+        return PyErr_NoMemory();
+    memcpy(sorted, self->heap, self->heap_size * sizeof(offender));
+    qsort(sorted, self->heap_size, sizeof(offender), compare_offenders);
+
+    result = PyList_New(self->heap_size);
+    for (i = 0; result != NULL && i < self->heap_size; i++) {
+        PyObject *item = Py_BuildValue("(ndddd)", sorted[i].index,
+                                       sorted[i].a, sorted[i].b,
+                                       sorted[i].abs_err, sorted[i].rel_err);
+        if (item == NULL)
+            Py_CLEAR(result);
+        else
+            PyList_SET_ITEM(result, i, item);
+    }
+    PyMem_Free(sorted);
+    return result;
+}
+
+static PyObject *
+MismatchReport_first_failures(MismatchReportObject *self, PyObject *unused)
+{
+    PyObject *result;
+    Py_ssize_t i, n;
+
+    if (report_busy(self))
+        return NULL;
+    n = self->failures < self->max_failures ? self->failures
+                                            : self->max_failures;
+    result = PyList_New(n);
+    for (i = 0; result != NULL && i < n; i++) {
+        PyObject *index = PyLong_FromSsize_t(self->first[i]);
+
+        if (index == NULL)
+            Py_CLEAR(result);
+        else
+            PyList_SET_ITEM(result, i, index);
+    }
+    return result;
+}
+
+static PyObject *
+MismatchReport_histogram(MismatchReportObject *self, PyObject *unused)
+{
+    PyObject *result;
+    int i;
+
+    if (report_busy(self))
+        return NULL;
+    result = PyList_New(HIST_BINS);
+    for (i = 0; result != NULL && i < HIST_BINS; i++) {
+        double bound = i < HIST_BINS - 1 ? hist_bounds[i] : Py_HUGE_VAL;
+        PyObject *item = Py_BuildValue("(dn)", bound, self->histogram[i]);
+
+        if (item == NULL)
+            Py_CLEAR(result);
+        else
+            PyList_SET_ITEM(result, i, item);
+    }
+    return result;
+}
+
+static PyMethodDef MismatchReport_methods[] = {
+    {"update", (PyCFunction) MismatchReport_update,
+     METH_VARARGS | METH_KEYWORDS,
+     "update(a, b) -- compare the next chunk of values, returning the "
+     "number of pairs in it that are not close"},
+    {"worst", (PyCFunction) MismatchReport_worst, METH_NOARGS,
+     "worst() -- a list of (index, a, b, abs_error, rel_error) tuples "
+     "for the top_k pairs that are not close with the largest relative "
+     "errors, worst first"},
+    {"first_failures", (PyCFunction) MismatchReport_first_failures,
+     METH_NOARGS,
+     "first_failures() -- a list of the indexes of the first max_failures "
+     "pairs that are not close"},
+    {"histogram", (PyCFunction) MismatchReport_histogram, METH_NOARGS,
+     "histogram() -- a list of (bound, count) pairs: the number of "
+     "relative errors up to each bound (and above the one before)"},
+    {NULL, NULL, 0, NULL}        /* Sentinel */
+};
+
+static PyMemberDef MismatchReport_members[] = {
+    {"rel_tol", T_DOUBLE, offsetof(MismatchReportObject, rel_tol), READONLY,
+     "The relative tolerance"},
+    {"abs_tol", T_DOUBLE, offsetof(MismatchReportObject, abs_tol), READONLY,
+     "The minimum absolute tolerance"},
+    {"top_k", T_PYSSIZET, offsetof(MismatchReportObject, top_k), READONLY,
+     "The number of worst offenders kept"},
+    {"max_failures", T_PYSSIZET,
+     offsetof(MismatchReportObject, max_failures), READONLY,
+     "The number of first failures kept"},
+    {"count", T_PYSSIZET, offsetof(MismatchReportObject, count), READONLY,
+     "The number of pairs compared"},
+    {"failures", T_PYSSIZET, offsetof(MismatchReportObject, failures),
+     READONLY, "The number of pairs that are not close"},
+    {"nan_mismatches", T_PYSSIZET,
+     offsetof(MismatchReportObject, nan_mismatches), READONLY,
+     "The number of pairs with a NaN"},
+    {"inf_mismatches", T_PYSSIZET,
+     offsetof(MismatchReportObject, inf_mismatches), READONLY,
+     "The number of pairs with an infinity that are not close"},
+    {"max_abs_error", T_DOUBLE,
+     offsetof(MismatchReportObject, max_abs_error), READONLY,
+     "The largest |b - a| (ignoring NaN)"},
+    {"max_rel_error", T_DOUBLE,
+     offsetof(MismatchReportObject, max_rel_error), READONLY,
+     "The largest |b - a| / max(|a|, |b|) -- inf for non-finite mismatches"},
+    {"max_rel_index", T_PYSSIZET,
+     offsetof(MismatchReportObject, max_rel_index), READONLY,
+     "The index of the largest relative error (-1 before any values)"},
+    {NULL}        /* Sentinel */
+};
+
+PyDoc_STRVAR(MismatchReport_doc,
+"MismatchReport(rel_tol=1e-9, abs_tol=0.0, top_k=10, max_failures=10,\n"
+"               dtype='float64')\n\n"
+"A report on the differences between two sets of values, built in a\n"
+"single pass -- for finding out why a big comparison failed without\n"
+"going through the data again.\n\n"
+":param rel_tol=1e-9: The relative tolerance\n\n"
+":param abs_tol=0.0: The minimum absolute tolerance\n\n"
+":param top_k=10: the number of worst offenders to keep\n\n"
+":param max_failures=10: the number of first failures to keep\n\n"
+":param dtype='float64': the type of the buffers passed to update() --\n"
+"                        \"float64\", \"float32\" or \"float16\"\n\n"
+"The relative error of a pair is |b - a| / max(|a|, |b|), and inf\n"
+"for non-finite mismatches. Call update() with each chunk of the data,\n"
+"then read the counts, worst(), first_failures() and histogram().\n"
+"The methods raise RuntimeError while update() is running in another\n"
+"thread.\n");
+
+static PyTypeObject MismatchReportType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "is_close_module.MismatchReport",
+    .tp_basicsize = sizeof(MismatchReportObject),
+    .tp_dealloc = (destructor) MismatchReport_dealloc,
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_doc = MismatchReport_doc,
+    .tp_methods = MismatchReport_methods,
+    .tp_members = MismatchReport_members,
+    .tp_new = MismatchReport_new,
+};
+
+/* compare_stats() is a one-call MismatchReport, so the two can't count
+   differently
+*/
+static PyObject *
+compare_stats_c(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *a_obj, *b_obj;
+    PyObject *report, *updated, *first_failures, *result;
+    MismatchReportObject *r;
+    Py_ssize_t max_failures = 10;
+    double rel_tol = 1e-9;
+    double abs_tol = 0.0;
+
+    static char *keywords[] = {"a", "b", "rel_tol", "abs_tol",
+                               "max_failures", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO|ddn:compare_stats",
+                                     keywords,
+                                     &a_obj, &b_obj, &rel_tol, &abs_tol,
+                                     &max_failures
+                                     ))
+        return NULL;
+
+    if (max_failures < 0) {
+        PyErr_SetString(PyExc_ValueError,
+                        "max_failures must be non-negative");
+        return NULL;
+    }
+
+    report = PyObject_CallFunction((PyObject *) &MismatchReportType, "ddnn",
+                                   rel_tol, abs_tol, (Py_ssize_t) 0,
+                                   max_failures);
+    if (report == NULL)
+        return NULL;
+    updated = PyObject_CallMethod(report, "update", "OO", a_obj, b_obj);
+    if (updated == NULL) {
+        Py_DECREF(report);
+        return NULL;
+    }
+    Py_DECREF(updated);
+
+    r = (MismatchReportObject *) report;
+    first_failures = MismatchReport_first_failures(r, NULL);
+    if (first_failures == NULL) {
+        Py_DECREF(report);
+        return NULL;
+    }
+    result = Py_BuildValue("(ndnN)", r->failures, r->max_rel_error,
+                           r->max_rel_index, first_failures);
+    Py_DECREF(report);
+    return result;
+}
+
+PyDoc_STRVAR(compare_stats_doc,
+"compare_stats(a, b, rel_tol=1e-9, abs_tol=0.0, max_failures=10)\n\n"
+"Compare two float64 buffers (see isclose_many) in a single pass.\n\n"
+"Returns a (failures, worst_rel_error, worst_index, first_failures)\n"
+"tuple: the number of pairs that are not close, the largest relative\n"
+"error |b - a| / max(|a|, |b|) and its index (-1 if the buffers are\n"
+"empty), and a list of the indexes of the first max_failures pairs\n"
+"that are not close. Non-finite mismatches have an infinite relative\n"
+"error.\n\n"
+"The same as the failures, max_rel_error, max_rel_index and\n"
+"first_failures() of a MismatchReport given a and b in one update().\n");
+
+static PyMethodDef IsCloseMethods[] = {
+    {"isclose", (PyCFunction) (void(*)(void)) isclose_c,
+     METH_FASTCALL | METH_KEYWORDS,
+     "determine if two floating point numbers are close"},
+    {"isclose_many", (PyCFunction) isclose_many_c,
+     METH_VARARGS | METH_KEYWORDS, isclose_many_doc},
+    {"isclose_many_float32", (PyCFunction) isclose_many_float32_c,
+     METH_VARARGS | METH_KEYWORDS, isclose_many_float32_doc},
+    {"isclose_many_float16", (PyCFunction) isclose_many_float16_c,
+     METH_VARARGS | METH_KEYWORDS, isclose_many_float16_doc},
+    {"allclose", (PyCFunction) allclose_c,
+     METH_VARARGS | METH_KEYWORDS, allclose_doc},
+    {"compare_stats", (PyCFunction) compare_stats_c,
+     METH_VARARGS | METH_KEYWORDS, compare_stats_doc},
+    {"isclose_ulps", (PyCFunction) isclose_ulps_c,
+     METH_VARARGS | METH_KEYWORDS, isclose_ulps_doc},
+    {"isclose_ulps_many", (PyCFunction) isclose_ulps_many_c,
+     METH_VARARGS | METH_KEYWORDS, isclose_ulps_many_doc},
+    {"isclose_complex", (PyCFunction) isclose_complex_c,
+     METH_VARARGS | METH_KEYWORDS, isclose_complex_doc},
+    {"isclose_complex_many", (PyCFunction) isclose_complex_many_c,
+     METH_VARARGS | METH_KEYWORDS, isclose_complex_many_doc},
+    {"set_stats", (PyCFunction) set_stats_c,
+     METH_VARARGS | METH_KEYWORDS, set_stats_doc},
+    {"get_stats", (PyCFunction) get_stats_c, METH_NOARGS, get_stats_doc},
+    {"reset_stats", (PyCFunction) reset_stats_c,
+     METH_VARARGS | METH_KEYWORDS,
+     reset_stats_doc},
+    {"set_simd", (PyCFunction) set_simd_c,
+     METH_VARARGS | METH_KEYWORDS, set_simd_doc},
+    {"get_simd", (PyCFunction) get_simd_c, METH_NOARGS, get_simd_doc},
+    {NULL, NULL, 0, NULL}        /* Sentinel */
+};
+
+static struct PyModuleDef is_close_module = {
+   PyModuleDef_HEAD_INIT,
+   "is_close_module",   /* name of module */
+   "docstring for is_close_module module", /* module documentation, may be NULL */
+   -1,           /* size of per-interpreter state of the module,
+                    or -1 if the module keeps state in global variables. */
+   IsCloseMethods
+};
+
+PyMODINIT_FUNC
+PyInit_is_close_module(void)
+{
+    PyObject *m, *variants;
+    int i;
+
+    if (PyType_Ready(&ComparatorType) < 0 ||
+        PyType_Ready(&MismatchReportType) < 0)
+        return NULL;
+
+    m = PyModule_Create(&is_close_module);
+    if (m == NULL)
+        return NULL;
+
+    Py_INCREF(&ComparatorType);
+    if (PyModule_AddObject(m, "Comparator",
+                           (PyObject *) &ComparatorType) < 0) {
+        Py_DECREF(&ComparatorType);
+        Py_DECREF(m);
+        return NULL;
+    }
+    Py_INCREF(&MismatchReportType);
+    if (PyModule_AddObject(m, "MismatchReport",
+                           (PyObject *) &MismatchReportType) < 0) {
+        Py_DECREF(&MismatchReportType);
+        Py_DECREF(m);
+        return NULL;
+    }
+
+    select_simd();
+    variants = PyList_New(0);
+    for (i = 0; variants != NULL && simd_variants[i].name != NULL; i++) {
+        PyObject *name;
+
+        if (!simd_supported(i))
+            continue;
+        name = PyUnicode_FromString(simd_variants[i].name);
+        if (name == NULL || PyList_Append(variants, name) < 0)
+            Py_CLEAR(variants);
+        Py_XDECREF(name);
+    }
+    if (variants != NULL)
+        Py_SETREF(variants, PyList_AsTuple(variants));
+    if (variants == NULL ||
+        PyModule_AddObject(m, "SIMD_VARIANTS", variants) < 0) {
+        Py_XDECREF(variants);
+        Py_DECREF(m);
+        return NULL;
+    }
+    return m;
 }
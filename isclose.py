@@ -18,6 +18,29 @@ License: Apache License 2.0 http://opensource.org/licenses/apache2.0.php
 """
 
 import math
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from fractions import Fraction
+from numbers import Rational
+
+# Opt-in counters, with the same names as the ones in is_close_module --
+# see set_stats(). _stats is None when counting is off, which costs one
+# test per call.
+_COUNTERS = ('calls', 'equal', 'nonfinite', 'rel_tol', 'abs_tol',
+             'not_close')
+_counts = dict.fromkeys(_COUNTERS, 0)
+_stats = None
+
+
+class _Counting(threading.local):
+    # set while _isclose_counted() works out a result, so that the calls
+    # it makes aren't counted again
+    active = False
+
+
+_counting = _Counting()
 
 
 def isclose(a, b, rel_tol=1e-9, abs_tol=0.0):
@@ -47,9 +70,14 @@ def isclose(a, b, rel_tol=1e-9, abs_tol=0.0):
 
     Complex values are compared based on their absolute value.
 
+    Decimal and Fraction values are compared without converting to
+    float -- see _isclose_decimal() and _isclose_fraction().
+
     See PEP-0485 for a detailed description
 
     """
+    if _stats is not None and not _counting.active:
+        return _isclose_counted(a, b, rel_tol, abs_tol)
 
     if a == b:  # short-circuit exact equality
         return True
@@ -57,6 +85,16 @@ def isclose(a, b, rel_tol=1e-9, abs_tol=0.0):
     if rel_tol < 0.0 or abs_tol < 0.0:
         raise ValueError('error tolerances must be non-negative')
 
+    cls = type(a)
+    if cls is not float:  # keep the common case fast
+        if cls is Decimal and type(b) is Decimal:
+            return _isclose_decimal(a, b, rel_tol, abs_tol)
+        if ((cls is Fraction or type(b) is Fraction) and
+                isinstance(a, Rational) and isinstance(b, Rational)):
+            result = _isclose_fraction(a, b, rel_tol, abs_tol)
+            if result is not None:
+                return result
+
     # use cmath so it will work with complex ot float
     if math.isinf(abs(a)) or math.isinf(abs(b)):
         # This includes the case of two infinities of opposite sign, or
@@ -68,3 +106,211 @@ def isclose(a, b, rel_tol=1e-9, abs_tol=0.0):
     return (((diff <= abs(rel_tol * b)) or
              (diff <= abs(rel_tol * a))) or
             (diff <= abs_tol))
+
+
+def _is_infinite(x):
+    if type(x) is Decimal:
+        return x.is_infinite()
+    try:
+        return math.isinf(abs(x))
+    except (TypeError, ValueError, OverflowError):
+        return False
+
+
+def _isclose_counted(a, b, rel_tol, abs_tol):
+    """
+    isclose(), recording which test decided the result
+    """
+    stats = _stats
+    stats['calls'] += 1
+    _counting.active = True
+    try:
+        result = isclose(a, b, rel_tol, abs_tol)
+        if a == b:
+            stats['equal'] += 1
+        elif not result:
+            if _is_infinite(a) or _is_infinite(b):
+                stats['nonfinite'] += 1
+            else:
+                stats['not_close'] += 1
+        elif isclose(a, b, rel_tol, 0.0):
+            stats['rel_tol'] += 1
+        else:
+            stats['abs_tol'] += 1
+    finally:
+        _counting.active = False
+    return result
+
+
+def set_stats(enabled):
+    """
+    turn the counting of isclose() calls on or off
+
+    returns the previous setting. Counting is off to start with. Turning
+    it off doesn't reset the counters -- see reset_stats().
+    """
+    global _stats
+    previous = _stats is not None
+    _stats = _counts if enabled else None
+    return previous
+
+
+def get_stats():
+    """
+    returns a dict of the counters: calls of isclose(), and how many of
+    them were decided by each test -- as is_close_module.get_stats()
+    """
+    return dict(_counts)
+
+
+def reset_stats():
+    """
+    set all the counters back to zero
+    """
+    _counts.update(dict.fromkeys(_COUNTERS, 0))
+
+
+def _isclose_decimal(a, b, rel_tol, abs_tol):
+    """
+    weak test for two Decimals (that are not equal)
+
+    Uses the Decimal methods rather than converting to float to check
+    for infinity, and keeps everything in Decimal arithmetic.
+
+    float and int relative tolerances are converted to Decimal exactly.
+    """
+    if not (a.is_finite() and b.is_finite()):
+        return False
+    if type(rel_tol) is not Decimal:
+        # a NaN tolerance never passes -- use zero, as ordering
+        # comparisons with a Decimal NaN raise.
+        rel_tol = Decimal(rel_tol) if rel_tol == rel_tol else 0
+
+    diff = abs(b - a)
+    # the tolerances are known to be non-negative here
+    if diff <= rel_tol * abs(b) or diff <= rel_tol * abs(a):
+        return True
+    # Decimals compare exactly with floats, so abs_tol isn't converted
+    return abs_tol == abs_tol and diff <= abs_tol
+
+
+def _ratio(tol):
+    # exact (numerator, denominator) of a tolerance, or None for inf / NaN
+    try:
+        return tol.as_integer_ratio()
+    except (OverflowError, ValueError, AttributeError):
+        return None
+
+
+def _isclose_fraction(a, b, rel_tol, abs_tol):
+    """
+    weak test for two rational values, at least one of them a Fraction
+
+    With a = p/q, b = r/s and a tolerance of m/n, diff <= tol * |b| is
+    n * |p*s - r*q| <= m * |r| * q -- so everything is done with integer
+    arithmetic, without building any intermediate Fractions.
+
+    returns None if a tolerance isn't finite, to use the generic code.
+    """
+    rel = _ratio(rel_tol)
+    absolute = _ratio(abs_tol)
+    if rel is None or absolute is None:
+        return None
+
+    p, q = a.numerator, a.denominator
+    r, s = b.numerator, b.denominator
+    diff = abs(p * s - r * q)  # |b - a| * q * s
+
+    m, n = rel
+    if n * diff <= m * max(abs(r) * q, abs(p) * s):
+        return True
+    u, v = absolute
+    return v * diff <= u * q * s
+
+
+def allclose(a_seq, b_seq, rel_tol=1e-9, abs_tol=0.0, count=False):
+    """
+    checks if every pair of values in two sequences is close
+
+    returns the index of the first pair that is not close, or -1 if all
+    the pairs are close. The scan stops at the first failure.
+
+    :param a_seq: sequence of values to be tested
+
+    :param b_seq: the other sequence -- must be the same length as a_seq
+
+    :param rel_tol=1e-9: The relative tolerance, as for isclose()
+
+    :param abs_tol=0.0: The minimum absolute tolerance, as for isclose()
+
+    :param count=False: if True, the whole sequence is scanned, and a
+                        (first_index, number_of_failures) tuple is returned.
+    """
+    if rel_tol < 0.0 or abs_tol < 0.0:
+        raise ValueError('error tolerances must be non-negative')
+    if len(a_seq) != len(b_seq):
+        raise ValueError('sequences must be the same length')
+
+    first = -1
+    failures = 0
+    for i, (a, b) in enumerate(zip(a_seq, b_seq)):
+        if not isclose(a, b, rel_tol, abs_tol):
+            if not count:
+                return i
+            if first < 0:
+                first = i
+            failures += 1
+
+    if count:
+        return first, failures
+    return first
+
+
+def _isclose_chunk(a_seq, b_seq, rel_tol, abs_tol):
+    return [isclose(a, b, rel_tol, abs_tol) for a, b in zip(a_seq, b_seq)]
+
+
+def isclose_many(a_seq, b_seq, rel_tol=1e-9, abs_tol=0.0, workers=1):
+    """
+    element-wise isclose() of two sequences
+
+    returns a list of True / False values
+
+    :param a_seq: sequence of values to be tested
+
+    :param b_seq: the other sequence -- must be the same length as a_seq
+
+    :param rel_tol=1e-9: The relative tolerance, as for isclose()
+
+    :param abs_tol=0.0: The minimum absolute tolerance, as for isclose()
+
+    :param workers=1: number of processes to split the work across. None
+                      uses one per CPU. The sequences are split into one
+                      chunk per worker, so this is only worth it for long
+                      sequences of values that are cheap to pickle.
+
+    For float64 data, is_close_module.isclose_many is a much faster
+    option (and can use threads).
+    """
+    if rel_tol < 0.0 or abs_tol < 0.0:
+        raise ValueError('error tolerances must be non-negative')
+    if len(a_seq) != len(b_seq):
+        raise ValueError('sequences must be the same length')
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError('workers must be at least 1')
+
+    n = len(a_seq)
+    if workers == 1 or n < 2:
+        return _isclose_chunk(a_seq, b_seq, rel_tol, abs_tol)
+
+    chunk = -(-n // workers)  # round up
+    starts = range(0, n, chunk)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(_isclose_chunk,
+                               [a_seq[i:i + chunk] for i in starts],
+                               [b_seq[i:i + chunk] for i in starts],
+                               [rel_tol] * len(starts),
+                               [abs_tol] * len(starts))
+        return [result for part in results for result in part]
@@ -29,10 +29,18 @@ k_2 = omega**2 / (g * tanh(k_1 * h))
 """
 
 import math
-import imp
-import is_close_to
-imp.reload(is_close_to) # because I'm running for ipython
-from is_close_to import is_close_to
+from isclose import isclose
+from fixed_point import iterate_many
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def is_close_to(a, b, tol=1e-9):
+    "the old is_close_to() name, for the code below"
+    return isclose(a, b, rel_tol=tol)
 
 def dispersion(omega, h, g=9.806):
     "compute the dispersion relation"
@@ -70,6 +78,59 @@ def disp(k, omega, h, g=9.806):
     """
     return omega**2 / (g * math.tanh(k * h))
 
+def disp_prime(k, omega, h, g=9.806):
+    """
+    the derivative of disp() with respect to k -- for Newton's method
+    """
+    # 1 / sinh(kh)**2, written so it doesn't overflow for deep water
+    return -omega**2 * h / g * (1 / math.tanh(k * h)**2 - 1)
+
+def disp_many(k, omega, h, g=9.806):
+    """
+    the dispersion relationship for arrays of k, omega and h -- for
+    iterate_many(), which passes numpy arrays if numpy is installed
+    """
+    if np is not None:
+        return omega**2 / (g * np.tanh(k * h))
+    return [om**2 / (g * math.tanh(kk * hh))
+            for kk, om, hh in zip(k, omega, h)]
+
+def disp_prime_many(k, omega, h, g=9.806):
+    """
+    disp_prime() for arrays of k, omega and h
+    """
+    if np is not None:
+        return -omega**2 * h / g * (1 / np.tanh(k * h)**2 - 1)
+    return [disp_prime(kk, om, hh, g) for kk, om, hh in zip(k, omega, h)]
+
+def dispersion_many(omega, h, g=9.806, tol=1e-5, max_iter=100,
+                    method='newton'):
+    """
+    compute the dispersion relation for sequences of omega and h
+
+    :param tol=1e-5: the relative tolerance for the stopping test
+
+    :param max_iter=100: the maximum number of iterations
+
+    :param method='newton': the iterate_many() method -- Newton's method
+                            takes a handful of iterations everywhere.
+                            Plain substitution can take thousands in
+                            shallow water (kh << 1): 1814 for a 20 second
+                            wave in 1m of water.
+
+    returns an array of the wave numbers
+
+    raises RuntimeError if any of them didn't converge in max_iter
+    iterations
+    """
+    fprime = disp_prime_many if method == 'newton' else None
+    k, iterations = iterate_many(disp_many, [10.0] * len(omega), omega, h, g,
+                                 rel_tol=tol, max_iter=max_iter,
+                                 method=method, fprime=fprime)
+    if min(iterations, default=0) < 0:
+        raise RuntimeError("dispersion relation did not converge")
+    return k
+
 if __name__ == "__main__":
 
     #Try it for a few values:
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for assert_close.py
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from array import array
+from decimal import Decimal
+from fractions import Fraction
+from unittest import mock
+
+import assert_close
+from assert_close import (assert_all_close, all_close_message,
+                          CloseAssertions)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pytest
+except ImportError:
+    pytest = None
+
+
+class AllCloseTest(unittest.TestCase):
+
+    def test_close(self):
+        expected = {'x': [1.0, 2.0], 'y': (3.0, [4.0, 5]), 'name': 'fred'}
+        actual = {'x': [1.0 + 1e-12, 2.0], 'y': (3.0, [4.0, 5.0]),
+                  'name': 'fred'}
+        self.assertIsNone(all_close_message(actual, expected))
+        assert_all_close(actual, expected)
+
+    def test_message(self):
+        expected = {'x': [1.0, 2.0], 'y': (3.0, [4.0])}
+        actual = {'x': [1.0, 2.5], 'y': (3.0, [4.000001])}
+        with self.assertRaises(AssertionError) as context:
+            assert_all_close(actual, expected, rel_tol=1e-12)
+        self.assertEqual(str(context.exception).splitlines(), [
+            "2 of 4 values not close (rel_tol=1e-12, abs_tol=0.0)",
+            "  ['x'][1]: 2.5 != 2.0 (abs error 0.5, rel error 0.2)",
+            "  ['y'][1][0]: 4.000001 != 4.0 (abs error 1e-06, "
+            "rel error 2.5e-07)"])
+
+    def test_max_failures(self):
+        message = all_close_message(list(range(100)),
+                                    [x + 1 for x in range(100)],
+                                    max_failures=2)
+        lines = message.splitlines()
+        self.assertEqual(lines[0], "100 of 100 values not close "
+                                   "(rel_tol=1e-09, abs_tol=0.0)")
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[1].startswith("  [0]: 0 != 1"))
+        self.assertEqual(lines[3], "  ... and 98 more")
+
+    def test_failures_in_order(self):
+        # floats and other values are reported in the order they are found
+        actual = [1.0, 'a', Decimal('1'), 2.0, [3.0, 3.0]]
+        expected = [1.5, 'b', Decimal('2'), 2.5, [3.0, 4.0]]
+        lines = all_close_message(actual, expected).splitlines()[1:]
+        self.assertEqual([line.split(':')[0] for line in lines],
+                         ['  [0]', '  [1]', '  [2]', '  [3]', '  [4][1]'])
+
+    def test_tolerances(self):
+        self.assertIsNone(all_close_message([1.0, 0.0], [1.1, 1e-12],
+                                            rel_tol=0.1, abs_tol=1e-9))
+        self.assertIsNotNone(all_close_message([1.0], [1.1]))
+
+    def test_non_finite(self):
+        inf, nan = float('inf'), float('nan')
+        self.assertIsNone(all_close_message([inf, -inf], [inf, -inf]))
+        message = all_close_message([nan, inf], [nan, -inf])
+        self.assertEqual(message.splitlines()[1:],
+                         ["  [0]: nan != nan", "  [1]: inf != -inf"])
+
+    def test_other_numbers(self):
+        self.assertIsNone(all_close_message(
+            [Decimal('1.0000000001'), Fraction(1, 3), 1 + 1j, 10 ** 30],
+            [Decimal('1'), Fraction(1, 3), 1 + 1j, 10 ** 30 + 1]))
+        self.assertIsNotNone(all_close_message([2 ** 60], [2 ** 60 + 2 ** 40]))
+
+    def test_scalars(self):
+        self.assertIsNone(all_close_message(1.0, 1.0))
+        self.assertEqual(all_close_message(1.0, 2.0).splitlines()[1],
+                         "  (value): 1.0 != 2.0 (abs error 1, rel error 0.5)")
+
+    def test_arrays(self):
+        self.assertIsNone(all_close_message(array('f', [1.5, 2.5]),
+                                            array('d', [1.5, 2.5])))
+        self.assertIsNotNone(all_close_message(array('d', [1.0]), [2.0]))
+
+    def test_structure(self):
+        cases = [([1.0, 2.0], [1.0], "at (value): lengths differ: 2 and 1"),
+                 ({'a': 1.0}, {'b': 1.0},
+                  "keys differ: missing ['b'], extra ['a']"),
+                 ([[1.0]], [1.0], "at [0]: list is compared to float"),
+                 ({'a': 1.0}, [1.0], "dict is compared to list")]
+        for actual, expected, text in cases:
+            message = all_close_message(actual, expected)
+            self.assertTrue(message.startswith("structures differ"), message)
+            self.assertIn(text, message)
+
+    def test_strings_are_values(self):
+        self.assertIsNone(all_close_message(['abc'], ['abc']))
+        self.assertIn("'abc' != 'abd'", all_close_message('abc', 'abd'))
+
+    def test_msg(self):
+        with self.assertRaises(AssertionError) as context:
+            assert_all_close([1.0], [2.0], msg="step 3")
+        self.assertTrue(str(context.exception).startswith("step 3 : 1 of 1"))
+
+    def test_errors(self):
+        self.assertRaises(ValueError, assert_all_close, 1.0, 1.0, -1.0)
+        self.assertRaises(ValueError, assert_all_close, 1.0, 1.0, 1e-9, -1.0)
+        self.assertRaises(ValueError, assert_all_close, 1.0, 1.0,
+                          max_failures=-1)
+
+    def test_without_c_module(self):
+        actual = [[1.0, 2.0], 3.0, [4.0, 5.0]]
+        expected = [[1.0, 2.5], 3.0, [4.5, 5.0]]
+        message = all_close_message(actual, expected, max_failures=1)
+        with mock.patch.object(assert_close, 'is_close_module', None):
+            self.assertEqual(all_close_message(actual, expected,
+                                               max_failures=1), message)
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_numpy(self):
+        a = np.ones((2, 3))
+        b = a.copy()
+        b[1, 2] = 1.5
+        self.assertIsNone(all_close_message({'a': a}, {'a': a.tolist()}))
+        self.assertEqual(all_close_message({'a': a}, {'a': b}).splitlines(),
+                         ["1 of 6 values not close "
+                          "(rel_tol=1e-09, abs_tol=0.0)",
+                          "  ['a'][1][2]: 1.0 != 1.5 "
+                          "(abs error 0.5, rel error 0.333)"])
+        self.assertIn("shapes differ", all_close_message(a, a.ravel()))
+        self.assertIsNone(all_close_message(np.arange(3), [0, 1, 2]))
+        self.assertIsNone(all_close_message(a.astype(np.float32), a))
+
+
+class CloseAssertionsTest(CloseAssertions, unittest.TestCase):
+
+    def test_pass(self):
+        self.assertAllClose([1.0, (2.0, 3.0)], [1.0, (2.0, 3.0)])
+
+    def test_fail(self):
+        with self.assertRaises(self.failureException) as context:
+            self.assertAllClose([1.0, 2.0], [1.0, 3.0], msg="second")
+        message = str(context.exception)
+        self.assertIn("1 of 2 values not close", message)
+        self.assertIn("second", message)
+
+
+@unittest.skipIf(pytest is None, "pytest is not installed")
+class PytestPluginTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_fixture(self):
+        path = os.path.join(self.tempdir, 'test_plugin.py')
+        with open(path, 'w') as f:
+            f.write(textwrap.dedent("""
+                def test_close(assert_all_close):
+                    assert_all_close([1.0, 2.0], [1.0, 2.0])
+
+                def test_not_close(assert_all_close):
+                    assert_all_close({'a': [1.0]}, {'a': [1.5]})
+                """))
+        env = dict(os.environ)
+        here = os.path.dirname(os.path.abspath(__file__))
+        env['PYTHONPATH'] = os.pathsep.join(
+            filter(None, [here, env.get('PYTHONPATH')]))
+        result = subprocess.run(
+            [sys.executable, '-m', 'pytest', '-q', '-p', 'assert_close',
+             '-p', 'no:cacheprovider', path],
+            cwd=self.tempdir, env=env, capture_output=True, text=True)
+        self.assertIn("1 failed, 1 passed", result.stdout)
+        self.assertIn("['a'][0]: 1.0 != 1.5", result.stdout)
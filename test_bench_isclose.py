@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for the benchmark harness in bench_isclose.py
+
+(these don't run the benchmarks -- that takes a while)
+"""
+
+import unittest
+
+from bench_isclose import (make_inputs, scalar_implementations,
+                           find_regressions)
+
+
+class InputsTest(unittest.TestCase):
+
+    def test_sizes(self):
+        inputs = make_inputs(n=10)
+        self.assertEqual(set(inputs), {'float', 'non-finite', 'int',
+                                       'complex', 'Decimal', 'Fraction'})
+        for pairs in inputs.values():
+            self.assertEqual(len(pairs), 10)
+
+    def test_reproducible(self):
+        self.assertEqual(make_inputs(n=10, seed=3)['float'],
+                         make_inputs(n=10, seed=3)['float'])
+
+    def test_implementations_agree(self):
+        # the weak methods should all give the same answer for floats
+        impls = scalar_implementations()
+        pairs = make_inputs(n=50)['float']
+        expected = [impls['isclose.isclose'](a, b) for a, b in pairs]
+        for name in ('is_close.isclose[weak]', 'is_close.Comparator[weak]'):
+            self.assertEqual([impls[name](a, b) for a, b in pairs],
+                             expected)
+
+
+class RegressionTest(unittest.TestCase):
+    baseline = {'results': [
+        {'implementation': 'a', 'inputs': 'float', 'ns_per_pair': 100.0},
+        {'implementation': 'b', 'inputs': 'float', 'ns_per_pair': 100.0},
+        {'implementation': 'c', 'inputs': 'float', 'ns_per_pair': None},
+    ]}
+
+    def test_find_regressions(self):
+        results = [
+            {'implementation': 'a', 'inputs': 'float', 'ns_per_pair': 105.0},
+            {'implementation': 'b', 'inputs': 'float', 'ns_per_pair': 150.0},
+            {'implementation': 'c', 'inputs': 'float', 'ns_per_pair': 150.0},
+            {'implementation': 'd', 'inputs': 'float', 'ns_per_pair': 150.0},
+        ]
+        self.assertEqual(find_regressions(results, self.baseline, 0.1),
+                         [('b', 'float', 100.0, 150.0)])
+        self.assertEqual(find_regressions(results, self.baseline, 0.6), [])
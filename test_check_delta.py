@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for the bisection search in check_delta.py
+"""
+
+import math
+import unittest
+
+from is_close import isclose, _ulps_key
+from check_delta import (close_edge, disagreements, sweep, _from_key,
+                         Disagreement)
+
+
+def linear_disagreements(a, rel_tol, method_1, method_2, width=300):
+    """
+    the values close to a by only one method, found by stepping through
+    every float within width ulps of a * (1 - rel_tol) and a * (1 + rel_tol)
+    """
+    found = []
+    for center in (a - abs(a) * rel_tol, a + abs(a) * rel_tol):
+        key = _ulps_key(center)
+        for b in map(_from_key, range(key - width, key + width + 1)):
+            if (isclose(a, b, rel_tol, method=method_1) !=
+                    isclose(a, b, rel_tol, method=method_2)):
+                found.append(b)
+    return sorted(found)
+
+
+class FromKeyTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        for x in (0.0, 1.0, -1.0, 5e-324, -5e-324, 1e308, -2.5, math.inf):
+            self.assertEqual(_from_key(_ulps_key(x)), x)
+
+
+class CloseEdgeTest(unittest.TestCase):
+
+    def test_edges(self):
+        for a in (1.0, 3.7, -2.0, 1e-300, 1e300):
+            for method in ('weak', 'strong', 'asymmetric', 'average'):
+                for direction in (-1, 1):
+                    edge = close_edge(a, 1e-9, method, direction)
+                    self.assertTrue(isclose(a, edge, 1e-9, method=method))
+                    beyond = math.nextafter(edge, direction * math.inf)
+                    self.assertFalse(isclose(a, beyond, 1e-9,
+                                             method=method))
+
+    def test_abs_tol(self):
+        edge = close_edge(0.0, 1e-9, 'weak', 1, abs_tol=1e-6)
+        self.assertEqual(edge, 1e-6)
+
+    def test_nothing_close(self):
+        self.assertEqual(close_edge(0.0, 1e-9, 'weak', 1), 0.0)
+
+    def test_everything_close(self):
+        self.assertEqual(close_edge(1.0, 0.5, 'weak', 1, abs_tol=math.inf),
+                         1.7976931348623157e308)
+
+
+class DisagreementsTest(unittest.TestCase):
+
+    def test_docstring_example(self):
+        found = disagreements(1.0, 1e-8)
+        self.assertEqual(found, [Disagreement(1.0, 1e-8, 0.9999999900000001,
+                                              0.9999999900000001, 1,
+                                              'weak')])
+
+    def test_matches_linear_scan(self):
+        for a in (1.0, 1.000001, 7.3, -42.0):
+            for method in ('strong', 'asymmetric', 'average'):
+                found = disagreements(a, 1e-7, 'weak', method)
+                expected = linear_disagreements(a, 1e-7, 'weak', method)
+                values = sorted(b for d in found
+                                for b in (d.first, d.last))
+                if expected:
+                    self.assertEqual(values[0], expected[0])
+                    self.assertEqual(values[-1], expected[-1])
+                self.assertEqual(sum(d.count for d in found), len(expected))
+
+    def test_same_method(self):
+        self.assertEqual(disagreements(1.0, 1e-7, 'weak', 'weak'), [])
+
+    def test_bad_method(self):
+        self.assertRaises(ValueError, disagreements, 1.0, 1e-9, 'weak',
+                          'fred')
+
+    def test_sweep(self):
+        found = list(sweep([1.0, 10.0], [1e-7, 1e-8]))
+        self.assertTrue(all(d.method == 'weak' for d in found))
+        self.assertEqual({(d.a, d.rel_tol) for d in found},
+                         {(1.0, 1e-7), (10.0, 1e-7), (1.0, 1e-8),
+                          (10.0, 1e-8)})
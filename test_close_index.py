@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for the CloseIndex in close_index.py
+"""
+
+import math
+import random
+import unittest
+
+from isclose import isclose
+from close_index import CloseIndex, close_interval
+
+
+def brute_force(values, x, rel_tol, abs_tol):
+    return sorted(i for i, value in enumerate(values)
+                  if isclose(value, x, rel_tol, abs_tol))
+
+
+class CloseIntervalTest(unittest.TestCase):
+
+    def test_contains_close_values(self):
+        for x in (1.0, -3.5, 1e-300, 1e300, 0.0):
+            for rel_tol, abs_tol in ((1e-9, 0.0), (0.1, 0.0), (1e-9, 1e-3)):
+                low, high = close_interval(x, rel_tol, abs_tol)
+                for b in (low, high):
+                    # just outside the interval isn't close
+                    self.assertFalse(isclose(x, b, rel_tol, abs_tol))
+                # the extremes of the close values are inside
+                tol = max(abs_tol, abs(x) * rel_tol)
+                self.assertLessEqual(low, x - tol)
+                self.assertGreaterEqual(high, x + tol)
+
+    def test_asymmetric(self):
+        # the weak test reaches further away from zero than towards it
+        low, high = close_interval(1.0, 0.5)
+        self.assertTrue(isclose(1.0, 1.99, rel_tol=0.5))
+        self.assertGreaterEqual(high, 2.0)
+        self.assertLess(low, 0.5)
+
+    def test_special(self):
+        self.assertEqual(close_interval(math.inf), (math.inf, math.inf))
+        low, high = close_interval(math.nan)
+        self.assertGreater(low, high)
+        self.assertEqual(close_interval(1.0, 1.0), (-math.inf, math.inf))
+        self.assertRaises(ValueError, close_interval, 1.0, -1.0)
+
+
+class CloseIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        rand = random.Random(42)
+        base = [rand.uniform(-10, 10) for _ in range(200)]
+        self.values = [v * (1 + rand.choice((0, 1e-10, 1e-7, 1e-3)))
+                       for v in base for _ in range(3)]
+        self.values += [0.0, -0.0, 1e-12, math.inf, -math.inf, math.nan]
+
+    def test_matches_brute_force(self):
+        for rel_tol, abs_tol in ((1e-9, 0.0), (1e-6, 0.0), (1e-2, 1e-9),
+                                 (1e-9, 0.5), (2.0, 0.0)):
+            index = CloseIndex(self.values, rel_tol, abs_tol)
+            for x in self.values[::7] + [0.0, 5.0, math.inf, math.nan]:
+                self.assertEqual(sorted(index.find(x)),
+                                 brute_force(self.values, x, rel_tol,
+                                             abs_tol))
+
+    def test_find_values(self):
+        index = CloseIndex([3.0, 1.0, 1.0 + 1e-12, 2.0])
+        self.assertEqual(index.find_values(1.0), [1.0, 1.0 + 1e-12])
+        self.assertEqual(index.find(1.0), [1, 2])
+        self.assertEqual(index.count(1.0), 2)
+        self.assertEqual(index.count(1.5), 0)
+
+    def test_extend(self):
+        index = CloseIndex(self.values[:300], rel_tol=1e-6)
+        index.extend(self.values[300:])
+        self.assertEqual(len(index), len(self.values))
+        whole = CloseIndex(self.values, rel_tol=1e-6)
+        for x in self.values[::11]:
+            self.assertEqual(sorted(index.find(x)), sorted(whole.find(x)))
+
+    def test_find_many(self):
+        index = CloseIndex(self.values, rel_tol=1e-6)
+        probes = self.values[::13]
+        self.assertEqual(index.find_many(probes),
+                         [index.find(x) for x in probes])
+
+    def test_find_many_unsorted(self):
+        rand = random.Random(7)
+        probes = self.values[::5] + [math.nan, 0.0, -0.0, 5.0, math.inf]
+        rand.shuffle(probes)
+        for rel_tol, abs_tol in ((1e-9, 0.0), (1e-2, 1e-9), (1e-9, 0.5),
+                                 (2.0, 0.0)):
+            index = CloseIndex(self.values, rel_tol, abs_tol)
+            self.assertEqual(index.find_many(probes),
+                             [index.find(x) for x in probes])
+
+    def test_empty(self):
+        index = CloseIndex()
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.find(1.0), [])
+        index.extend([1.0])
+        self.assertEqual(index.find(1.0), [0])
+
+    def test_nan_not_found(self):
+        index = CloseIndex([math.nan, 1.0])
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.find(math.nan), [])
+        self.assertEqual(index.find(1.0), [1])
+
+    def test_bad_tolerance(self):
+        self.assertRaises(ValueError, CloseIndex, [1.0], -1e-9)
+        self.assertRaises(ValueError, CloseIndex, [1.0], 1e-9, -1.0)
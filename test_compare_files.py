@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for compare_files.py
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from array import array
+from contextlib import redirect_stdout
+
+from compare_files import compare_files, main
+
+
+class CompareFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def write(self, name, values):
+        path = os.path.join(self.tempdir, name)
+        with open(path, 'wb') as f:
+            array('d', values).tofile(f)
+        return path
+
+    def test_identical(self):
+        values = [float(i) for i in range(1000)]
+        a = self.write('a.bin', values)
+        b = self.write('b.bin', values)
+        result = compare_files(a, b, chunk_size=64)
+        self.assertEqual(result.count, 1000)
+        self.assertEqual(result.failures, 0)
+        self.assertEqual(result.worst_rel_error, 0.0)
+        self.assertEqual(result.first_failures, [])
+
+    def test_mismatches_across_chunks(self):
+        expected = [1.0] * 1000
+        actual = list(expected)
+        actual[10] = 1.1
+        actual[500] = 1.5
+        actual[999] = float('nan')
+        a = self.write('a.bin', actual)
+        b = self.write('b.bin', expected)
+        result = compare_files(a, b, chunk_size=64)
+        self.assertEqual(result.failures, 3)
+        self.assertEqual(result.first_failures, [10, 500, 999])
+        self.assertEqual(result.worst_rel_error, float('inf'))
+        self.assertEqual(result.worst_index, 999)
+
+        result = compare_files(a, b, chunk_size=64, max_failures=2)
+        self.assertEqual(result.failures, 3)
+        self.assertEqual(result.first_failures, [10, 500])
+
+    def test_worst_finite(self):
+        a = self.write('a.bin', [1.0, 2.0, 4.0])
+        b = self.write('b.bin', [1.0, 2.2, 4.1])
+        result = compare_files(a, b, rel_tol=0.1, chunk_size=2)
+        self.assertEqual(result.failures, 0)
+        self.assertEqual(result.worst_index, 1)
+        self.assertAlmostEqual(result.worst_rel_error, 0.2 / 2.2)
+
+    def test_empty(self):
+        a = self.write('a.bin', [])
+        b = self.write('b.bin', [])
+        result = compare_files(a, b)
+        self.assertEqual((result.count, result.failures, result.worst_index),
+                         (0, 0, -1))
+
+    def test_different_sizes(self):
+        a = self.write('a.bin', [1.0])
+        b = self.write('b.bin', [1.0, 2.0])
+        with self.assertRaises(ValueError):
+            compare_files(a, b)
+
+    def test_report(self):
+        expected = [1.0] * 1000
+        actual = list(expected)
+        actual[10] = 1.1
+        actual[500] = float('-inf')
+        actual[999] = float('nan')
+        a = self.write('a.bin', actual)
+        b = self.write('b.bin', expected)
+        result = compare_files(a, b, chunk_size=64, top_k=2)
+        self.assertEqual([w[0] for w in result.worst], [500, 999])
+        self.assertEqual((result.nan_mismatches, result.inf_mismatches),
+                         (1, 1))
+        self.assertEqual(result.histogram[0], (0.0, 997))
+        self.assertEqual(result.histogram[-1], (float('inf'), 2))
+        self.assertEqual(result.max_abs_error, float('inf'))
+
+    def test_float32(self):
+        path_a = os.path.join(self.tempdir, 'a.bin')
+        path_b = os.path.join(self.tempdir, 'b.bin')
+        with open(path_a, 'wb') as f:
+            array('f', [1.0, 2.0, 3.0]).tofile(f)
+        with open(path_b, 'wb') as f:
+            array('f', [1.0, 2.5, 3.0]).tofile(f)
+        result = compare_files(path_a, path_b, dtype='float32', chunk_size=2)
+        self.assertEqual((result.count, result.failures), (3, 1))
+        self.assertEqual(result.worst, [(1, 2.0, 2.5, 0.5, 0.2)])
+
+    def test_bad_dtype(self):
+        a = self.write('a.bin', [1.0])
+        with self.assertRaises(ValueError):
+            compare_files(a, a, dtype='int8')
+
+    def test_main_exit_status(self):
+        a = self.write('a.bin', [1.0, 2.0])
+        b = self.write('b.bin', [1.0, 3.0])
+        with redirect_stdout(io.StringIO()) as output:
+            self.assertEqual(main([a, a]), 0)
+            self.assertEqual(main([a, b]), 1)
+        self.assertIn("not close at index 1 (byte offset 8)",
+                      output.getvalue())
+
+    def test_main_report(self):
+        a = self.write('a.bin', [1.0, 2.0])
+        b = self.write('b.bin', [1.0, 3.0])
+        with redirect_stdout(io.StringIO()) as output:
+            main([a, b, '--histogram'])
+        self.assertIn("index 1: 2.0 vs 3.0", output.getvalue())
+        self.assertIn("<= 1: 1", output.getvalue())
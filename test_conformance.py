@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for the conformance sweep in conformance.py
+"""
+
+import math
+import struct
+import unittest
+from array import array
+from unittest import mock
+
+import is_close_module
+import isclose
+from conformance import (float32_values, float64_values, check_values,
+                         sweep, Disagreement)
+
+ONE_32 = 0x3f800000  # the float32 bit pattern of 1.0
+
+
+class ValuesTest(unittest.TestCase):
+
+    def test_float32(self):
+        values = float32_values(ONE_32, ONE_32 + 2)
+        self.assertEqual(list(values), [1.0, 1.0 + 2.0 ** -23])
+        self.assertTrue(math.isnan(float32_values(0x7fc00000,
+                                                  0x7fc00001)[0]))
+
+    def test_float64(self):
+        one = struct.unpack('<Q', struct.pack('<d', 1.0))[0]
+        values = float64_values(one, one + 4, 2)
+        self.assertEqual(list(values), [1.0, 1.0 + 2 * 2.0 ** -52])
+
+
+class CheckValuesTest(unittest.TestCase):
+
+    def test_agree(self):
+        values = array('d', [1.0, 1.0 + 1e-10, 2.0, math.inf, math.nan, 0.0])
+        self.assertEqual(check_values(values, 1.0), [])
+        self.assertEqual(check_values(values, math.inf), [])
+
+    def test_disagree(self):
+        # swap in broken C functions, to check that differences are found
+        def broken_many(a, b, out, rel_tol, abs_tol):
+            out[:] = bytes(len(out))
+            return 0
+
+        with mock.patch.object(is_close_module, 'isclose_many',
+                               broken_many):
+            found = check_values(array('d', [1.0, 2.0, 1.0]), 1.0)
+        self.assertEqual(found, [Disagreement(1.0, 1.0, 1e-9, 0.0,
+                                              True, False,
+                                              'isclose_many')] * 2)
+
+    def test_scalar_paths(self):
+        paths = []
+
+        def broken_isclose(*args, **kwargs):
+            paths.append(len(args))
+            return False
+
+        with mock.patch.object(is_close_module, 'isclose', broken_isclose):
+            found = check_values(array('d', [1.0]), 1.0)
+        self.assertEqual([d.path for d in found],
+                         ['isclose', 'isclose fast path', 'isclose counted'])
+        self.assertEqual(paths, [4, 2, 4])
+
+        # the fast path is only used with the default tolerances
+        with mock.patch.object(is_close_module, 'isclose', broken_isclose):
+            found = check_values(array('d', [1.0]), 1.0, rel_tol=1e-6)
+        self.assertEqual([d.path for d in found],
+                         ['isclose', 'isclose counted'])
+
+    def test_stats_restored(self):
+        was_enabled = is_close_module.set_stats(True)
+        py_was_enabled = isclose.set_stats(True)
+        try:
+            is_close_module.isclose(1.0, 2.0)
+            isclose.isclose(1.0, 2.0)
+            c_counts = is_close_module.get_stats()
+            py_counts = isclose.get_stats()
+            check_values(array('d', [1.0, 2.0, float('inf')]), 1.0)
+            self.assertEqual(is_close_module.get_stats(), c_counts)
+            self.assertEqual(isclose.get_stats(), py_counts)
+            self.assertTrue(is_close_module.set_stats(False))
+            self.assertTrue(isclose.set_stats(False))
+        finally:
+            is_close_module.set_stats(was_enabled)
+            isclose.set_stats(py_was_enabled)
+            is_close_module.reset_stats()
+            isclose.reset_stats()
+
+
+class SweepTest(unittest.TestCase):
+
+    def test_around_one(self):
+        checked, found = sweep(start=ONE_32 - 5000, stop=ONE_32 + 5000,
+                               rel_tols=[1e-9, 1e-6], chunk_size=4096,
+                               workers=1)
+        self.assertEqual(checked, 10000)
+        self.assertEqual(found, [])
+
+    def test_specials(self):
+        # the infinities and the NaNs
+        checked, found = sweep(start=0x7f800000, stop=0x7f800000 + 3000,
+                               references=[math.inf, 1.0], workers=1)
+        self.assertEqual((checked, found), (3000, []))
+
+    def test_float64_strided(self):
+        checked, found = sweep(float64=True, stride=1 << 54, workers=1)
+        self.assertEqual(checked, 1024)
+        self.assertEqual(found, [])
+
+    def test_workers(self):
+        checked, found = sweep(start=ONE_32, stop=ONE_32 + 4000,
+                               chunk_size=1000, workers=2)
+        self.assertEqual((checked, found), (4000, []))
+
+    def test_bad_args(self):
+        self.assertRaises(ValueError, sweep, stride=0)
+        self.assertRaises(ValueError, sweep, workers=0)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for the dispersion relationship solvers in dispersion.py
+"""
+
+import math
+import os
+import tempfile
+import unittest
+
+from isclose import isclose
+from dispersion import (G, solve, initial_guess, DispersionCache,
+                        DispersionTable)
+
+
+def residual(k, omega, h, g=G):
+    """ relative error in the dispersion relationship """
+    return abs(g * k * math.tanh(k * h) - omega**2) / omega**2
+
+
+class SolveTest(unittest.TestCase):
+    omegas = [2 * math.pi / T for T in (2, 5, 10, 20, 30)]
+    depths = [0.5, 5.0, 50.0, 500.0, 5000.0]
+
+    def test_solutions(self):
+        for omega in self.omegas:
+            for h in self.depths:
+                k = solve(omega, h)
+                self.assertLess(residual(k, omega, h), 1e-10)
+                self.assertGreaterEqual(k, initial_guess(omega, h))
+
+    def test_bad_input(self):
+        with self.assertRaises(ValueError):
+            solve(0.0, 10.0)
+        with self.assertRaises(ValueError):
+            solve(1.0, -10.0)
+
+
+class DispersionCacheTest(unittest.TestCase):
+
+    def test_hit(self):
+        cache = DispersionCache(rel_tol=1e-6)
+        k = cache(0.6, 10.0)
+        self.assertEqual(cache(0.6, 10.0), k)
+        self.assertEqual(cache(0.6 * (1 + 1e-8), 10.0), k)
+        self.assertEqual(cache.cache_info().hits, 2)
+        self.assertEqual(cache.cache_info().misses, 1)
+
+    def test_miss(self):
+        cache = DispersionCache(rel_tol=1e-6)
+        k1 = cache(0.6, 10.0)
+        k2 = cache(0.61, 10.0)
+        self.assertNotEqual(k1, k2)
+        self.assertLess(residual(k2, 0.61, 10.0), 1e-10)
+        self.assertEqual(cache.cache_info().misses, 2)
+
+    def test_warm_start_accuracy(self):
+        cache = DispersionCache()
+        for omega in (0.5, 0.6, 0.7):
+            for h in (3.0, 30.0):
+                k = cache(omega, h)
+                self.assertTrue(isclose(k, solve(omega, h), rel_tol=1e-10))
+
+    def test_lru_eviction(self):
+        cache = DispersionCache(maxsize=2)
+        cache(0.5, 10.0)
+        cache(0.6, 10.0)
+        cache(0.5, 10.0)  # now 0.6 is the least recently used
+        cache(0.7, 10.0)
+        self.assertEqual(cache.cache_info().currsize, 2)
+        cache(0.5, 10.0)
+        self.assertEqual(cache.cache_info().hits, 2)
+        cache(0.6, 10.0)
+        self.assertEqual(cache.cache_info().misses, 4)
+        self.assertEqual(len(cache._nondim), 2)
+
+    def test_clear(self):
+        cache = DispersionCache()
+        cache(0.5, 10.0)
+        cache.clear()
+        self.assertEqual(cache.cache_info(), (0, 0, 1024, 0))
+
+    def test_bad_args(self):
+        with self.assertRaises(ValueError):
+            DispersionCache(maxsize=0)
+        with self.assertRaises(ValueError):
+            DispersionCache()(0.0, 1.0)
+
+
+class DispersionTableTest(unittest.TestCase):
+    omegas = [2 * math.pi / T for T in (1, 2, 5, 10, 20, 30)]
+    depths = [0.1, 0.5, 5.0, 50.0, 500.0, 5000.0]
+
+    @classmethod
+    def setUpClass(cls):
+        cls.table = DispersionTable(size=1024)
+
+    def test_interpolation_only(self):
+        for omega in self.omegas:
+            for h in self.depths:
+                k = self.table(omega, h, refine=False, verify=False)
+                self.assertTrue(isclose(k, solve(omega, h), rel_tol=1e-4))
+
+    def test_refined(self):
+        for omega in self.omegas:
+            for h in self.depths:
+                k = self.table(omega, h, verify=False)
+                self.assertTrue(isclose(k, solve(omega, h), rel_tol=1e-10))
+
+    def test_outside_table(self):
+        table = DispersionTable(size=16, x_min=1.0, x_max=2.0)
+        for omega, h in ((0.01, 1.0), (10.0, 1000.0)):
+            self.assertLess(residual(table(omega, h), omega, h), 1e-9)
+
+    def test_verify_falls_back(self):
+        # a two point table is poor, but verify makes up for it
+        table = DispersionTable(size=2, verify_tol=1e-12)
+        for omega in self.omegas:
+            for h in self.depths:
+                self.assertLess(residual(table(omega, h), omega, h), 1e-11)
+
+    def test_save_load(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            self.table.save(path)
+            loaded = DispersionTable.load(path)
+            try:
+                self.assertEqual(loaded.size, self.table.size)
+                for omega in self.omegas:
+                    for h in self.depths:
+                        self.assertEqual(loaded(omega, h),
+                                         self.table(omega, h))
+            finally:
+                loaded.close()
+        finally:
+            os.remove(path)
+
+    def test_load_bad_file(self):
+        fd, path = tempfile.mkstemp()
+        os.write(fd, b'not a table, not a table, not a table')
+        os.close(fd)
+        try:
+            self.assertRaises(ValueError, DispersionTable.load, path)
+        finally:
+            os.remove(path)
+
+    def test_bad_args(self):
+        self.assertRaises(ValueError, DispersionTable, size=1)
+        self.assertRaises(ValueError, DispersionTable, x_min=2.0, x_max=1.0)
+        self.assertRaises(ValueError, self.table, 0.0, 10.0)
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for the fixed point iteration in fixed_point.py
+"""
+
+import asyncio
+import math
+import unittest
+from unittest import mock
+
+import fixed_point
+from isclose import isclose
+from iteration_example import dispersion_many
+from fixed_point import (iterate, iterate_many, iterate_async, Monitor,
+                         Telemetry)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def disp(k, omega, h, g=9.806):
+    return omega**2 / (g * math.tanh(k * h))
+
+
+def disp_prime(k, omega, h, g=9.806):
+    # 1 / sinh(kh)**2, written so it doesn't overflow for deep water
+    return -omega**2 * h / g * (1 / math.tanh(k * h)**2 - 1)
+
+
+def disp_many(k, omega, h, g=9.806):
+    return [om**2 / (g * math.tanh(kk * hh))
+            for kk, om, hh in zip(k, omega, h)]
+
+
+class IterateTest(unittest.TestCase):
+
+    def test_cos(self):
+        x = iterate(math.cos, 1.0)
+        self.assertTrue(isclose(x, math.cos(x), rel_tol=1e-8))
+
+    def test_args(self):
+        k = iterate(disp, 10.0, 2 * math.pi / 10, 10.0, rel_tol=1e-12)
+        omega = 2 * math.pi / 10
+        self.assertTrue(isclose(omega**2, 9.806 * k * math.tanh(k * 10.0),
+                                rel_tol=1e-9))
+
+    def test_max_iter(self):
+        with self.assertRaises(RuntimeError):
+            iterate(lambda x: -x, 1.0, max_iter=10)
+
+    def count_calls(self, method, **kwargs):
+        calls = []
+
+        def func(k, omega, h):
+            calls.append(k)
+            return disp(k, omega, h)
+
+        k = iterate(func, 10.0, 2 * math.pi / 10, 10.0, rel_tol=1e-12,
+                    method=method, **kwargs)
+        return k, len(calls)
+
+    def test_accelerated(self):
+        k_plain, n_plain = self.count_calls('plain')
+        for method, kwargs in (('steffensen', {}),
+                               ('newton', {'fprime': disp_prime})):
+            k, n = self.count_calls(method, **kwargs)
+            self.assertTrue(isclose(k, k_plain, rel_tol=1e-10))
+            self.assertLess(n * 5, n_plain, msg=method)
+
+    def test_steffensen_exact(self):
+        # a linear map converges in one extrapolation
+        self.assertEqual(iterate(lambda x: 0.5 * x + 1, 0.0,
+                                 method='steffensen'), 2.0)
+
+    def test_bad_method(self):
+        with self.assertRaises(ValueError):
+            iterate(math.cos, 1.0, method='aitkin')
+        with self.assertRaises(ValueError):
+            iterate(math.cos, 1.0, method='newton')
+
+
+class IterateManyTest(unittest.TestCase):
+
+    omega = [2 * math.pi / T for T in (4, 8, 10, 12, 16)]
+    h = [1.0, 10.0, 50.0, 100.0, 5.0]
+
+    def test_matches_scalar(self):
+        k, iterations = iterate_many(disp_many, [10.0] * len(self.omega),
+                                     self.omega, self.h, rel_tol=1e-12)
+        for kk, n, omega, h in zip(k, iterations, self.omega, self.h):
+            expected = iterate(disp, 10.0, omega, h, rel_tol=1e-12)
+            self.assertTrue(isclose(kk, expected, rel_tol=1e-10))
+            self.assertGreater(n, 0)
+
+    def test_accelerated(self):
+        k_plain, n_plain = iterate_many(disp_many, [10.0] * len(self.omega),
+                                        self.omega, self.h, rel_tol=1e-12)
+
+        def prime_many(k, omega, h):
+            return [disp_prime(*args) for args in zip(k, omega, h)]
+
+        for method, kwargs in (('steffensen', {}),
+                               ('newton', {'fprime': prime_many})):
+            k, n = iterate_many(disp_many, [10.0] * len(self.omega),
+                                self.omega, self.h, rel_tol=1e-12,
+                                method=method, **kwargs)
+            for a, b in zip(k, k_plain):
+                self.assertTrue(isclose(a, b, rel_tol=1e-10))
+            self.assertLess(max(n), max(n_plain))
+            self.assertGreater(min(n), 0)
+
+    def test_retires_converged(self):
+        sizes = []
+
+        def func(x):
+            sizes.append(len(x))
+            # 0.0 is a fixed point, so the first element converges at once
+            return [v if v == 0.0 else math.cos(v) for v in x]
+
+        x, iterations = iterate_many(func, [0.0, 1.0, 2.0])
+        self.assertEqual(iterations[0], 1)
+        self.assertEqual(sizes[0], 3)
+        self.assertEqual(sizes[1], 2)
+        self.assertTrue(isclose(x[1], x[2], rel_tol=1e-8))
+
+    def test_scalar_args(self):
+        x, iterations = iterate_many(lambda x, c: [v / 2 + c for v in x],
+                                     [0.0, 10.0], 1.0)
+        self.assertTrue(isclose(x[0], 2.0) and isclose(x[1], 2.0))
+
+    def test_not_converged(self):
+        x, iterations = iterate_many(lambda x: [-v for v in x], [1.0, 0.0],
+                                     max_iter=5)
+        self.assertEqual(list(iterations), [-1, 1])
+
+    def test_wrong_length(self):
+        with self.assertRaises(ValueError):
+            iterate_many(lambda x: [1.0], [1.0, 2.0])
+
+    def test_empty(self):
+        calls = []
+
+        def func(x):
+            calls.append(len(x))
+            return x
+
+        x, iterations = iterate_many(func, [])
+        self.assertEqual((len(x), len(iterations)), (0, 0))
+        self.assertEqual(calls, [0])
+
+    def test_not_converged_keeps_last(self):
+        x, iterations = iterate_many(lambda x: [v + 1.0 for v in x],
+                                     [0.0, 10.0], max_iter=7)
+        self.assertEqual(list(x), [7.0, 17.0])
+        self.assertEqual(list(iterations), [-1, -1])
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_numpy_func(self):
+        # func gets numpy arrays, so it can work in bulk
+        def func(k, omega, h):
+            self.assertIsInstance(k, np.ndarray)
+            self.assertIsInstance(h, np.ndarray)
+            return omega ** 2 / (9.806 * np.tanh(k * h))
+
+        k, iterations = iterate_many(func, [10.0] * len(self.omega),
+                                     self.omega, self.h, rel_tol=1e-12)
+        expected, _ = iterate_many(disp_many, [10.0] * len(self.omega),
+                                   self.omega, self.h, rel_tol=1e-12)
+        for a, b in zip(k, expected):
+            self.assertTrue(isclose(a, b, rel_tol=1e-10))
+        self.assertEqual(k.typecode, 'd')
+        self.assertEqual(iterations.typecode, 'l')
+
+
+class IterateManyNoNumpyTest(IterateManyTest):
+    """
+    the same tests, with the array.array version used without numpy
+    """
+
+    def setUp(self):
+        patcher = mock.patch.object(fixed_point, 'np', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @unittest.skip("func gets array.array('d') without numpy")
+    def test_numpy_func(self):
+        pass
+
+
+class DispersionManyTest(unittest.TestCase):
+
+    def test_shallow_water(self):
+        # plain substitution takes 1814 iterations for this one
+        omega = 2 * math.pi / 20
+        k = dispersion_many([omega], [1.0], tol=1e-12)
+        expected = iterate(disp, 10.0, omega, 1.0, rel_tol=1e-12,
+                           max_iter=10000)
+        self.assertTrue(isclose(k[0], expected, rel_tol=1e-10))
+
+    def test_max_iter(self):
+        with self.assertRaises(RuntimeError):
+            dispersion_many([2 * math.pi / 20], [1.0], method='plain')
+        k = dispersion_many([2 * math.pi / 20], [1.0], method='plain',
+                            max_iter=5000)
+        self.assertTrue(isclose(k[0], 0.1004919, rel_tol=1e-4))
+
+
+class IterateAsyncTest(unittest.TestCase):
+
+    def test_matches_iterate(self):
+        omega = 2 * math.pi / 10
+        k = asyncio.run(iterate_async(disp, 10.0, omega, 10.0,
+                                      rel_tol=1e-12))
+        self.assertEqual(k, iterate(disp, 10.0, omega, 10.0, rel_tol=1e-12))
+
+    def test_newton(self):
+        k = asyncio.run(iterate_async(disp, 10.0, 1.0, 10.0,
+                                      method='newton', fprime=disp_prime))
+        self.assertTrue(isclose(k, iterate(disp, 10.0, 1.0, 10.0)))
+
+    def test_yields(self):
+        # another task gets to run while a slow solve is going
+        ticks = []
+
+        async def ticker():
+            for _ in range(3):
+                ticks.append(True)
+                await asyncio.sleep(0)
+
+        async def main():
+            tick = asyncio.ensure_future(ticker())
+            x = await iterate_async(lambda x: x * 0.99, 1.0, abs_tol=1e-12,
+                                    max_iter=10000, yield_every=10)
+            await tick
+            return x
+
+        asyncio.run(main())
+        self.assertEqual(len(ticks), 3)
+
+    def test_cancel(self):
+        monitor = Monitor()
+
+        async def main():
+            # never converges
+            task = asyncio.ensure_future(
+                iterate_async(lambda x: -x, 1.0, max_iter=10**9,
+                              yield_every=5, monitor=monitor))
+            await asyncio.sleep(0)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(main())
+        self.assertTrue(monitor.closed)
+
+    def test_timeout(self):
+        self.assertRaises(asyncio.TimeoutError, asyncio.run,
+                          iterate_async(lambda x: -x, 1.0, max_iter=10**9,
+                                        timeout=0.01))
+
+    def test_max_iter(self):
+        self.assertRaises(RuntimeError, asyncio.run,
+                          iterate_async(lambda x: -x, 1.0, max_iter=10))
+
+    def test_bad_args(self):
+        self.assertRaises(ValueError, asyncio.run,
+                          iterate_async(math.cos, 1.0, yield_every=0))
+        self.assertRaises(ValueError, asyncio.run,
+                          iterate_async(math.cos, 1.0, method='newton'))
+
+    def test_telemetry(self):
+        monitor = Monitor()
+
+        async def main():
+            reports = monitor.subscribe()
+            task = asyncio.ensure_future(
+                iterate_async(lambda x: 0.5 * x + 1.0, 0.0, rel_tol=1e-12,
+                              yield_every=5, monitor=monitor))
+            received = [t async for t in reports]
+            return received, await task
+
+        received, x = asyncio.run(main())
+        self.assertTrue(isclose(x, 2.0, rel_tol=1e-11))
+        self.assertTrue(all(isinstance(t, Telemetry) for t in received))
+        self.assertEqual([t.iteration % 5 for t in received[:-1]],
+                         [0] * (len(received) - 1))
+        self.assertTrue(received[-1].converged)
+        self.assertEqual(received[-1].x, x)
+        self.assertLessEqual(received[-1].change, 1e-12)
+        changes = [t.change for t in received]
+        self.assertEqual(changes, sorted(changes, reverse=True))
+
+    def test_slow_subscriber(self):
+        monitor = Monitor()
+
+        async def main():
+            reports = monitor.subscribe(maxsize=2)
+            await iterate_async(lambda x: 0.5 * x + 1.0, 0.0, rel_tol=1e-12,
+                                yield_every=1, monitor=monitor)
+            return [t async for t in reports]
+
+        received = asyncio.run(main())
+        # only the newest report is kept, along with the end marker
+        self.assertEqual(len(received), 1)
+        self.assertTrue(received[0].converged)
+
+    def test_subscribe_after_close(self):
+        monitor = Monitor()
+        monitor.close()
+
+        async def main():
+            return [t async for t in monitor.subscribe()]
+
+        self.assertEqual(asyncio.run(main()), [])
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for group_close() in group_close.py
+"""
+
+import math
+import os
+import random
+import tempfile
+import unittest
+
+from isclose import isclose
+from group_close import group_close
+
+
+def reference_groups(values, rel_tol, abs_tol):
+    """ the same grouping, done the simple way """
+    groups = []
+    for value in sorted(v for v in values if not math.isnan(v)):
+        if groups and isclose(groups[-1][0], value, rel_tol, abs_tol):
+            groups[-1][1] += 1
+        else:
+            groups.append([value, 1])
+    return [tuple(group) for group in groups]
+
+
+class GroupCloseTest(unittest.TestCase):
+
+    def setUp(self):
+        rand = random.Random(7)
+        base = [rand.uniform(-1e3, 1e3) for _ in range(300)]
+        self.values = [b * (1 + rand.uniform(-1, 1) * 1e-7)
+                       for b in base for _ in range(rand.randint(1, 5))]
+        self.values += [0.0, -0.0, 1e-300, math.inf, math.inf, -math.inf]
+        rand.shuffle(self.values)
+
+    def test_matches_reference(self):
+        for rel_tol, abs_tol in ((1e-9, 0.0), (1e-6, 0.0), (1e-3, 1e-6),
+                                 (1e-9, 1.0), (2.0, 0.0)):
+            self.assertEqual(list(group_close(self.values, rel_tol,
+                                              abs_tol)),
+                             reference_groups(self.values, rel_tol, abs_tol))
+
+    def test_near_duplicates(self):
+        values = [1.0, 1.0 + 1e-12, 2.0, 1.0 - 1e-12, 2.0 * (1 + 1e-11), 3.0]
+        self.assertEqual(list(group_close(values)),
+                         [(1.0 - 1e-12, 3), (2.0, 2), (3.0, 1)])
+
+    def test_members_close_to_representative(self):
+        groups = list(group_close(self.values, rel_tol=1e-6))
+        self.assertEqual(sum(count for _, count in groups), len(self.values))
+        representatives = [value for value, _ in groups]
+        self.assertEqual(representatives, sorted(representatives))
+        for a, b in zip(representatives, representatives[1:]):
+            self.assertFalse(isclose(a, b, rel_tol=1e-6))
+
+    def test_external_sort(self):
+        in_memory = list(group_close(self.values, rel_tol=1e-6))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            external = list(group_close(iter(self.values), rel_tol=1e-6,
+                                        chunk_size=97, tmpdir=tmpdir))
+            # the runs are cleaned up
+            self.assertEqual(os.listdir(tmpdir), [])
+        self.assertEqual(external, in_memory)
+
+    def test_exact_chunks(self):
+        # a stream that is an exact multiple of the chunk size
+        self.assertEqual(list(group_close([1.0, 2.0, 1.0, 2.0],
+                                          chunk_size=2)),
+                         [(1.0, 2), (2.0, 2)])
+
+    def test_nan(self):
+        groups = list(group_close([1.0, math.nan, 1.0, math.nan]))
+        self.assertEqual(groups[0], (1.0, 2))
+        self.assertEqual(len(groups), 3)
+        self.assertTrue(all(math.isnan(v) and n == 1 for v, n in groups[1:]))
+
+    def test_empty(self):
+        self.assertEqual(list(group_close([])), [])
+
+    def test_bad_args(self):
+        self.assertRaises(ValueError, list, group_close([1.0], -1.0))
+        self.assertRaises(ValueError, list, group_close([1.0], 1e-9, -1.0))
+        self.assertRaises(ValueError, list, group_close([1.0], chunk_size=0))
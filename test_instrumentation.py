@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for the Recording context manager in instrumentation.py
+"""
+
+import math
+import unittest
+
+import isclose
+import is_close_module
+from fixed_point import iterate, iterate_many
+from instrumentation import Recording
+
+
+class RecordingTest(unittest.TestCase):
+
+    def test_isclose_counts(self):
+        with Recording() as recording:
+            is_close_module.isclose(1.0, 1.0)
+            is_close_module.isclose(1.0, 2.0)
+        self.assertEqual(recording.isclose['calls'], 2)
+        self.assertEqual(recording.isclose['equal'], 1)
+        self.assertEqual(recording.isclose['not_close'], 1)
+
+    def test_restores_state(self):
+        is_close_module.set_stats(False)
+        with Recording():
+            pass
+        self.assertFalse(is_close_module.set_stats(False))
+
+    def test_nested(self):
+        with Recording() as outer:
+            is_close_module.isclose(1.0, 2.0)
+            with Recording() as inner:
+                is_close_module.isclose(1.0, 2.0)
+        self.assertEqual(inner.isclose['calls'], 1)
+        self.assertEqual(outer.isclose['calls'], 2)
+
+    def test_iterations(self):
+        with Recording() as recording:
+            iterate(math.cos, 1.0)
+            iterate(math.cos, 1.0)
+            self.assertRaises(RuntimeError, iterate, lambda x: -x, 1.0,
+                              max_iter=5)
+        self.assertEqual(recording.solves, 3)
+        self.assertEqual(recording.iterations[-1], 1)
+        self.assertEqual(len(recording.iterations), 2)
+
+    def test_iterate_many(self):
+        with Recording() as recording:
+            x, iterations = iterate_many(lambda x: [0.5 * v for v in x],
+                                         [0.0, 1.0, 2.0], abs_tol=1e-6)
+        self.assertEqual(recording.solves, 3)
+        self.assertEqual(recording.iterations[1], 1)
+        self.assertEqual(sum(n * c for n, c in recording.iterations.items()),
+                         sum(iterations))
+
+    def test_not_recording(self):
+        recording = Recording()
+        with recording:
+            pass
+        iterate(math.cos, 1.0)
+        self.assertEqual(recording.solves, 0)
+
+    def test_solver_isclose_calls(self):
+        # the solvers use the Python isclose()
+        with Recording() as recording:
+            iterate(math.cos, 1.0)
+        calls = recording.python_isclose['calls']
+        self.assertEqual(recording.iterations, {calls: 1})
+        self.assertEqual(recording.python_isclose['rel_tol'], 1)
+        self.assertEqual(recording.python_isclose['not_close'], calls - 1)
+
+    def test_restores_python_state(self):
+        isclose.set_stats(False)
+        with Recording():
+            pass
+        self.assertFalse(isclose.set_stats(False))
+
+    def test_report(self):
+        with Recording() as recording:
+            is_close_module.isclose(1.0, 2.0)
+            iterate(math.cos, 1.0)
+        calls = recording.python_isclose['calls']
+        report = recording.report()
+        self.assertIn("isclose() calls: {} (C: 1, Python: {})".format(
+            calls + 1, calls), report)
+        self.assertIn("solves: 1", report)
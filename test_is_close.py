@@ -5,10 +5,17 @@ Unit tests for isclose function -- this one tests the experimental
 version in is_close.py
 """
 
+import math
 import unittest
 from decimal import Decimal
 from fractions import Fraction
-from is_close import isclose
+from is_close import (isclose, isclose_array, Comparator,
+                      isclose_ulps, ulps_distance)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class ErrorTestCase(unittest.TestCase):
@@ -223,3 +230,142 @@ class TestFraction(CloseTestCase):
     def test_not_close(self):
         self.do_not_close_all(self.close_examples, rel_tol=1e-9)
 
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class ArrayTest(unittest.TestCase):
+    """
+    the numpy version should give the same results as the scalar one
+    """
+    inf = float('inf')
+    nan = float('nan')
+    examples = [(2.0, 2.0), (0.0, -0.0), (1e8, 1e8 + 1), (9, 10), (10, 9),
+                (1e-9, 0.0), (-1e-8, -1.000000009e-8), (1.0, 1.1),
+                (inf, inf), (-inf, -inf), (inf, -inf), (inf, 1.0),
+                (1.0, inf), (nan, nan), (nan, 1.0), (1e308, -1e308),
+                ]
+    complex_examples = [(1.0+1.0j, 1.000000000001+1.0j),
+                        (1.0-1.0j, 1.0-0.999999999999j),
+                        (complex(inf, 0), complex(inf, 0)),
+                        (complex(inf, 0), complex(1e300, 0)),
+                        (complex(0, nan), 0j),
+                        ]
+
+    def check(self, examples, **kwargs):
+        a = np.array([x for x, y in examples])
+        b = np.array([y for x, y in examples])
+        for method in ("asymmetric", "strong", "weak", "average"):
+            expected = [isclose(x, y, method=method, **kwargs)
+                        for x, y in examples]
+            result = isclose_array(a, b, method=method, **kwargs)
+            self.assertEqual(result.tolist(), expected,
+                             msg="method: %s, %s" % (method, kwargs))
+
+    def test_real(self):
+        for kwargs in ({}, {'rel_tol': 0.1}, {'rel_tol': 1e-8},
+                       {'abs_tol': 1e-8}, {'rel_tol': 0.0}):
+            self.check(self.examples, **kwargs)
+
+    def test_complex(self):
+        for kwargs in ({'rel_tol': 1e-12}, {'rel_tol': 1e-13}):
+            self.check(self.complex_examples, **kwargs)
+
+    def test_broadcast(self):
+        result = isclose_array(np.array([[1.0], [2.0]]),
+                               np.array([1.0, 1.05, 2.0]),
+                               rel_tol=0.1)
+        self.assertEqual(result.tolist(), [[True, True, False],
+                                           [False, False, True]])
+
+    def test_bad_method(self):
+        with self.assertRaises(ValueError):
+            isclose_array([1.0], [1.0], method='week')
+
+    def test_negative_tol(self):
+        with self.assertRaises(ValueError):
+            isclose_array([1.0], [1.0], rel_tol=-1e-100)
+
+
+class ComparatorTest(unittest.TestCase):
+    """
+    a Comparator should give the same results as isclose()
+    """
+    examples = ArrayTest.examples + ArrayTest.complex_examples + [
+        (Fraction(1, 100000000) + 1, Fraction(1)),
+        ]
+
+    def test_matches_isclose(self):
+        for method in ("asymmetric", "strong", "weak", "average"):
+            for kwargs in ({}, {'rel_tol': 0.1}, {'abs_tol': 1e-8}):
+                close = Comparator(method=method, **kwargs)
+                for a, b in self.examples:
+                    self.assertEqual(close(a, b),
+                                     isclose(a, b, method=method, **kwargs),
+                                     msg="%s, %s, %s" % (a, b, close))
+
+    def test_many(self):
+        close = Comparator(rel_tol=0.1, method='strong')
+        self.assertEqual(close.many([9, 1.0, 5], [10, 1.05, 7]),
+                         [False, True, False])
+
+    def test_allclose(self):
+        close = Comparator(rel_tol=0.1, method='strong')
+        self.assertEqual(close.allclose([1.0, 9, 5], [1.05, 10, 7]), 1)
+        self.assertEqual(close.allclose([1.0, 9, 5], [1.05, 10, 7],
+                                        count=True), (1, 2))
+        self.assertEqual(close.allclose([1.0], [1.05]), -1)
+
+    def test_length_mismatch(self):
+        with self.assertRaises(ValueError):
+            Comparator().many([1.0], [1.0, 2.0])
+
+    def test_negative_tol(self):
+        with self.assertRaises(ValueError):
+            Comparator(rel_tol=-1e-100)
+
+    def test_bad_method(self):
+        with self.assertRaises(ValueError):
+            Comparator(method='week')
+
+
+def step(x, n):
+    """ n floats up (or down, for negative n) from x """
+    direction = math.inf if n > 0 else -math.inf
+    for _ in range(abs(n)):
+        x = math.nextafter(x, direction)
+    return x
+
+
+class UlpsTest(unittest.TestCase):
+
+    def test_distance(self):
+        for x in (1.0, -1.0, 1e-300, 5e-324, 1e300, -123.456):
+            for n in (0, 1, 2, 7):
+                self.assertEqual(ulps_distance(x, step(x, n)), n)
+                self.assertEqual(ulps_distance(step(x, -n), x), n)
+
+    def test_across_zero(self):
+        self.assertEqual(ulps_distance(0.0, -0.0), 0)
+        self.assertEqual(ulps_distance(5e-324, -5e-324), 2)
+
+    def test_close(self):
+        self.assertTrue(isclose_ulps(1.0, step(1.0, 4)))
+        self.assertTrue(isclose_ulps(1.0, step(1.0, -4)))
+        self.assertTrue(isclose_ulps(0.0, -0.0, max_ulps=0))
+        self.assertTrue(isclose_ulps(math.inf, math.inf, max_ulps=0))
+
+    def test_not_close(self):
+        self.assertFalse(isclose_ulps(1.0, step(1.0, 5)))
+        self.assertFalse(isclose_ulps(1.0, step(1.0, 1), max_ulps=0))
+        self.assertFalse(isclose_ulps(math.nan, math.nan))
+        self.assertFalse(isclose_ulps(math.inf, 1.7976931348623157e308))
+        self.assertFalse(isclose_ulps(math.inf, -math.inf))
+        self.assertFalse(isclose_ulps(1.0, -1.0))
+
+    def test_nan_distance(self):
+        with self.assertRaises(ValueError):
+            ulps_distance(math.nan, 1.0)
+
+    def test_negative_ulps(self):
+        with self.assertRaises(ValueError):
+            isclose_ulps(1.0, 1.0, max_ulps=-1)
@@ -7,7 +7,8 @@ Unit tests for isclose() function -- candidate for the strandard library
 import unittest
 from decimal import Decimal
 from fractions import Fraction
-from isclose import isclose
+import isclose as isclose_module
+from isclose import isclose, allclose, isclose_many
 
 
 class ErrorTestCase(unittest.TestCase):
@@ -203,3 +204,154 @@ class TestFraction(CloseTestCase):
 
     def test_not_close(self):
         self.do_not_close(self.close_examples, rel_tol=1e-9)
+
+
+class AllCloseTest(unittest.TestCase):
+    expected = [1, 1e8, Fraction(1, 3), 2.0]
+    actual = [1, 1e8 + 1, Fraction(1, 3), 2.1]
+
+    def test_all_close(self):
+        self.assertEqual(allclose(self.expected, self.expected), -1)
+
+    def test_first_failure(self):
+        self.assertEqual(allclose(self.expected, self.actual), 1)
+
+    def test_count(self):
+        self.assertEqual(allclose(self.expected, self.actual, count=True),
+                         (1, 2))
+        self.assertEqual(allclose(self.expected, self.expected, count=True),
+                         (-1, 0))
+
+    def test_length_mismatch(self):
+        with self.assertRaises(ValueError):
+            allclose([1.0], [1.0, 2.0])
+
+    def test_negative_tol(self):
+        with self.assertRaises(ValueError):
+            allclose([], [], rel_tol=-1e-100)
+
+
+class IsCloseManyTest(unittest.TestCase):
+    a = [1, 1e8, 9, float('inf'), float('nan'), Fraction(1, 3), 0.0]
+    b = [1, 1e8 + 1, 10, float('inf'), float('nan'), Fraction(1, 3), 1e-9]
+
+    def expected(self, **kwargs):
+        return [isclose(x, y, **kwargs) for x, y in zip(self.a, self.b)]
+
+    def test_serial(self):
+        self.assertEqual(isclose_many(self.a, self.b, rel_tol=0.1),
+                         self.expected(rel_tol=0.1))
+
+    def test_workers(self):
+        self.assertEqual(isclose_many(self.a, self.b, abs_tol=1e-8,
+                                      workers=3),
+                         self.expected(abs_tol=1e-8))
+
+    def test_length_mismatch(self):
+        with self.assertRaises(ValueError):
+            isclose_many([1.0], [1.0, 2.0])
+
+    def test_bad_workers(self):
+        with self.assertRaises(ValueError):
+            isclose_many([1.0], [1.0], workers=0)
+
+
+class TestDecimalKernel(CloseTestCase):
+    """
+    the Decimal specific code -- tolerances converted to Decimal exactly,
+    and Decimal infinities and NaNs
+    """
+    close_examples = [(Decimal('1.00000001'), Decimal('1.0')),
+                      (Decimal('-1.00000001e-100'), Decimal('-1.0e-100')),
+                      (Decimal('9.9999999'), Decimal('10.0')),
+                      ]
+    far_examples = [(Decimal('1e-5'), Decimal('1')),
+                    (Decimal('1e5'), Decimal('-1')),
+                    (Decimal('0'), Decimal('5')),
+                    ]
+
+    def test_float_tolerance(self):
+        self.do_close(self.close_examples, rel_tol=1e-8)
+        self.do_not_close(self.close_examples, rel_tol=1e-9)
+
+    def test_far(self):
+        self.do_not_close(self.far_examples, rel_tol=0.5)
+        self.do_not_close(self.far_examples, abs_tol=Decimal('0.1'))
+
+    def test_large_tolerance(self):
+        self.do_close(self.far_examples, rel_tol=2)
+        self.do_close(self.far_examples, abs_tol=Decimal('1e6'))
+
+    def test_non_finite(self):
+        self.do_not_close([(Decimal('nan'), Decimal('1')),
+                           (Decimal('inf'), Decimal('1e999')),
+                           (Decimal('inf'), Decimal('-inf')),
+                           ], rel_tol=2)
+        self.do_not_close(self.close_examples, rel_tol=float('nan'))
+
+
+class TestFractionKernel(CloseTestCase):
+    """
+    the exact rational code
+    """
+    close_examples = [(Fraction(2, 3), Fraction(666666661, 10**9)),
+                      (Fraction(-10, 7), Fraction(-1428571420, 10**9)),
+                      (Fraction(100000001, 1), 100000000),
+                      ]
+
+    def test_close(self):
+        self.do_close(self.close_examples, rel_tol=1e-8)
+        self.do_close(self.close_examples, rel_tol=Fraction(1, 10**8))
+
+    def test_not_close(self):
+        self.do_not_close(self.close_examples, rel_tol=1e-9)
+
+    def test_abs_tol(self):
+        self.do_close([(Fraction(1, 10**9), 0)], abs_tol=Fraction(1, 10**9))
+        self.do_not_close([(Fraction(1, 10**9), 0)],
+                          abs_tol=Fraction(1, 10**9 + 1))
+
+    def test_non_finite_tolerance(self):
+        self.do_close([(Fraction(1, 3), 100)], rel_tol=float('inf'))
+        self.do_not_close([(Fraction(1, 3), 100)], rel_tol=float('nan'))
+
+
+class StatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.was_enabled = isclose_module.set_stats(True)
+        isclose_module.reset_stats()
+
+    def tearDown(self):
+        isclose_module.set_stats(self.was_enabled)
+
+    def test_branches(self):
+        isclose(1.0, 1.0)
+        isclose(1.0, float('inf'))
+        isclose(1.0, 1.0 + 1e-10)
+        isclose(0.0, 1e-12, abs_tol=1e-9)
+        isclose(1.0, 2.0)
+        isclose(Decimal('1'), Decimal('Infinity'))
+        self.assertEqual(isclose_module.get_stats(),
+                         {'calls': 6, 'equal': 1, 'nonfinite': 2,
+                          'rel_tol': 1, 'abs_tol': 1, 'not_close': 1})
+
+    def test_results_unchanged(self):
+        self.assertTrue(isclose(Fraction(1, 3), Fraction(1, 3) + 1e-12))
+        self.assertFalse(isclose(float('nan'), float('nan')))
+        with self.assertRaises(ValueError):
+            isclose(1.0, 2.0, -1.0)
+
+    def test_allclose_counted(self):
+        allclose([1.0, 2.0, 3.0], [1.0, 2.0, 3.0])
+        self.assertEqual(isclose_module.get_stats()['calls'], 3)
+
+    def test_disabled(self):
+        isclose_module.set_stats(False)
+        isclose(1.0, 2.0)
+        self.assertEqual(isclose_module.get_stats()['calls'], 0)
+
+    def test_reset(self):
+        isclose(1.0, 2.0)
+        isclose_module.reset_stats()
+        self.assertEqual(set(isclose_module.get_stats().values()), {0})
@@ -5,11 +5,26 @@ Unit tests for isclose function -- this one tests the c
 version in is_close_module.py
 """
 
+import math
+import struct
+import threading
 import unittest
-from is_close_module import isclose
+from array import array
+from is_close_module import (isclose, isclose_many, allclose, Comparator,
+                             isclose_ulps, isclose_ulps_many, compare_stats,
+                             set_stats, get_stats, reset_stats,
+                             isclose_complex, isclose_complex_many,
+                             isclose_many_float32, isclose_many_float16,
+                             set_simd, get_simd, SIMD_VARIANTS,
+                             MismatchReport)
 from decimal import Decimal
 from fractions import Fraction
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 class ErrorTestCase(unittest.TestCase):
     """
@@ -27,6 +42,40 @@ class ErrorTestCase(unittest.TestCase):
             isclose(1, 1, 1e-100, -1e10)
 
 
+class ArgumentTestCase(unittest.TestCase):
+    """
+    the fast argument handling should behave like the regular kind
+    """
+
+    def test_keywords(self):
+        self.assertTrue(isclose(a=9.0, b=10.0, rel_tol=0.1))
+        self.assertTrue(isclose(9.0, b=10.0, rel_tol=0.1))
+        self.assertTrue(isclose(0.0, 1e-9, abs_tol=1e-8))
+        self.assertTrue(isclose(0.0, 1e-9, 0.0, 1e-8))
+        self.assertFalse(isclose(9.0, 10.0, abs_tol=0.5))
+
+    def test_mixed_types(self):
+        self.assertTrue(isclose(9, 10, 0.1))
+        self.assertTrue(isclose(Decimal('9'), 10.0, rel_tol=0.1))
+        self.assertFalse(isclose(True, 2))
+
+    def test_errors(self):
+        with self.assertRaises(TypeError):
+            isclose(1.0)
+        with self.assertRaises(TypeError):
+            isclose(1.0, 1.0, 1e-9, 0.0, 1.0)
+        with self.assertRaises(TypeError):
+            isclose(1.0, 1.0, tol=1e-9)
+        with self.assertRaises(TypeError):
+            isclose(1.0, 1.0, a=1.0)
+        with self.assertRaises(TypeError):
+            isclose(1.0, "1.0")
+        with self.assertRaises(TypeError):
+            isclose(1.0, 1.0, rel_tol="1e-9")
+        with self.assertRaises(ValueError):
+            isclose(1.0, 1.0, abs_tol=-1.0)
+
+
 class CloseTestCase(unittest.TestCase):
     """ some methods that make it easier to get a nice error message,
         and/or test a bunch of values
@@ -239,3 +288,716 @@ class TestFraction(CloseTestCase):
 
     def test_not_close(self):
         self.do_not_close_all(self.close_examples, rel_tol=1e-9)
+
+
+class IsCloseManyTest(unittest.TestCase):
+    """
+    tests for the batched version over float64 buffers
+    """
+    inf = float('inf')
+    nan = float('nan')
+
+    a = [1.0, 1e8, 9.0, inf, inf, nan, 0.0, 1e-9, 2.0]
+    b = [1.0, 1e8 + 1, 10.0, inf, -inf, nan, -0.0, 0.0, 2.000001]
+
+    def expected(self, **kwargs):
+        return [isclose(x, y, **kwargs) for x, y in zip(self.a, self.b)]
+
+    def unpack(self, out, n):
+        return [bool(out[i // 8] & (1 << (i % 8))) for i in range(n)]
+
+    def test_matches_scalar(self):
+        for kwargs in ({}, {'rel_tol': 0.1}, {'abs_tol': 1e-8}):
+            out = bytearray(2)
+            count = isclose_many(array('d', self.a), array('d', self.b),
+                                 out, **kwargs)
+            result = self.unpack(out, len(self.a))
+            self.assertEqual(result, self.expected(**kwargs))
+            self.assertEqual(count, sum(result))
+
+    def test_bytes_and_memoryview(self):
+        a = array('d', self.a).tobytes()
+        b = memoryview(array('d', self.b))
+        out = bytearray(2)
+        isclose_many(a, b, out)
+        self.assertEqual(self.unpack(out, len(self.a)), self.expected())
+
+    def test_threads(self):
+        n = 1000003
+        a = array('d', [float(i) for i in range(n)])
+        b = array('d', a)
+        for i in range(0, n, 1001):
+            b[i] += 1.0
+        expected = bytearray((n + 7) // 8)
+        single = isclose_many(a, b, expected)
+        for nthreads in (2, 3, 8):
+            out = bytearray((n + 7) // 8)
+            self.assertEqual(isclose_many(a, b, out, nthreads=nthreads),
+                             single)
+            self.assertEqual(out, expected)
+
+    def test_bad_nthreads(self):
+        with self.assertRaises(ValueError):
+            isclose_many(array('d'), array('d'), bytearray(), nthreads=0)
+
+    def test_clears_unused_bits(self):
+        out = bytearray(b'\xff')
+        isclose_many(array('d', [1.0, 1.0]), array('d', [1.0, 2.0]), out)
+        self.assertEqual(out, bytearray(b'\x01'))
+
+    def test_length_mismatch(self):
+        with self.assertRaises(ValueError):
+            isclose_many(array('d', [1.0]), array('d', [1.0, 2.0]),
+                         bytearray(1))
+
+    def test_out_too_small(self):
+        with self.assertRaises(ValueError):
+            isclose_many(array('d', [1.0] * 9), array('d', [1.0] * 9),
+                         bytearray(1))
+
+    def test_wrong_format(self):
+        with self.assertRaises(TypeError):
+            isclose_many(array('i', [1, 2]), array('i', [1, 2]),
+                         bytearray(1))
+
+    def test_negative_tol(self):
+        with self.assertRaises(ValueError):
+            isclose_many(array('d', [1.0]), array('d', [1.0]),
+                         bytearray(1), rel_tol=-1e-100)
+
+
+class AllCloseTest(unittest.TestCase):
+    """
+    tests for the allclose() reduction
+    """
+    close = [1.0, 1e8, 2.0, float('inf')]
+    actual = [1.0, 1e8 + 1, 2.1, float('inf')]
+
+    def test_all_close(self):
+        self.assertEqual(allclose(self.close, self.close), -1)
+
+    def test_first_failure(self):
+        self.assertEqual(allclose(self.close, self.actual), 1)
+
+    def test_count(self):
+        self.assertEqual(allclose(self.close, self.actual, count=True),
+                         (1, 2))
+        self.assertEqual(allclose(self.close, self.close, count=True),
+                         (-1, 0))
+
+    def test_tolerance(self):
+        self.assertEqual(allclose(self.close, self.actual, rel_tol=0.1), -1)
+
+    def test_buffers(self):
+        self.assertEqual(allclose(array('d', self.close),
+                                  array('d', self.actual),
+                                  count=True),
+                         (1, 2))
+
+    def test_other_buffers(self):
+        # buffers of other types are read as sequences of numbers
+        self.assertEqual(allclose(array('l', [1, 2, 3]),
+                                  array('d', [1.0, 2.0, 3.5])), 2)
+        self.assertEqual(allclose(array('f', [1.5, 2.5]), [1.5, 2.5]), -1)
+        self.assertEqual(allclose(memoryview(array('d', [1.0, 5.0,
+                                                         2.0]))[::2],
+                                  array('d', [1.0, 2.0])), -1)
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_numpy(self):
+        self.assertEqual(allclose(np.array([1, 2]), np.array([1.0, 2.0])), -1)
+        self.assertEqual(allclose(np.array([1, 2], np.int32), [1, 3]), 1)
+        self.assertEqual(allclose(np.arange(4.0), np.arange(4.0),
+                                  count=True), (-1, 0))
+
+    def test_length_mismatch(self):
+        with self.assertRaises(ValueError):
+            allclose([1.0], [1.0, 2.0])
+        with self.assertRaises(ValueError):
+            allclose(array('d', [1.0]), array('d', [1.0, 2.0]))
+
+    def test_not_numbers(self):
+        with self.assertRaises(TypeError):
+            allclose(["1.0"], [1.0])
+
+
+class ComparatorTest(unittest.TestCase):
+    """
+    tests for the pre-validated Comparator type
+    """
+    inf = float('inf')
+    nan = float('nan')
+
+    examples = [(9, 10), (10, 9), (1.0, 1.0), (1e8, 1e8 + 1), (0.0, 1e-9),
+                (inf, inf), (inf, -inf), (inf, 1.0), (nan, nan)]
+
+    def test_weak_matches_isclose(self):
+        for kwargs in ({}, {'rel_tol': 0.1}, {'abs_tol': 1e-8}):
+            close = Comparator(**kwargs)
+            for a, b in self.examples:
+                self.assertEqual(close(a, b), isclose(a, b, **kwargs))
+
+    def test_methods(self):
+        self.assertTrue(Comparator(0.1, method='asymmetric')(9, 10))
+        self.assertFalse(Comparator(0.1, method='asymmetric')(10, 9))
+        self.assertFalse(Comparator(0.1, method='strong')(9, 10))
+        self.assertFalse(Comparator(0.1, method='average')(10, 9))
+        self.assertTrue(Comparator(0.1, method='average')(10, 9.5))
+
+    def test_attributes(self):
+        close = Comparator(1e-6, 1e-12, 'strong')
+        self.assertEqual((close.rel_tol, close.abs_tol, close.method),
+                         (1e-6, 1e-12, 'strong'))
+        self.assertEqual(repr(close), "Comparator(rel_tol=1e-06, "
+                                      "abs_tol=1e-12, method='strong')")
+
+    def test_many(self):
+        out = bytearray(1)
+        count = Comparator(0.1, method='strong').many(
+            array('d', [9, 1.0, 5]), array('d', [10, 1.05, 7]), out)
+        self.assertEqual(count, 1)
+        self.assertEqual(out, bytearray(b'\x02'))
+
+    def test_allclose(self):
+        close = Comparator(0.1, method='strong')
+        self.assertEqual(close.allclose([1.0, 9, 5], [1.05, 10, 7]), 1)
+        self.assertEqual(close.allclose(array('d', [1.0, 9, 5]),
+                                        array('d', [1.05, 10, 7]),
+                                        count=True), (1, 2))
+        self.assertEqual(close.allclose(array('i', [1, 9, 5]),
+                                        [1.05, 10, 7]), 1)
+
+    def test_call_errors(self):
+        close = Comparator()
+        with self.assertRaises(TypeError):
+            close(1.0)
+        with self.assertRaises(TypeError):
+            close(1.0, b=1.0)
+        with self.assertRaises(TypeError):
+            close("1.0", 1.0)
+
+    def test_negative_tol(self):
+        with self.assertRaises(ValueError):
+            Comparator(rel_tol=-1e-100)
+
+    def test_bad_method(self):
+        with self.assertRaises(ValueError):
+            Comparator(method='week')
+
+
+class UlpsTest(unittest.TestCase):
+    """
+    tests for the ULP based comparison
+    """
+    one_up = math.nextafter(1.0, 2.0)
+    five_up = 1.0 + 5 * 2.0 ** -52
+
+    def test_close(self):
+        self.assertTrue(isclose_ulps(1.0, self.one_up, max_ulps=1))
+        self.assertTrue(isclose_ulps(0.0, -0.0, max_ulps=0))
+        self.assertTrue(isclose_ulps(5e-324, -5e-324, max_ulps=2))
+        self.assertTrue(isclose_ulps(math.inf, math.inf, max_ulps=0))
+
+    def test_not_close(self):
+        self.assertFalse(isclose_ulps(1.0, self.one_up, max_ulps=0))
+        self.assertFalse(isclose_ulps(1.0, self.five_up))
+        self.assertFalse(isclose_ulps(math.nan, math.nan))
+        self.assertFalse(isclose_ulps(math.inf, 1.7976931348623157e308))
+        self.assertFalse(isclose_ulps(-1.7976931348623157e308,
+                                      1.7976931348623157e308,
+                                      max_ulps=2 ** 63 - 1))
+
+    def test_many(self):
+        a = array('d', [1.0, 1.0, 0.0, math.nan, -1.0])
+        b = array('d', [self.one_up, self.five_up, -0.0, math.nan,
+                        -self.one_up])
+        out = bytearray(1)
+        self.assertEqual(isclose_ulps_many(a, b, out), 3)
+        self.assertEqual(out, bytearray([0b10101]))
+
+    def test_negative_ulps(self):
+        with self.assertRaises(ValueError):
+            isclose_ulps(1.0, 1.0, max_ulps=-1)
+
+
+class CompareStatsTest(unittest.TestCase):
+
+    def test_stats(self):
+        a = array('d', [1.0, 2.0, 4.0, 8.0, 0.0])
+        b = array('d', [1.0, 2.2, 4.1, 8.0, 1e-12])
+        failures, worst, worst_index, first = compare_stats(a, b, 0.05)
+        self.assertEqual((failures, worst_index, first), (2, 4, [1, 4]))
+        self.assertEqual(worst, 1.0)
+
+    def test_max_failures(self):
+        a = array('d', [1.0, 2.0, 3.0])
+        b = array('d', [1.5, 2.5, 3.5])
+        self.assertEqual(compare_stats(a, b, max_failures=1)[3], [0])
+        self.assertEqual(compare_stats(a, b, max_failures=0)[3], [])
+
+    def test_non_finite(self):
+        inf = float('inf')
+        a = array('d', [inf, 1.0, float('nan')])
+        b = array('d', [inf, 1.0, 1.0])
+        self.assertEqual(compare_stats(a, b), (1, inf, 2, [2]))
+
+    def test_empty(self):
+        self.assertEqual(compare_stats(b'', b''), (0, 0.0, -1, []))
+
+    def test_matches_report(self):
+        a = array('d', [1.0, 2.0, float('inf'), 0.0, 5.0])
+        b = array('d', [1.5, 2.0, 1.0, float('nan'), 5.5])
+        report = MismatchReport(0.05, max_failures=2)
+        report.update(a, b)
+        self.assertEqual(compare_stats(a, b, 0.05, max_failures=2),
+                         (report.failures, report.max_rel_error,
+                          report.max_rel_index, report.first_failures()))
+
+
+class StatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.was_enabled = set_stats(True)
+        reset_stats()
+
+    def tearDown(self):
+        set_stats(self.was_enabled)
+        reset_stats()
+
+    def test_branches(self):
+        inf = float('inf')
+        isclose(1.0, 1.0)
+        isclose(1.0, inf)
+        isclose(1.0, 1.0 + 1e-12)
+        isclose(0.0, 1e-12, abs_tol=1e-9)
+        isclose(1.0, 2.0)
+        isclose(float('nan'), 1.0)
+        isclose(1, 2, rel_tol=0.5)
+        stats = get_stats()
+        self.assertEqual(stats['calls'], 7)
+        self.assertEqual(stats['equal'], 1)
+        self.assertEqual(stats['nonfinite'], 1)
+        self.assertEqual(stats['rel_tol'], 2)
+        self.assertEqual(stats['abs_tol'], 1)
+        self.assertEqual(stats['not_close'], 2)
+
+    def test_batched(self):
+        a = array('d', [1.0, 2.0, 3.0])
+        isclose_many(a, a, bytearray(1))
+        allclose(a, a)
+        allclose([1.0, 2.0], [1.0, 2.0])
+        compare_stats(a, a)
+        Comparator()(1.0, 2.0)
+        stats = get_stats()
+        self.assertEqual(stats['batched_calls'], 4)
+        self.assertEqual(stats['batched_values'], 11)
+        self.assertEqual(stats['comparator_calls'], 1)
+        self.assertEqual(stats['calls'], 0)
+
+    def test_disabled(self):
+        self.assertTrue(set_stats(False))
+        isclose(1.0, 2.0)
+        isclose_many(array('d', [1.0]), array('d', [1.0]), bytearray(1))
+        self.assertEqual(set(get_stats().values()), {0})
+
+    def test_reset(self):
+        isclose(1.0, 2.0)
+        reset_stats()
+        self.assertEqual(get_stats()['calls'], 0)
+
+    def test_reset_to_saved(self):
+        isclose(1.0, 2.0)
+        allclose([1.0], [1.0])
+        saved = get_stats()
+        isclose(1.0, 1.0)
+        reset_stats(saved)
+        self.assertEqual(get_stats(), saved)
+        reset_stats({'calls': 3})
+        expected = dict.fromkeys(saved, 0)
+        expected['calls'] = 3
+        self.assertEqual(get_stats(), expected)
+        with self.assertRaises(ValueError):
+            reset_stats({'cals': 3})
+        with self.assertRaises(TypeError):
+            reset_stats([3])
+
+
+class ComplexTest(unittest.TestCase):
+    # the examples from the commented out ComplexTests above
+    close_examples = [(1.0 + 1.0j, 1.000000000001 + 1.0j),
+                      (1.0 + 1.0j, 1.0 + 1.000000000001j),
+                      (-1.0 + 1.0j, -1.000000000001 + 1.0j),
+                      (1.0 - 1.0j, 1.0 - 0.999999999999j),
+                      ]
+
+    def test_close(self):
+        for a, b in self.close_examples:
+            self.assertTrue(isclose_complex(a, b, rel_tol=1e-12))
+            self.assertTrue(isclose_complex(b, a, rel_tol=1e-12))
+            self.assertFalse(isclose_complex(a, b, rel_tol=1e-13))
+
+    def test_matches_abs(self):
+        # the same answers as the weak test done with abs()
+        from isclose import isclose as py_isclose
+        for scale in (1.0, 1e-320, 1e-200, 1e200, 1e307):
+            for a, b in self.close_examples:
+                a, b = a * scale, b * scale
+                for rel_tol in (1e-11, 1e-12, 1e-13):
+                    self.assertEqual(isclose_complex(a, b, rel_tol),
+                                     py_isclose(a, b, rel_tol))
+
+    def test_no_overflow(self):
+        big = 1e308
+        self.assertTrue(isclose_complex(complex(big, big),
+                                        complex(big, big * (1 + 1e-12))))
+        self.assertFalse(isclose_complex(complex(big, -big),
+                                         complex(-big, big)))
+        self.assertTrue(isclose_complex(5e-324j, 1e-323j, rel_tol=0.6))
+        self.assertFalse(isclose_complex(5e-324j, 1e-323j))
+
+    def test_abs_tol(self):
+        self.assertTrue(isclose_complex(0j, 1e-10 + 1e-10j, abs_tol=1e-9))
+        self.assertFalse(isclose_complex(0j, 1e-9 + 1e-9j, abs_tol=1e-9))
+        self.assertTrue(isclose_complex(1e-320j, 1e-300j, abs_tol=1e-12))
+
+    def test_non_finite(self):
+        inf = float('inf')
+        nan = float('nan')
+        self.assertTrue(isclose_complex(complex(inf, 1), complex(inf, 1)))
+        self.assertFalse(isclose_complex(complex(inf, 1), complex(inf, 2)))
+        self.assertFalse(isclose_complex(complex(1, inf), 1 + 1j))
+        self.assertFalse(isclose_complex(complex(nan, 1), complex(nan, 1)))
+        self.assertFalse(isclose_complex(complex(1, nan), 1 + 1j,
+                                         abs_tol=inf))
+
+    def test_real_args(self):
+        self.assertTrue(isclose_complex(1.0, 1.0 + 1e-10))
+        self.assertTrue(isclose_complex(1, 1 + 0j))
+
+    def test_componentwise(self):
+        # close in magnitude, but not in the (small) imaginary part
+        a, b = 1 + 1e-6j, 1 + 2e-6j
+        self.assertTrue(isclose_complex(a, b, rel_tol=1e-5))
+        self.assertFalse(isclose_complex(a, b, rel_tol=1e-5,
+                                         componentwise=True))
+        for a, b in self.close_examples:
+            self.assertTrue(isclose_complex(a, b, rel_tol=2e-12,
+                                            componentwise=True))
+
+    def test_bad_tolerance(self):
+        self.assertRaises(ValueError, isclose_complex, 1j, 1j, -1.0)
+        self.assertRaises(ValueError, isclose_complex, 1j, 1j, 1e-9, -1.0)
+
+    def test_many_interleaved(self):
+        a = array('d', [1.0, 1.0, 1.0, 1e-6, 0.0, 0.0])
+        b = array('d', [1.0, 1.0 + 1e-12, 1.0, 2e-6, 1.0, 0.0])
+        out = bytearray(1)
+        self.assertEqual(isclose_complex_many(a, b, out, rel_tol=1e-5), 2)
+        self.assertEqual(out[0], 0b011)
+        self.assertEqual(isclose_complex_many(a, b, out, rel_tol=1e-5,
+                                              componentwise=True), 1)
+        self.assertEqual(out[0], 0b001)
+
+    def test_many_errors(self):
+        out = bytearray(1)
+        self.assertRaises(ValueError, isclose_complex_many,
+                          array('d', [1.0]), array('d', [1.0]), out)
+        self.assertRaises(ValueError, isclose_complex_many,
+                          array('d', [1.0, 0.0]),
+                          array('d', [1.0, 0.0, 1.0, 0.0]), out)
+        self.assertRaises(ValueError, isclose_complex_many,
+                          array('d', [1.0, 0.0] * 9),
+                          array('d', [1.0, 0.0] * 9), out)
+        self.assertRaises(TypeError, isclose_complex_many,
+                          array('f', [1.0, 0.0]), array('f', [1.0, 0.0]),
+                          out)
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_many_numpy(self):
+        a = np.array([1 + 1j, 1 + 1j, complex('inf'), complex('nan'), 0j])
+        b = np.array([1 + 1.0000000001j, 1 + 2j, complex('inf'),
+                      complex('nan'), 0j])
+        out = bytearray(1)
+        self.assertEqual(isclose_complex_many(a, b, out), 3)
+        self.assertEqual(out[0], 0b10101)
+        expected = [isclose_complex(x, y) for x, y in zip(a, b)]
+        self.assertEqual([bool(out[0] & (1 << i)) for i in range(5)],
+                         expected)
+
+
+def bits(out, n):
+    """ the packed result bits as a list of bools """
+    return [bool(out[i // 8] & (1 << (i % 8))) for i in range(n)]
+
+
+class Float32Test(unittest.TestCase):
+
+    def test_default_tolerance(self):
+        a = array('f', [1.0, 1.0, 1.0, 100.0, 0.0])
+        b = array('f', [1.0, 1.00005, 1.0002, 100.009, 1e-30])
+        out = bytearray(1)
+        self.assertEqual(isclose_many_float32(a, b, out), 3)
+        self.assertEqual(bits(out, 5), [True, True, False, True, False])
+
+    def test_matches_float64(self):
+        values = [0.0, -0.0, 1.0, 1.0 + 2 ** -23, 3.5, 1e38, -1e38, 1e-45,
+                  float('inf'), float('-inf'), float('nan'), 7.25]
+        a = array('f', values)
+        b = array('f', values[1:] + values[:1])
+        for rel_tol, abs_tol in ((1e-4, 0.0), (1e-9, 0.0), (0.5, 1e-40)):
+            out32 = bytearray(2)
+            out64 = bytearray(2)
+            n32 = isclose_many_float32(a, b, out32, rel_tol, abs_tol)
+            n64 = isclose_many(array('d', a), array('d', b), out64,
+                               rel_tol, abs_tol)
+            self.assertEqual((n32, out32), (n64, out64))
+
+    def test_raw_bytes(self):
+        data = array('f', [1.0, 2.0]).tobytes()
+        self.assertEqual(isclose_many_float32(data, data, bytearray(1)), 2)
+
+    def test_threads(self):
+        a = array('f', range(200000))
+        b = array('f', a)
+        b[123456] = 0.0
+        out = bytearray(25000)
+        self.assertEqual(isclose_many_float32(a, b, out, nthreads=3), 199999)
+        self.assertEqual(out[123456 // 8], 0xff ^ (1 << (123456 % 8)))
+
+    def test_errors(self):
+        out = bytearray(1)
+        self.assertRaises(TypeError, isclose_many_float32,
+                          array('d', [1.0]), array('d', [1.0]), out)
+        self.assertRaises(ValueError, isclose_many_float32,
+                          array('f', [1.0]), array('f', [1.0]), out, -1.0)
+        self.assertRaises(ValueError, isclose_many_float32,
+                          array('f', [1.0]), array('f', [1.0, 2.0]), out)
+
+
+class Float16Test(unittest.TestCase):
+
+    @staticmethod
+    def half(values):
+        return struct.pack('%ie' % len(values), *values)
+
+    def test_default_tolerance(self):
+        a = self.half([1.0, 1.0, 1.0, 0.0])
+        b = self.half([1.0, 1.0078125, 1.03125, 6e-8])
+        out = bytearray(1)
+        self.assertEqual(isclose_many_float16(a, b, out), 2)
+        self.assertEqual(bits(out, 4), [True, True, False, False])
+
+    def test_all_halves(self):
+        # every float16 value converts exactly, including subnormals,
+        # infinities and NaN
+        a = struct.pack('65536H', *range(65536))
+        values = struct.unpack('65536e', a)
+        # each value against the next bit pattern up
+        b = struct.pack('65536H', *(list(range(1, 65536)) + [0]))
+        for rel_tol in (0.0, 1e-3, 0.5):
+            out16 = bytearray(8192)
+            out64 = bytearray(8192)
+            isclose_many_float16(a, b, out16, rel_tol)
+            isclose_many(array('d', values),
+                         array('d', struct.unpack('65536e', b)),
+                         out64, rel_tol)
+            self.assertEqual(out16, out64)
+        # each value is close only to itself with no tolerance
+        self.assertEqual(isclose_many_float16(a, a, bytearray(8192), 0.0),
+                         sum(1 for v in values if v == v))
+
+    def test_wrong_size(self):
+        self.assertRaises(TypeError, isclose_many_float16, b'abc', b'abc',
+                          bytearray(1))
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_numpy(self):
+        a = np.array([1.0, 2.0, 65504.0, np.inf], dtype=np.float16)
+        b = np.array([1.001, 2.5, 65500.0, np.inf], dtype=np.float16)
+        out = bytearray(1)
+        self.assertEqual(isclose_many_float16(a, b, out), 3)
+        self.assertEqual(bits(out, 4), [True, False, True, True])
+        self.assertRaises(TypeError, isclose_many_float16,
+                          a.astype(np.float32), b.astype(np.float32), out)
+
+
+class SimdTest(unittest.TestCase):
+    """
+    every variant of the branchless batched loop should give the same
+    answers as the scalar isclose()
+    """
+    values = [0.0, -0.0, 1.0, -1.0, 1.0 + 1e-9, 1.0 - 1e-9, 1.0 + 3e-9,
+              5e-324, -5e-324, 1e308, -1e308, 1.7976931348623157e308,
+              float('inf'), float('-inf'), float('nan'), 1e-3, 2.5]
+
+    def setUp(self):
+        self.variant = get_simd()
+
+    def tearDown(self):
+        set_simd(self.variant)
+
+    def pairs(self):
+        # every pair of values -- an odd number, so the last byte of the
+        # output is partly used
+        a = array('d', [x for x in self.values for y in self.values])
+        b = array('d', [y for x in self.values for y in self.values])
+        return a, b
+
+    def test_variants(self):
+        self.assertIn(get_simd(), SIMD_VARIANTS)
+        self.assertEqual(SIMD_VARIANTS[-1], get_simd())
+
+    def test_matches_scalar(self):
+        a, b = self.pairs()
+        n = len(a)
+        for variant in SIMD_VARIANTS:
+            set_simd(variant)
+            for rel_tol, abs_tol in ((1e-9, 0.0), (2e-9, 1e-3), (0.0, 0.0),
+                                     (0.5, float('inf')),
+                                     (float('inf'), 0.0)):
+                expected = [isclose(x, y, rel_tol, abs_tol)
+                            for x, y in zip(a, b)]
+                out = bytearray(b'\xff' * ((n + 7) // 8))
+                count = isclose_many(a, b, out, rel_tol, abs_tol)
+                self.assertEqual(bits(out, n), expected,
+                                 (variant, rel_tol, abs_tol))
+                self.assertEqual(count, sum(expected))
+                # the unused bits of the last byte are cleared
+                self.assertEqual(out[-1] >> (n % 8), 0)
+
+                out32 = bytearray((n + 7) // 8)
+                a32, b32 = array('f', a), array('f', b)
+                expected = [isclose(x, y, rel_tol, abs_tol)
+                            for x, y in zip(a32, b32)]
+                isclose_many_float32(a32, b32, out32, rel_tol, abs_tol)
+                self.assertEqual(bits(out32, n), expected, variant)
+
+    def test_lengths(self):
+        # blocks and partial blocks, with threads
+        for variant in SIMD_VARIANTS:
+            set_simd(variant)
+            for n in (0, 1, 7, 8, 9, 63, 64, 65, 200003):
+                a = array('d', range(n))
+                b = array('d', a)
+                for i in range(0, n, 5):
+                    b[i] += 1.0
+                out = bytearray((n + 7) // 8)
+                self.assertEqual(isclose_many(a, b, out, nthreads=2),
+                                 n - len(range(0, n, 5)))
+                self.assertEqual(bits(out, n),
+                                 [i % 5 != 0 for i in range(n)])
+
+    def test_bad_variant(self):
+        self.assertRaises(ValueError, set_simd, 'mmx')
+        self.assertEqual(get_simd(), self.variant)
+
+
+class MismatchReportTest(unittest.TestCase):
+
+    a = array('d', [1.0, 2.0, float('nan'), float('inf'), 5.0, 1.0, 1e-300,
+                    3.0])
+    b = array('d', [1.0, 2.1, 1.0, float('-inf'), 5.0000001, 1.0 + 1e-12,
+                    0.0, float('inf')])
+
+    def test_counts(self):
+        report = MismatchReport()
+        self.assertEqual(report.update(self.a, self.b), 6)
+        self.assertEqual((report.count, report.failures), (8, 6))
+        self.assertEqual(report.nan_mismatches, 1)
+        self.assertEqual(report.inf_mismatches, 2)
+        self.assertEqual(report.max_abs_error, float('inf'))
+        self.assertEqual(report.max_rel_error, float('inf'))
+        self.assertEqual(report.max_rel_index, 2)
+        self.assertEqual(report.first_failures(), [1, 2, 3, 4, 6, 7])
+
+    def test_worst(self):
+        report = MismatchReport(top_k=4)
+        report.update(self.a, self.b)
+        worst = report.worst()
+        # the non-finite mismatches first, in order, then 1e-300 vs 0.0
+        self.assertEqual([w[0] for w in worst], [2, 3, 7, 6])
+        self.assertEqual(worst[3], (6, 1e-300, 0.0, 1e-300, 1.0))
+
+    def test_top_k_across_updates(self):
+        a = array('d', range(1, 1001))
+        b = array('d', [x * (1 + (x % 97) * 1e-6) for x in a])
+        report = MismatchReport(top_k=5, max_failures=3)
+        for start in range(0, 1000, 64):
+            report.update(a[start:start + 64], b[start:start + 64])
+        errors = sorted(((abs(y - x) / max(abs(x), abs(y)), -i)
+                         for i, (x, y) in enumerate(zip(a, b))
+                         if not isclose(x, y)), reverse=True)
+        self.assertEqual([w[0] for w in report.worst()],
+                         [-i for _, i in errors[:5]])
+        self.assertEqual(report.count, 1000)
+        self.assertEqual(report.failures, len(errors))
+        self.assertEqual(report.first_failures(), [0, 1, 2])
+
+    def test_histogram(self):
+        report = MismatchReport()
+        report.update(self.a, self.b)
+        histogram = report.histogram()
+        self.assertEqual(len(histogram), 19)
+        self.assertEqual(histogram[0], (0.0, 1))
+        self.assertEqual(histogram[-1], (float('inf'), 3))
+        self.assertEqual(sum(count for _, count in histogram), 8)
+        counts = dict(histogram)
+        self.assertEqual(counts[1e-11], 1)    # 1e-12
+        self.assertEqual(counts[1e-7], 1)     # 2e-8
+        self.assertEqual(counts[0.1], 1)      # 0.1 / 2.1
+        self.assertEqual(counts[1.0], 1)      # 1e-300 vs 0
+
+    def test_histogram_bounds(self):
+        # errors right on a bound go in that bin
+        for power in range(-16, 1):
+            bound = 10.0 ** power
+            report = MismatchReport()
+            report.update(array('d', [1.0]), array('d', [1.0 - bound]))
+            error = report.max_rel_error
+            expected = min(b for b, _ in report.histogram() if b >= error)
+            self.assertEqual(dict(report.histogram())[expected], 1, power)
+
+    def test_float32(self):
+        report = MismatchReport(rel_tol=1e-4, dtype='float32')
+        report.update(array('f', [1.0, 2.0]), array('f', [1.00001, 2.5]))
+        self.assertEqual(report.failures, 1)
+        self.assertEqual(report.worst(), [(1, 2.0, 2.5, 0.5, 0.2)])
+
+    def test_empty(self):
+        report = MismatchReport()
+        self.assertEqual(report.update(array('d'), array('d')), 0)
+        self.assertEqual((report.count, report.max_rel_index), (0, -1))
+        self.assertEqual(report.worst(), [])
+
+    def test_errors(self):
+        self.assertRaises(ValueError, MismatchReport, -1.0)
+        self.assertRaises(ValueError, MismatchReport, top_k=-1)
+        self.assertRaises(ValueError, MismatchReport, dtype='int8')
+        report = MismatchReport()
+        self.assertRaises(ValueError, report.update, array('d', [1.0]),
+                          array('d'))
+        self.assertRaises(TypeError, report.update, array('f', [1.0]),
+                          array('f', [1.0]))
+
+    def test_busy(self):
+        # while update() runs without the GIL, the other methods refuse
+        # to read the half changed report
+        a = bytes(8 * 4000000)
+        refused = set()
+        readers = [MismatchReport.worst, MismatchReport.first_failures,
+                   MismatchReport.histogram]
+        for _ in range(10):
+            report = MismatchReport()
+            thread = threading.Thread(target=report.update, args=(a, a))
+            thread.start()
+            while thread.is_alive():
+                for reader in readers:
+                    try:
+                        reader(report)
+                    except RuntimeError:
+                        refused.add(reader)
+            thread.join()
+            if len(refused) == len(readers):
+                break
+        self.assertEqual(len(refused), len(readers))
+        self.assertEqual(report.count, 4000000)